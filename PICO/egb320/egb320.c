@@ -1,31 +1,579 @@
 #include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
 #include "pico/stdlib.h"
+#include "pico/i2c_slave.h"
 #include "hardware/i2c.h"
+#include "hardware/pwm.h"
+#include "hardware/gpio.h"
+#include "hardware/sync.h"
 
-// I2C defines
-// This example will use I2C0 on GPIO8 (SDA) and GPIO9 (SCL) running at 400KHz.
-// Pins can be changed, see the GPIO function select table in the datasheet for information on GPIO assignments
+// Pico firmware (pico-sdk) with closed-loop wheel speed control.
+//
+// Same I2C protocol as i2c/slave/slave.ino, so either can be flashed:
+//   M<id> <dir> <duty>  raw duty cycle (0-255) for one motor, M<id> S stops it
+//   W<left> <right>     raw signed duty cycles (-255 to 255) for both motors at once
+//   D<v> <w>            velocity setpoint, v in cm/s and w in centi-rad/s (I2C.drive),
+//                       positive w turns left
+//   Q<id> <v> <w> <ms> <mm>  queue a motion segment (see below)
+//   X                   clear the segment queue and stop
+//   G<0|1>, H<1-3>, L<id><0|1>  gripper, lift and LEDs
+// Every I2C read returns the telemetry frame described in i2c/telemetry.py.
+//
+// A D command switches the motors to velocity mode: a timer interrupt runs a PI
+// controller with feedforward on each wheel at CONTROL_HZ from the encoder counts
+// (feedforward only while ENCODERS_ENABLED is 0).
+// An M command switches back to raw duty. In velocity mode the motors stop if no
+// setpoint arrives for SETPOINT_TIMEOUT_MS (the Pi repeats its last setpoint).
+//
+// Motion segments let the Pi hand over a short manoeuvre (e.g. the approach and
+// reverse in collect_item) instead of timing it itself. Each Q command queues a
+// velocity (same units as D) that is held until <ms> milliseconds have passed or
+// the wheels have travelled <mm> millimetres (mean of both wheels), whichever comes
+// first; 0 disables that limit. Segments run back to back from the control timer,
+// the wheels stop after the last one and the id (1-255, chosen by the Pi) of the
+// last finished segment is reported in the telemetry. A D, M, W or X command cancels
+// the queue.
+
+// I2C defines (I2C0 on GPIO0/GPIO1, as wired for slave.ino)
 #define I2C_PORT i2c0
-#define I2C_SDA 8
-#define I2C_SCL 9
+#define I2C_SDA 0
+#define I2C_SCL 1
+#define I2C_ADDRESS 0x08
+#define I2C_BAUDRATE 400000
+
+// Motor driver
+#define EN1 20
+#define PHS1 19
+#define EN2 17
+#define PHS2 16
+#define MOTOR_PWM_WRAP 999   // 125 MHz / 1000 / 6.25 = 20 kHz
+#define MOTOR_PWM_DIV 6.25f
+#define MAX_DUTY 255         // Duty scale of the M/W commands (i2c/wheel_model.py)
+
+// Encoders (channel A interrupts, channel B gives the direction). The pins and
+// COUNTS_PER_METER are unmeasured defaults: keep ENCODERS_ENABLED at 0 until they are
+// checked against the wiring and a measured drive. Without encoders the pins are left
+// alone, the speed loop runs on feedforward only and the counts (telemetry, segment
+// distances) are estimated from the setpoints.
+#define ENCODERS_ENABLED 0
+#define ENC1A 12
+#define ENC1B 13
+#define ENC2A 14
+#define ENC2B 15
+
+// Servos and LEDs
+#define GRIP_SERVO 11
+#define LIFT_SERVO 10
+#define LED1 4
+#define LED2 5
+#define LED3 6
+#define SERVO_MIN_US 544     // Pulse widths of the Arduino Servo library
+#define SERVO_MAX_US 2400
+#define LIFT_STEP_MS 20      // One degree of lift travel per step
+#define LIFT_SETTLE_MS 300
+#define GRIP_MOVE_MS 1000
+#define GRIP_OPEN_DEG 170
+#define GRIP_CLOSED_DEG 0
+
+// Wheel speed control (tune on the robot)
+// WHEEL_BASE, COUNTS_PER_METER and MAX_WHEEL_SPEED mirror i2c/wheel_model.py, change both together
+#define CONTROL_HZ 200
+#define WHEEL_BASE 0.15f          // m
+#define COUNTS_PER_METER 2000.0f  // Encoder counts per metre
+#define MAX_WHEEL_SPEED 0.30f     // m/s at MAX_DUTY
+#define KP 400.0f                 // duty per m/s of error
+#define KI 2000.0f                // duty per m of accumulated error
+#define SPEED_FILTER 0.3f         // Weight of the newest speed measurement
+#define SETPOINT_TIMEOUT_MS 500
+
+// Telemetry and command queue
+#define TELEMETRY_VERSION 3
+#define TELEMETRY_SIZE 28
+#define COMMAND_QUEUE_SIZE 8
+#define MAX_COMMAND_LENGTH 32
+#define SEGMENT_QUEUE_SIZE 8
+#define SEGMENT_MAX_MS 5000  // Upper bound for any segment, also for distance-only ones
+
+typedef struct {
+    uint en, phs;
+    float target;       // m/s
+    float speed;        // m/s, filtered
+    float integral;
+    int32_t last_count;
+    float estimate;     // Encoder counts estimated from the setpoint (ENCODERS_ENABLED 0)
+} wheel_t;
+
+typedef struct {
+    uint8_t id;
+    float v, w;            // m/s, rad/s
+    uint32_t duration_ms;
+    int32_t distance;      // Encoder counts, 0 for no distance limit
+} segment_t;
+
+static wheel_t wheels[2] = {{EN1, PHS1}, {EN2, PHS2}};
+static volatile int32_t encoder_counts[2];
+static volatile bool velocity_mode = false;
+static volatile uint32_t last_setpoint_ms;
+
+// Motion segments (queued by the main loop, run by the control timer)
+static segment_t segments[SEGMENT_QUEUE_SIZE];
+static volatile uint8_t segment_head, segment_tail;
+static volatile bool segment_running;
+static volatile uint8_t segment_done_id;  // Id of the last finished segment
+static uint32_t segment_started;
+static int32_t segment_start_counts[2];
+
+// Command queue (written by the I2C interrupt, read by the main loop)
+static uint8_t command_queue[COMMAND_QUEUE_SIZE][MAX_COMMAND_LENGTH];
+static uint8_t command_length[COMMAND_QUEUE_SIZE];
+static volatile uint8_t queue_head, queue_tail;
+static uint8_t receive_buffer[MAX_COMMAND_LENGTH];
+static uint8_t receive_length;
+static bool receive_overflow;
+
+// Telemetry state
+static volatile uint8_t lift_level, lift_reached, gripper_closed, gripper_done = 1;
+static volatile uint16_t commands_received, commands_rejected, commands_dropped;
+static uint8_t telemetry_frame[TELEMETRY_SIZE];
+static uint8_t telemetry_sequence, telemetry_index;
+
+// Non-blocking servo motion
+static int lift_pos = 45, lift_target = 45;
+static uint32_t last_lift_step, lift_arrived, grip_started;
+
+static uint32_t now_ms(void) {
+    return to_ms_since_boot(get_absolute_time());
+}
+
+//================================================
+// Encoders
+//================================================
+#if ENCODERS_ENABLED
+static void encoder_callback(uint gpio, uint32_t events) {
+    if (gpio == ENC1A) {
+        encoder_counts[0] += gpio_get(ENC1B) ? -1 : 1;
+    } else if (gpio == ENC2A) {
+        encoder_counts[1] += gpio_get(ENC2B) ? 1 : -1;  // Mirrored motor
+    }
+}
+#endif
+
+//================================================
+// Motors
+//================================================
+static void motor_init(uint en, uint phs) {
+    gpio_init(phs);
+    gpio_set_dir(phs, GPIO_OUT);
+    gpio_set_function(en, GPIO_FUNC_PWM);
+    uint slice = pwm_gpio_to_slice_num(en);
+    pwm_set_clkdiv(slice, MOTOR_PWM_DIV);
+    pwm_set_wrap(slice, MOTOR_PWM_WRAP);
+    pwm_set_gpio_level(en, 0);
+    pwm_set_enabled(slice, true);
+}
+
+// Signed duty on the M command scale, positive is forward (PHS high, as in slave.ino)
+static void motor_write(const wheel_t *wheel, float duty) {
+    if (duty > MAX_DUTY) duty = MAX_DUTY;
+    if (duty < -MAX_DUTY) duty = -MAX_DUTY;
+    gpio_put(wheel->phs, duty >= 0);
+    float magnitude = duty >= 0 ? duty : -duty;
+    pwm_set_gpio_level(wheel->en, (uint16_t)(magnitude * MOTOR_PWM_WRAP / MAX_DUTY));
+}
+
+static void set_velocity(float v, float w) {
+    uint32_t interrupts = save_and_disable_interrupts();
+    wheels[0].target = v - w * WHEEL_BASE / 2;
+    wheels[1].target = v + w * WHEEL_BASE / 2;
+    velocity_mode = true;
+    last_setpoint_ms = now_ms();
+    restore_interrupts(interrupts);
+}
+
+// Call with interrupts disabled (or from the control timer)
+static void start_segment(uint32_t now) {
+    const segment_t *segment = &segments[segment_head];
+    wheels[0].target = segment->v - segment->w * WHEEL_BASE / 2;
+    wheels[1].target = segment->v + segment->w * WHEEL_BASE / 2;
+    segment_started = now;
+    segment_start_counts[0] = encoder_counts[0];
+    segment_start_counts[1] = encoder_counts[1];
+    segment_running = true;
+    velocity_mode = true;
+}
+
+static void clear_segments(void) {
+    uint32_t interrupts = save_and_disable_interrupts();
+    segment_head = segment_tail;
+    segment_running = false;
+    restore_interrupts(interrupts);
+}
+
+static bool queue_segment(const segment_t *segment) {
+    uint32_t interrupts = save_and_disable_interrupts();
+    uint8_t next = (segment_tail + 1) % SEGMENT_QUEUE_SIZE;
+    bool queued = next != segment_head;
+    if (queued) {
+        segments[segment_tail] = *segment;
+        segment_tail = next;
+        if (!segment_running) {
+            start_segment(now_ms());
+        }
+    }
+    restore_interrupts(interrupts);
+    return queued;
+}
+
+// Finish the running segment when its time or distance is up and start the next one
+static void update_segments(void) {
+    if (!segment_running) {
+        return;
+    }
+    uint32_t now = now_ms();
+    const segment_t *segment = &segments[segment_head];
+    int32_t left = encoder_counts[0] - segment_start_counts[0];
+    int32_t right = encoder_counts[1] - segment_start_counts[1];
+    int32_t travelled = ((left < 0 ? -left : left) + (right < 0 ? -right : right)) / 2;
+    if (now - segment_started < segment->duration_ms
+        && (segment->distance == 0 || travelled < segment->distance)) {
+        return;
+    }
+    segment_done_id = segment->id;
+    segment_head = (segment_head + 1) % SEGMENT_QUEUE_SIZE;
+    if (segment_head != segment_tail) {
+        start_segment(now);
+    } else {
+        segment_running = false;
+        wheels[0].target = wheels[1].target = 0;
+        last_setpoint_ms = now;
+    }
+}
+
+// Wheel speed PI loop with feedforward, runs in the timer interrupt
+static bool control_callback(repeating_timer_t *timer) {
+    const float dt = 1.0f / CONTROL_HZ;
+    for (int i = 0; i < 2; i++) {
+        wheel_t *wheel = &wheels[i];
+#if ENCODERS_ENABLED
+        int32_t count = encoder_counts[i];
+        float measured = (count - wheel->last_count) / COUNTS_PER_METER / dt;
+        wheel->last_count = count;
+        wheel->speed += SPEED_FILTER * (measured - wheel->speed);
+#else
+        // Open loop: assume the wheel holds its setpoint, so the PI terms stay at zero
+        wheel->speed = velocity_mode ? wheel->target : 0;
+        wheel->estimate += wheel->speed * COUNTS_PER_METER * dt;
+        encoder_counts[i] = (int32_t)wheel->estimate;
+#endif
+    }
+    if (!velocity_mode) {
+        return true;
+    }
+    update_segments();
+    if (!segment_running && now_ms() - last_setpoint_ms > SETPOINT_TIMEOUT_MS) {
+        wheels[0].target = wheels[1].target = 0;  // Pi went quiet, stop
+    }
+
+    for (int i = 0; i < 2; i++) {
+        wheel_t *wheel = &wheels[i];
+        if (wheel->target == 0) {
+            wheel->integral = 0;  // No creeping or windup while stopped
+            motor_write(wheel, 0);
+            continue;
+        }
+        float error = wheel->target - wheel->speed;
+        float feedforward = wheel->target / MAX_WHEEL_SPEED * MAX_DUTY;
+        float duty = feedforward + KP * error + KI * wheel->integral;
+        // Only integrate while the output is not saturated (anti-windup)
+        if ((duty < MAX_DUTY || error < 0) && (duty > -MAX_DUTY || error > 0)) {
+            wheel->integral += error * dt;
+        }
+        motor_write(wheel, duty);
+    }
+    return true;
+}
+
+//================================================
+// Servos
+//================================================
+static void servo_init(uint pin) {
+    gpio_set_function(pin, GPIO_FUNC_PWM);
+    uint slice = pwm_gpio_to_slice_num(pin);
+    pwm_set_clkdiv(slice, 125.0f);  // 1 us ticks
+    pwm_set_wrap(slice, 19999);     // 50 Hz
+    pwm_set_enabled(slice, true);
+}
 
+static void servo_write(uint pin, int degrees) {
+    pwm_set_gpio_level(pin, SERVO_MIN_US + degrees * (SERVO_MAX_US - SERVO_MIN_US) / 180);
+}
 
+static void gripper(bool close) {
+    servo_write(GRIP_SERVO, close ? GRIP_CLOSED_DEG : GRIP_OPEN_DEG);
+    gripper_closed = close;
+    gripper_done = 0;
+    grip_started = now_ms();
+}
+
+static void move_lift(int target_pos, uint8_t level) {
+    lift_target = target_pos;
+    lift_level = level;
+    lift_reached = 0;
+    lift_arrived = 0;
+}
+
+static void update_servos(void) {
+    uint32_t now = now_ms();
+    if (lift_pos != lift_target) {
+        if (now - last_lift_step >= LIFT_STEP_MS) {
+            lift_pos += lift_pos < lift_target ? 1 : -1;
+            servo_write(LIFT_SERVO, lift_pos);
+            last_lift_step = now;
+            if (lift_pos == lift_target) {
+                lift_arrived = now;
+            }
+        }
+    } else if (!lift_reached && lift_level != 0 && now - lift_arrived >= LIFT_SETTLE_MS) {
+        lift_reached = 1;
+    }
+    if (!gripper_done && now - grip_started >= GRIP_MOVE_MS) {
+        gripper_done = 1;
+    }
+}
+
+//================================================
+// Control system function
+//================================================
+static void control_system(const uint8_t *command, int length) {
+    // Byte 0 is the SMBus register, the text starts at byte 1
+    char text[MAX_COMMAND_LENGTH + 1];
+    memcpy(text, command, length);
+    text[length] = '\0';
+    const char *body = text + 1;
+
+    switch (body[0]) {
+        case 'M': {
+            int motor = body[1] - '1';
+            char direction = length > 4 ? body[3] : 0;
+            if (motor < 0 || motor > 1 || (direction != '0' && direction != '1' && direction != 'S')) {
+                commands_rejected++;
+                return;
+            }
+            clear_segments();
+            velocity_mode = false;
+            wheels[motor].target = 0;
+            wheels[motor].integral = 0;
+            if (direction == 'S') {
+                motor_write(&wheels[motor], 0);
+            } else {
+                int duty = atoi(body + 5);
+                motor_write(&wheels[motor], direction == '0' ? duty : -duty);
+            }
+            break;
+        }
+        case 'W': {
+            int left, right;
+            if (sscanf(body + 1, "%d %d", &left, &right) != 2) {
+                commands_rejected++;
+                return;
+            }
+            clear_segments();
+            velocity_mode = false;
+            for (int i = 0; i < 2; i++) {
+                wheels[i].target = 0;
+                wheels[i].integral = 0;
+            }
+            motor_write(&wheels[0], left);
+            motor_write(&wheels[1], right);
+            break;
+        }
+        case 'D': {
+            int v_cm, w_crad;
+            if (sscanf(body + 1, "%d %d", &v_cm, &w_crad) != 2) {
+                commands_rejected++;
+                return;
+            }
+            clear_segments();
+            set_velocity(v_cm / 100.0f, w_crad / 100.0f);
+            break;
+        }
+        case 'Q': {
+            int id, v_cm, w_crad, duration_ms, distance_mm;
+            if (sscanf(body + 1, "%d %d %d %d %d", &id, &v_cm, &w_crad, &duration_ms, &distance_mm) != 5
+                || id < 1 || id > 255 || duration_ms < 0 || distance_mm < 0
+                || (duration_ms == 0 && distance_mm == 0)) {
+                commands_rejected++;
+                return;
+            }
+            segment_t segment = {
+                .id = (uint8_t)id,
+                .v = v_cm / 100.0f,
+                .w = w_crad / 100.0f,
+                .duration_ms = duration_ms == 0 || duration_ms > SEGMENT_MAX_MS ? SEGMENT_MAX_MS : duration_ms,
+                .distance = (int32_t)(distance_mm * COUNTS_PER_METER / 1000.0f),
+            };
+            if (!queue_segment(&segment)) {
+                commands_dropped++;  // Segment queue full
+            }
+            break;
+        }
+        case 'X':
+            clear_segments();
+            set_velocity(0, 0);
+            break;
+        case 'G':
+            if (body[1] == '0' || body[1] == '1') {
+                gripper(body[1] == '1');
+            } else {
+                commands_rejected++;
+            }
+            break;
+        case 'H':
+            switch (body[1]) {
+                case '1': move_lift(10, 1); break;
+                case '2': move_lift(90, 2); break;
+                case '3': move_lift(160, 3); break;
+                default: commands_rejected++; break;
+            }
+            break;
+        case 'L': {
+            static const uint leds[3] = {LED1, LED2, LED3};
+            int led = body[1] - '1';
+            if (led < 0 || led > 2 || (body[2] != '0' && body[2] != '1')) {
+                commands_rejected++;
+                return;
+            }
+            gpio_put(leds[led], body[2] == '1');
+            break;
+        }
+        default:
+            commands_rejected++;
+            break;
+    }
+}
+
+//================================================
+// I2C slave
+//================================================
+static void build_telemetry(void) {
+    uint8_t *frame = telemetry_frame;
+    uint32_t now = now_ms();
+    int32_t left = encoder_counts[0];
+    int32_t right = encoder_counts[1];
+    uint16_t counters[3] = {commands_received, commands_rejected, commands_dropped};
+
+    frame[0] = TELEMETRY_VERSION;
+    frame[1] = telemetry_sequence++;
+    memcpy(&frame[2], &now, 4);  // RP2040 is little-endian, as the Pi expects
+    memcpy(&frame[6], &left, 4);
+    memcpy(&frame[10], &right, 4);
+    frame[14] = lift_level;
+    frame[15] = lift_reached;
+    frame[16] = gripper_closed;
+    frame[17] = gripper_done;
+    memcpy(&frame[18], counters, 6);
+    frame[24] = segment_done_id;
+    frame[25] = (segment_tail - segment_head + SEGMENT_QUEUE_SIZE) % SEGMENT_QUEUE_SIZE;  // Including the running one
+    frame[26] = (queue_tail - queue_head + COMMAND_QUEUE_SIZE) % COMMAND_QUEUE_SIZE;  // Ready status for the sender
+    uint8_t checksum = 0;
+    for (int i = 0; i < TELEMETRY_SIZE - 1; i++) {
+        checksum += frame[i];
+    }
+    frame[TELEMETRY_SIZE - 1] = checksum;
+}
+
+static void i2c_slave_handler(i2c_inst_t *i2c, i2c_slave_event_t event) {
+    switch (event) {
+        case I2C_SLAVE_RECEIVE: {
+            uint8_t byte = i2c_read_byte_raw(i2c);
+            if (receive_length < MAX_COMMAND_LENGTH) {
+                receive_buffer[receive_length++] = byte;
+            } else {
+                receive_overflow = true;
+            }
+            break;
+        }
+        case I2C_SLAVE_REQUEST:
+            // The frame is built once per read, so it is consistent across its bytes
+            if (telemetry_index == 0) {
+                build_telemetry();
+            }
+            i2c_write_byte_raw(i2c, telemetry_index < TELEMETRY_SIZE ? telemetry_frame[telemetry_index] : 0);
+            telemetry_index++;
+            break;
+        case I2C_SLAVE_FINISH: {
+            // A single byte is the register select before a telemetry read, nothing to execute
+            uint8_t next = (queue_tail + 1) % COMMAND_QUEUE_SIZE;
+            if (receive_length >= 2) {
+                if (receive_overflow || next == queue_head) {
+                    commands_dropped++;
+                } else {
+                    memcpy(command_queue[queue_tail], receive_buffer, receive_length);
+                    command_length[queue_tail] = receive_length;
+                    queue_tail = next;
+                    commands_received++;
+                }
+            }
+            receive_length = 0;
+            receive_overflow = false;
+            telemetry_index = 0;
+            break;
+        }
+        default:
+            break;
+    }
+}
 
 int main()
 {
     stdio_init_all();
 
-    // I2C Initialisation. Using it at 400Khz.
-    i2c_init(I2C_PORT, 400*1000);
-    
+    // LEDs
+    const uint leds[3] = {LED1, LED2, LED3};
+    for (int i = 0; i < 3; i++) {
+        gpio_init(leds[i]);
+        gpio_set_dir(leds[i], GPIO_OUT);
+    }
+
+    // Motors, servos (lift down, gripper open as in slave.ino)
+    motor_init(EN1, PHS1);
+    motor_init(EN2, PHS2);
+    servo_init(GRIP_SERVO);
+    servo_init(LIFT_SERVO);
+    servo_write(LIFT_SERVO, 10);
+    servo_write(GRIP_SERVO, GRIP_OPEN_DEG);
+
+#if ENCODERS_ENABLED
+    // Encoders
+    const uint encoder_pins[4] = {ENC1A, ENC1B, ENC2A, ENC2B};
+    for (int i = 0; i < 4; i++) {
+        gpio_init(encoder_pins[i]);
+        gpio_set_dir(encoder_pins[i], GPIO_IN);
+        gpio_pull_up(encoder_pins[i]);
+    }
+    gpio_set_irq_enabled_with_callback(ENC1A, GPIO_IRQ_EDGE_RISE, true, &encoder_callback);
+    gpio_set_irq_enabled(ENC2A, GPIO_IRQ_EDGE_RISE, true);
+#endif
+
+    // I2C slave at 400 kHz
     gpio_set_function(I2C_SDA, GPIO_FUNC_I2C);
     gpio_set_function(I2C_SCL, GPIO_FUNC_I2C);
     gpio_pull_up(I2C_SDA);
     gpio_pull_up(I2C_SCL);
-    // For more examples of I2C use see https://github.com/raspberrypi/pico-examples/tree/master/i2c
+    i2c_init(I2C_PORT, I2C_BAUDRATE);
+    i2c_slave_init(I2C_PORT, I2C_ADDRESS, &i2c_slave_handler);
+
+    // Wheel speed control loop
+    static repeating_timer_t control_timer;
+    add_repeating_timer_us(-1000000 / CONTROL_HZ, control_callback, NULL, &control_timer);
 
     while (true) {
-        printf("Hello, world!\n");
-        sleep_ms(1000);
+        // Execute queued commands outside the I2C interrupt
+        while (queue_head != queue_tail) {
+            control_system(command_queue[queue_head], command_length[queue_head]);
+            queue_head = (queue_head + 1) % COMMAND_QUEUE_SIZE;
+        }
+        update_servos();
     }
 }
@@ -1,10 +1,28 @@
-import smbus
 import time
 
+from i2c.telemetry import TELEMETRY_REGISTER, TELEMETRY_VERSION, TELEMETRY_SIZE, TELEMETRY_QUEUED
+# Same flow control as the robot's sender, see i2c/main_i2c.py
+from i2c.main_i2c import COMMAND_QUEUE_CAPACITY, DRAIN_TIME, MIN_SPACING, READY_TIMEOUT, READY_POLL
+
+# The ready status is the telemetry frame
+STATUS_REGISTER = TELEMETRY_REGISTER
+STATUS_VERSION = TELEMETRY_VERSION
+STATUS_SIZE = TELEMETRY_SIZE
+STATUS_QUEUED = TELEMETRY_QUEUED  # Byte with the number of waiting commands
+
 class I2C:
-    def __init__(self, addr=0x08, bus=0):
+    def __init__(self, addr=0x08, bus=0, min_spacing=MIN_SPACING):
+        # bus: I2C bus number, or an object with the smbus.SMBus methods (i2c/emulator.py)
         self.addr = addr
-        self.bus = smbus.SMBus(bus)
+        if isinstance(bus, int):
+            import smbus  # Only installed on the Pi
+            bus = smbus.SMBus(bus)
+        self.bus = bus
+        self.min_spacing = min_spacing
+        self.in_flight = 0  # Commands that may still wait in the Pico's queue
+        self.last_write = 0.0
+        self.status_reads = 0
+        self.status_available = True  # False once the firmware does not answer with a usable frame
 
     def string_to_ascii_array(self, input_string):
         # Convert the input string to an array of ASCII values
@@ -12,15 +30,50 @@ class I2C:
     
     def send_command(self, cmd):
         command = self.string_to_ascii_array(cmd)
+        self.wait_ready()
         
         try:
             print(f"Sending command: {command}")
             self.bus.write_i2c_block_data(self.addr, 0, command)  # Send data to I2C device
+            self.in_flight += 1
         except IOError as e:
             print(f"Error communicating with I2C device: {e}")
-        
-        # Optional short delay
-        time.sleep(0.1)  # Give some time between commands
+        self.last_write = time.perf_counter()
+
+    def queued_commands(self):
+        """Commands waiting in the Pico's queue, or None if the status frame could not be read."""
+        try:
+            frame = bytes(self.bus.read_i2c_block_data(self.addr, STATUS_REGISTER, STATUS_SIZE))
+        except IOError:
+            return None
+        self.status_reads += 1
+        if len(frame) != STATUS_SIZE or sum(frame[:-1]) & 0xFF != frame[-1]:
+            return None  # Corrupted, read again
+        if frame[0] != STATUS_VERSION:
+            self.status_available = False
+            print(f"Pico telemetry version {frame[0]} has no ready status, spacing commands instead")
+            return None
+        return frame[STATUS_QUEUED]
+
+    def wait_ready(self):
+        """Block until the Pico's command queue has room for another command."""
+        if time.perf_counter() - self.last_write >= DRAIN_TIME:
+            self.in_flight = 0
+        deadline = time.perf_counter() + READY_TIMEOUT
+        while self.status_available and self.in_flight >= COMMAND_QUEUE_CAPACITY:
+            if time.perf_counter() > deadline:
+                print("Pico command queue still full, sending anyway")
+                return
+            queued = self.queued_commands()
+            if queued is not None:
+                self.in_flight = queued
+            if self.in_flight >= COMMAND_QUEUE_CAPACITY:
+                time.sleep(READY_POLL)  # Give the Pico time to execute before reading again
+        if not self.status_available:
+            # Firmware without the ready status: keep a minimum spacing instead
+            since_write = time.perf_counter() - self.last_write
+            if since_write < self.min_spacing:
+                time.sleep(self.min_spacing - since_write)
 
     def drive(self, forwards:float,rotational:float): # used in the navigvation system to run at the desired 
         forwards_int = round(forwards*100)
@@ -31,6 +84,15 @@ class I2C:
         command = f"D{forwards_int} {rotational_int}"
         self.send_command(command)
 
+    def DC_motors(self, left:int, right:int):
+        """Set both DC motors in one command, signed duty cycles (-255 to 255, negative is backwards)."""
+        if abs(left) > 255 or abs(right) > 255:
+            print("Invalid speed")
+            return
+
+        command = f"W{int(left)} {int(right)}"
+        self.send_command(command)
+
     def DC_motor(self, motor:int, direction:str, speed:int):
         """Set the speed of a DC motor."""
         if motor not in [1, 2]:
@@ -44,7 +106,7 @@ class I2C:
             return
 
 
-        command = f"M{motor}{direction}{speed}"
+        command = f"M{motor} S" if direction == "S" else f"M{motor} {direction} {speed}"
         self.send_command(command)
 
 
@@ -77,6 +139,6 @@ class I2C:
         if state not in ['on', 'off']:
             print("Invalid LED state")
             return
-        # Example: 'L1O' turns on LED 1
-        command = f"L{number}{state[0].upper()}" # 'on' -> 'O', 'off' -> 'F'
+        # Example: 'L11' turns on LED 1
+        command = f"L{number}{1 if state == 'on' else 0}"
         self.send_command(command)
\ No newline at end of file
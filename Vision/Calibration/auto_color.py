@@ -0,0 +1,321 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+import cv2
+import numpy as np
+from .color import Color
+from .calibration_store import calibration_paths
+
+"""
+Offline color threshold calibration from labeled frames.
+
+Instead of clicking HSV samples through the camera window (CalibrateColor), the
+HSV range of each class is fitted to labeled frames so that the cv2.inRange mask
+has the best IoU with the labels over all frames.
+
+Labels, next to each frame or in a separate label folder:
+- <frame>_<Class>.png: mask image, non-zero pixels belong to the class, or
+- <frame>.json: polygons per class, {"Item": [[[x, y], ...], ...], "Shelf": [...]}.
+Classes are the detector names (Item, Obstacle, Shelf, Marker, Wall, Ramp).
+
+Method:
+1. Every pixel is binned by HSV (hue at full resolution, saturation and value in
+   steps of SV_STEP). np.bincount accumulates one histogram of all pixels and
+   one per class, over all frames. Bin indices of many frames are buffered and
+   counted together, so the large histograms are only touched once per flush.
+2. 3D prefix sums of the histograms give the pixel count of any HSV box with
+   eight lookups. So the IoU of a box is O(1):
+   IoU = TP / (labelled + predicted - TP).
+3. Coordinate ascent over the six bounds. Each step evaluates every value of one
+   bound at once and keeps the best. It starts from the 1st-99th percentile box
+   of the class pixels.
+
+Hue does not wrap around (the thresholds file holds one lower/upper range per
+class, as cv2.inRange does).
+
+Usage:
+    python -m Vision.Calibration.auto_color FRAMES_DIR [--labels LABEL_DIR] [--output color_thresholds.csv] [--scale 0.5]
+
+Rows of the thresholds file for classes without labels (e.g. white2) are kept.
+The default output is the file CalibrationStore reads, so a running robot picks
+up the new thresholds.
+"""
+
+logger = logging.getLogger(__name__)
+
+CLASSES = ('Item', 'Obstacle', 'Shelf', 'Marker', 'Wall', 'Ramp')
+FRAME_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+SV_STEP = 4  # Saturation/value bin width
+HUE_BINS = 180
+SV_BINS = 256 // SV_STEP
+MAX_ITERATIONS = 20
+FLUSH_SIZE = 1 << 23  # Buffered bin indices before they are added to the histograms
+
+
+def hsv_bins(HSVframe):
+    """
+    Flat histogram bin index of every pixel.
+    """
+    h = HSVframe[..., 0].astype(np.int32)
+    s = HSVframe[..., 1].astype(np.int32) // SV_STEP
+    v = HSVframe[..., 2].astype(np.int32) // SV_STEP
+    return ((h * SV_BINS + s) * SV_BINS + v).ravel()
+
+
+def prefix_sums(histogram):
+    """
+    3D summed-area table with a leading zero plane on every axis.
+    """
+    table = np.zeros((histogram.shape[0] + 1, histogram.shape[1] + 1, histogram.shape[2] + 1), dtype=np.int64)
+    table[1:, 1:, 1:] = histogram.cumsum(0).cumsum(1).cumsum(2)
+    return table
+
+
+def box_count(table, lower, upper):
+    """
+    Number of pixels with lower <= bin <= upper on all three axes. Bounds may be arrays
+    (broadcast against each other) to evaluate many boxes at once.
+    """
+    h0, s0, v0 = lower
+    h1, s1, v1 = (np.asarray(bound) + 1 for bound in upper)
+    return (table[h1, s1, v1] - table[h0, s1, v1] - table[h1, s0, v1] - table[h1, s1, v0]
+            + table[h0, s0, v1] + table[h0, s1, v0] + table[h1, s0, v0] - table[h0, s0, v0])
+
+
+def _find_label_files(frame_path, label_dir):
+    stem = os.path.splitext(os.path.basename(frame_path))[0]
+    directory = label_dir or os.path.dirname(frame_path)
+    return os.path.join(directory, stem + '.json'), {name: os.path.join(directory, f"{stem}_{name}.png") for name in CLASSES}
+
+
+def load_labels(frame_path, shape, label_dir=None):
+    """
+    Label masks of one frame.
+
+    Returns:
+    - Dictionary class -> boolean mask (only classes that are labelled).
+    """
+    json_path, mask_paths = _find_label_files(frame_path, label_dir)
+    labels = {}
+    if os.path.exists(json_path):
+        with open(json_path) as file:
+            polygons = json.load(file)
+        for name, shapes in polygons.items():
+            mask = np.zeros(shape, np.uint8)
+            cv2.fillPoly(mask, [np.asarray(points, dtype=np.int32) for points in shapes], 255)
+            labels[name] = mask > 0
+    for name, path in mask_paths.items():
+        if name not in labels and os.path.exists(path):
+            mask = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if mask.shape != shape:
+                mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+            labels[name] = mask > 0
+    return labels
+
+
+class AutoColorCalibrator:
+    def __init__(self, classes=CLASSES):
+        """
+        Args:
+        - classes: Class names to fit.
+        """
+        self.classes = classes
+        n_bins = HUE_BINS * SV_BINS * SV_BINS
+        self.total = np.zeros(n_bins, dtype=np.int64)
+        self.class_histograms = {name: np.zeros(n_bins, dtype=np.int64) for name in classes}
+        self.frames = 0
+        self._pending = {}  # Histogram -> list of buffered bin index arrays
+        self._pending_size = 0
+        self._total_table = None  # Prefix sums of self.total, shared by every class
+
+    def add_frame(self, HSVframe, labels):
+        """
+        Accumulate one frame.
+
+        Args:
+        - HSVframe: HSV image.
+        - labels: Dictionary class -> boolean mask of the frame.
+        """
+        bins = hsv_bins(HSVframe)
+        self._buffer(None, bins)
+        for name, mask in labels.items():
+            if name in self.class_histograms:
+                self._buffer(name, bins[mask.ravel()])
+        self.frames += 1
+        if self._pending_size >= FLUSH_SIZE:
+            self._flush()
+
+    def _buffer(self, name, bins):
+        self._pending.setdefault(name, []).append(bins)
+        self._pending_size += bins.size
+
+    def _flush(self):
+        """
+        Add the buffered bin indices to the histograms (None is the all-pixel histogram).
+        """
+        for name, chunks in self._pending.items():
+            histogram = self.total if name is None else self.class_histograms[name]
+            histogram += np.bincount(np.concatenate(chunks), minlength=histogram.size)
+        if self._pending:
+            self._total_table = None
+        self._pending = {}
+        self._pending_size = 0
+
+    def add_folder(self, frame_dir, label_dir=None, scale=1.0):
+        """
+        Accumulate every labelled frame in a folder (BGR images).
+
+        Returns:
+        - Number of frames used.
+        """
+        paths = sorted(path for path in glob.glob(os.path.join(frame_dir, '*'))
+                       if path.lower().endswith(FRAME_EXTENSIONS) and not self._is_mask(path))
+        used = 0
+        for path in paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            if scale != 1.0:
+                frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+            labels = load_labels(path, frame.shape[:2], label_dir)
+            if not labels:
+                continue
+            self.add_frame(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), labels)
+            used += 1
+        return used
+
+    def _is_mask(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return any(stem.endswith('_' + name) for name in self.classes)
+
+    def _initial_box(self, histogram):
+        """
+        1st-99th percentile box of the class pixels on each axis.
+        """
+        lower, upper = [], []
+        for axis in range(3):
+            other = tuple(i for i in range(3) if i != axis)
+            cumulative = np.cumsum(histogram.sum(axis=other))
+            total = cumulative[-1]
+            lower.append(int(np.searchsorted(cumulative, 0.01 * total)))
+            upper.append(int(np.searchsorted(cumulative, 0.99 * total)))
+        return lower, upper
+
+    def fit_class(self, name):
+        """
+        Fit the HSV box of one class.
+
+        Returns:
+        - (lower_bins, upper_bins, iou), or None if the class has no labelled pixels.
+        """
+        self._flush()
+        histogram = self.class_histograms[name].reshape(HUE_BINS, SV_BINS, SV_BINS)
+        labelled = int(histogram.sum())
+        if labelled == 0:
+            return None
+        class_table = prefix_sums(histogram)
+        if self._total_table is None:
+            self._total_table = prefix_sums(self.total.reshape(HUE_BINS, SV_BINS, SV_BINS))
+        total_table = self._total_table
+        sizes = (HUE_BINS, SV_BINS, SV_BINS)
+
+        def iou(lower, upper):
+            true_positive = box_count(class_table, lower, upper)
+            predicted = box_count(total_table, lower, upper)
+            return true_positive / (labelled + predicted - true_positive)
+
+        lower, upper = self._initial_box(histogram)
+        best = float(iou(lower, upper))
+        for _ in range(MAX_ITERATIONS):
+            improved = False
+            for axis in range(3):
+                for bound in (lower, upper):
+                    # Every value of this bound at once, keeping lower <= upper
+                    if bound is lower:
+                        candidates = np.arange(0, upper[axis] + 1)
+                    else:
+                        candidates = np.arange(lower[axis], sizes[axis])
+                    trial_lower = [np.full(candidates.shape, value) for value in lower]
+                    trial_upper = [np.full(candidates.shape, value) for value in upper]
+                    (trial_lower if bound is lower else trial_upper)[axis] = candidates
+                    scores = iou(trial_lower, trial_upper)
+                    index = int(np.argmax(scores))
+                    if scores[index] > best + 1e-12:
+                        best = float(scores[index])
+                        bound[axis] = int(candidates[index])
+                        improved = True
+            if not improved:
+                break
+        return lower, upper, best
+
+    def fit(self):
+        """
+        Fit every class.
+
+        Returns:
+        - Dictionary class -> (lower_hsv, upper_hsv, iou), HSV as inclusive uint8 bounds for cv2.inRange.
+        """
+        results = {}
+        for name in self.classes:
+            fitted = self.fit_class(name)
+            if fitted is None:
+                logger.warning(f"No labelled pixels for {name}, skipping")
+                continue
+            lower, upper, best = fitted
+            lower_hsv = np.array([lower[0], lower[1] * SV_STEP, lower[2] * SV_STEP])
+            upper_hsv = np.array([upper[0], upper[1] * SV_STEP + SV_STEP - 1, upper[2] * SV_STEP + SV_STEP - 1])
+            results[name] = (lower_hsv, upper_hsv, best)
+        return results
+
+
+def write_thresholds(results, path):
+    """
+    Write fitted classes to a color_thresholds.csv file, keeping the rows of other classes.
+    The file is replaced atomically so a CalibrationStore watching it never reads half a file.
+    """
+    color_names = {category: color for color, category in Color.category_mapping.items()}
+    rows = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    rows[line.split(',')[0]] = line.strip()
+    for name, (lower, upper, _) in results.items():
+        color = color_names[name]
+        rows[color] = f"{color},{','.join(map(str, lower))},{','.join(map(str, upper))}"
+
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as file:
+        file.write('\n'.join(rows.values()))
+    os.replace(temporary, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit color thresholds to labelled frames")
+    parser.add_argument('frames', help="Folder with the frames (BGR images)")
+    parser.add_argument('--labels', help="Folder with the labels (default: the frames folder)")
+    parser.add_argument('--output', default=calibration_paths()['color'], help="Thresholds file to update")
+    parser.add_argument('--scale', type=float, default=1.0, help="Resize frames first (0.5 for full resolution captures)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    calibrator = AutoColorCalibrator()
+    frames = calibrator.add_folder(args.frames, args.labels, args.scale)
+    if frames == 0:
+        print("No labelled frames found")
+        return
+    accumulated = time.perf_counter()
+    results = calibrator.fit()
+    fitted = time.perf_counter()
+
+    for name, (lower, upper, best) in results.items():
+        print(f"{name:9s} lower {lower} upper {upper} IoU {best:.3f}")
+    write_thresholds(results, args.output)
+    print(f"{frames} frames: histograms {accumulated - start:.2f} s, fit {fitted - accumulated:.2f} s, written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,15 +15,23 @@ Calibration module for loading calibration data.
 
 
 class Calibration:
-    def __init__(self):
+    def __init__(self, directory=None):
+        """
+        Args:
+        - directory: Directory with the calibration files, see calibration_store.calibration_paths.
+        """
+        self.directory = directory
         self.color = Color()
         self.homography = Homography()
         self.focal_length = FocalLength()
 
     def load_csv(self):
-        color_range = self.color.load_color_thresholds("/home/edmond/egb320-team9/Vision/Calibration/color_thresholds.csv")
-        homography_matrix = self.homography.load_homography_matrix("/home/edmond/egb320-team9/Vision/Calibration/calibrate_homography.csv")
-        focal_length = self.focal_length.load_focal_length("/home/edmond/egb320-team9/Vision/Calibration/focal_length.csv")
+        # One-off load; Vision uses CalibrationStore, which also reloads on changes
+        from .calibration_store import calibration_paths
+        paths = calibration_paths(self.directory)
+        color_range = self.color.load_color_thresholds(paths['color'])
+        homography_matrix = self.homography.load_homography_matrix(paths['homography'])
+        focal_length = self.focal_length.load_focal_length(paths['focal_length'])
         #print("Color range: ", color_range)
         #print("homography_matrix: ", homography_matrix)
         #print("focal_length: ", focal_length)        
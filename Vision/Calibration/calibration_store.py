@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+import cv2
+import numpy as np
+from .color import Color
+from .homography import Homography
+from .focal_length import FocalLength
+from .intrinsics import BearingModel, CameraIntrinsics, UndistortionTable
+
+"""
+Calibration store: loads the color thresholds, homography and focal length (and
+the lens intrinsics, if camera_intrinsics.csv exists), precomputes the products derived from them, and reloads everything when a
+calibration file changes.
+
+Paths are resolved per file in this order:
+1. The path given to CalibrationStore.
+2. The directory given to CalibrationStore.
+3. The directory in the EGB320_CALIBRATION_DIR environment variable.
+4. This directory (Vision/Calibration).
+
+Each load builds a new immutable CalibrationSnapshot and then swaps it in with
+a single assignment, so readers always see a complete calibration. The watcher
+thread only builds snapshots. Vision applies a new snapshot to its detectors
+between two frames (see Vision.process_image), so no frame is dropped or
+processed with a mix of old and new calibration.
+"""
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_DIR_ENV = "EGB320_CALIBRATION_DIR"
+DEFAULT_DIR = os.path.dirname(os.path.abspath(__file__))
+COLOR_FILE = "color_thresholds.csv"
+HOMOGRAPHY_FILE = "calibrate_homography.csv"
+FOCAL_LENGTH_FILE = "focal_length.csv"
+INTRINSICS_FILE = "camera_intrinsics.csv"  # Optional, see intrinsics.py
+OPTIONAL_FILES = ('intrinsics',)
+
+FRAME_SIZE = (410, 308)  # (width, height) of the processed frames
+POLL_INTERVAL = 1.0  # s between checks of the file modification times
+
+
+def calibration_paths(directory=None, color_file=None, homography_file=None, focal_length_file=None, intrinsics_file=None):
+    """
+    Resolve the calibration file paths.
+
+    Returns:
+    - Dictionary with the 'color', 'homography', 'focal_length' and 'intrinsics' paths.
+    """
+    directory = directory or os.environ.get(CALIBRATION_DIR_ENV) or DEFAULT_DIR
+    return {
+        'color': color_file or os.path.join(directory, COLOR_FILE),
+        'homography': homography_file or os.path.join(directory, HOMOGRAPHY_FILE),
+        'focal_length': focal_length_file or os.path.join(directory, FOCAL_LENGTH_FILE),
+        'intrinsics': intrinsics_file or os.path.join(directory, INTRINSICS_FILE),
+    }
+
+
+def ground_table(homography_matrix, frame_size=FRAME_SIZE):
+    """
+    Ground coordinates of every pixel, for lookups instead of per-point perspectiveTransform.
+
+    The table has one extra row and column, because detectors use the bottom edge
+    of a bounding box (y + h), which can be one past the last pixel row.
+
+    Returns:
+    - Array of shape (height + 1, width + 1, 2), float32, the same values
+      cv2.perspectiveTransform gives for each pixel.
+    """
+    width, height = frame_size
+    xs, ys = np.meshgrid(np.arange(width + 1), np.arange(height + 1))
+    points = np.stack([xs, ys], axis=-1).astype(np.float32).reshape(-1, 1, 2)
+    ground = cv2.perspectiveTransform(points, homography_matrix)
+    return ground.reshape(height + 1, width + 1, 2)
+
+
+@dataclass(frozen=True)
+class CalibrationSnapshot:
+    version: int  # Increases with every successful load
+    color_ranges: dict
+    homography_matrix: np.ndarray
+    focal_length: float
+    ground_points: np.ndarray  # ground_table() of the homography
+    bearing_model: BearingModel = None  # From the intrinsics (with their undistortion table), or the focal length and image centre
+
+
+class CalibrationStore:
+    def __init__(self, directory=None, color_file=None, homography_file=None, focal_length_file=None,
+                 intrinsics_file=None, frame_size=FRAME_SIZE, poll_interval=POLL_INTERVAL):
+        """
+        Initialize the store (nothing is loaded until load() is called).
+
+        Args:
+        - directory: Directory with the calibration files (see the module docstring for the fallbacks).
+        - color_file, homography_file, focal_length_file, intrinsics_file: Paths of individual files.
+        - frame_size: (width, height) of the frames, for the pixel-to-ground table.
+        - poll_interval: Seconds between checks when watching the files.
+        """
+        self.paths = calibration_paths(directory, color_file, homography_file, focal_length_file, intrinsics_file)
+        self.frame_size = frame_size
+        self.poll_interval = poll_interval
+        self.snapshot = None
+        self._mtimes = None
+        self._failed_mtimes = None  # Modification times of the last failed reload, not retried
+        self._load_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _read_mtimes(self):
+        mtimes = {}
+        for name, path in self.paths.items():
+            if name in OPTIONAL_FILES and not os.path.exists(path):
+                mtimes[name] = None
+            else:
+                mtimes[name] = os.stat(path).st_mtime_ns
+        return mtimes
+
+    def _build_snapshot(self):
+        color_ranges = Color().load_color_thresholds(self.paths['color'])
+        homography_matrix = Homography().load_homography_matrix(self.paths['homography'])
+        focal_length = FocalLength().load_focal_length(self.paths['focal_length'])
+        if focal_length is None:
+            raise ValueError(f"Could not read the focal length from {self.paths['focal_length']}")
+        if homography_matrix.shape != (3, 3):
+            raise ValueError(f"Homography matrix has shape {homography_matrix.shape}, expected (3, 3)")
+        if self.snapshot is not None:
+            # A color file that is still being written parses with classes missing
+            missing = set(self.snapshot.color_ranges) - set(color_ranges)
+            if missing:
+                raise ValueError(f"Color thresholds missing for {sorted(missing)}")
+
+        if os.path.exists(self.paths['intrinsics']):
+            undistortion = UndistortionTable(CameraIntrinsics.load(self.paths['intrinsics']), self.frame_size)
+            bearing_model = BearingModel.from_undistortion(undistortion)
+        else:
+            bearing_model = BearingModel(focal_length, self.frame_size)
+
+        version = self.snapshot.version + 1 if self.snapshot is not None else 1
+        return CalibrationSnapshot(
+            version=version,
+            color_ranges=color_ranges,
+            homography_matrix=homography_matrix,
+            focal_length=focal_length,
+            ground_points=ground_table(homography_matrix, self.frame_size),
+            bearing_model=bearing_model,
+        )
+
+    def load(self):
+        """
+        Load the calibration files and swap in the new snapshot.
+
+        Returns:
+        - The new CalibrationSnapshot. Raises if a file is missing or malformed.
+        """
+        with self._load_lock:
+            mtimes = self._read_mtimes()
+            snapshot = self._build_snapshot()
+            self.snapshot = snapshot  # Single assignment, readers see either the old or the new snapshot
+            self._mtimes = mtimes
+        logger.info(f"Calibration v{snapshot.version} loaded from {self.paths}")
+        return snapshot
+
+    def reload_if_changed(self):
+        """
+        Reload if any calibration file changed since the last load. A file that is
+        half written or malformed is logged and the current snapshot is kept.
+
+        Returns:
+        - True if a new snapshot was swapped in.
+        """
+        mtimes = None
+        try:
+            mtimes = self._read_mtimes()
+            if mtimes == self._mtimes or mtimes == self._failed_mtimes:
+                return False
+            self.load()
+            return True
+        except Exception as e:
+            self._failed_mtimes = mtimes
+            logger.error(f"Calibration reload failed, keeping v{self.snapshot.version if self.snapshot else None}: {e}")
+            return False
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.reload_if_changed()
+
+    def start_watching(self):
+        """
+        Poll the calibration files for changes in a background thread.
+        """
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+            logger.info("Watching calibration files for changes")
+
+    def stop_watching(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
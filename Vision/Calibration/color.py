@@ -2,7 +2,6 @@ import numpy as np
 import csv
 from typing import Dict, Tuple
 import os
-from picamera2 import Picamera2
 import cv2
 import time
 
@@ -81,7 +80,8 @@ class CalibrateColor:
         # Buffer to be applied to the HSV range
         self.bufferHSV = np.array([10, 20, 20])
 
-        # Initialize the camera
+        # Initialize the camera (picamera2 is only needed when calibrating)
+        from picamera2 import Picamera2
         self.cap = Picamera2()
         frameWidth, frameHeight = 820, 616
         config = self.cap.create_video_configuration(main={"format": 'XRGB8888', "size": (frameWidth, frameHeight)})
@@ -2,7 +2,6 @@ import csv
 import cv2
 import numpy as np
 from threading import Thread, Event
-from Vision.Camera.camera import Camera
 from Vision.Detection.marker import Marker
 from Vision.Detection.wall import Wall
 
@@ -34,7 +33,8 @@ class CalibrateFocalLength:
         # Load color thresholds from CSV
         self.color_ranges = self.load_color_thresholds('Vision/Calibration/color_thresholds.csv')
 
-        # Initialize the camera and threading
+        # Initialize the camera and threading (camera stack is only needed when calibrating)
+        from Vision.Camera.camera import Camera
         self.camera = Camera()
         self.stop_event = Event()
         self.live_thread = Thread(target=self.camera.live_feed, args=(self.stop_event,))
@@ -1,7 +1,6 @@
 import csv
 import cv2
 import numpy as np
-from picamera2 import Picamera2
 
 """
 Homography module for loading homography matrix, capturing images, and calibrating the homography matrix.
@@ -93,7 +92,8 @@ class CalibrateHomography:
     def calibrate(self):
         global captured_image
 
-        # Initialize the Picamera2 feed
+        # Initialize the Picamera2 feed (picamera2 is only needed when calibrating)
+        from picamera2 import Picamera2
         picam2 = Picamera2()
         picam2.configure(picam2.create_preview_configuration(main={"format": "XRGB8888", "size": (820, 616)}))  # Set a larger resolution
         picam2.start()
@@ -0,0 +1,240 @@
+import argparse
+import csv
+import glob
+import logging
+import math
+from dataclasses import dataclass
+import cv2
+import numpy as np
+
+"""
+Camera intrinsics and lens distortion.
+
+Calibration (offline, checkerboard images captured with the robot camera):
+    python -m Vision.Calibration.intrinsics "Images/checkerboard/*.png" [--pattern 9x6] [--square 0.025] [--output camera_intrinsics.csv]
+
+The pattern is the number of inner corners (columns x rows). The result is saved at
+the capture resolution and scaled to the processed frame size when loaded.
+
+Correction: frames are never remapped. UndistortionTable stores the undistorted
+position of every pixel of the processed frame (computed once per calibration), so
+correcting a detected keypoint is an array lookup.
+
+Bearings: BearingModel turns a pixel column into a bearing with atan from the focal
+length and principal point, precomputed per column for the processing resolution.
+Without camera_intrinsics.csv it uses the calibrated focal length (focal_length.csv)
+and the image centre. for_frame_size() rescales it when the frames are resized.
+"""
+
+logger = logging.getLogger(__name__)
+
+PATTERN = (9, 6)  # Inner corners (columns, rows)
+SQUARE_SIZE = 0.025  # m
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+@dataclass(frozen=True)
+class CameraIntrinsics:
+    camera_matrix: np.ndarray  # 3x3
+    dist_coeffs: np.ndarray  # k1, k2, p1, p2, k3
+    image_size: tuple  # (width, height) the calibration was done at
+    rms_error: float = None  # Reprojection error of the calibration (pixels)
+
+    def scaled(self, frame_size):
+        """
+        Intrinsics for another resolution of the same sensor mode (e.g. the 410x308 processed frames).
+        """
+        sx = frame_size[0] / self.image_size[0]
+        sy = frame_size[1] / self.image_size[1]
+        camera_matrix = self.camera_matrix.copy()
+        camera_matrix[0, :] *= sx
+        camera_matrix[1, :] *= sy
+        return CameraIntrinsics(camera_matrix, self.dist_coeffs.copy(), tuple(frame_size), self.rms_error)
+
+    def save(self, path):
+        with open(path, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['image_size'] + list(self.image_size))
+            writer.writerow(['camera_matrix'] + [repr(float(value)) for value in self.camera_matrix.ravel()])
+            writer.writerow(['dist_coeffs'] + [repr(float(value)) for value in self.dist_coeffs.ravel()])
+            if self.rms_error is not None:
+                writer.writerow(['rms_error', repr(float(self.rms_error))])
+
+    @classmethod
+    def load(cls, path):
+        rows = {}
+        with open(path, mode='r') as file:
+            for row in csv.reader(file):
+                if row:
+                    rows[row[0]] = row[1:]
+        return cls(
+            camera_matrix=np.array([float(value) for value in rows['camera_matrix']]).reshape(3, 3),
+            dist_coeffs=np.array([float(value) for value in rows['dist_coeffs']]),
+            image_size=tuple(int(value) for value in rows['image_size']),
+            rms_error=float(rows['rms_error'][0]) if 'rms_error' in rows else None,
+        )
+
+
+class UndistortionTable:
+    def __init__(self, intrinsics, frame_size):
+        """
+        Precompute the undistorted position of every pixel.
+
+        Args:
+        - intrinsics: CameraIntrinsics (any resolution, scaled to frame_size).
+        - frame_size: (width, height) of the processed frames.
+        """
+        self.intrinsics = intrinsics.scaled(frame_size)
+        camera_matrix = self.intrinsics.camera_matrix
+        self.fx, self.cx = camera_matrix[0, 0], camera_matrix[0, 2]
+        self.fy, self.cy = camera_matrix[1, 1], camera_matrix[1, 2]
+
+        # One extra row and column, detectors use bottom edges (y + h) one past the last pixel
+        width, height = frame_size
+        xs, ys = np.meshgrid(np.arange(width + 1), np.arange(height + 1))
+        points = np.stack([xs, ys], axis=-1).astype(np.float32).reshape(-1, 1, 2)
+        undistorted = cv2.undistortPoints(points, camera_matrix, self.intrinsics.dist_coeffs, P=camera_matrix)
+        self.table = undistorted.reshape(height + 1, width + 1, 2)
+
+    def point(self, x, y):
+        """
+        Undistorted pixel coordinates of a (integer) keypoint.
+        """
+        x = min(max(int(x), 0), self.table.shape[1] - 1)
+        y = min(max(int(y), 0), self.table.shape[0] - 1)
+        return self.table[y, x]
+
+    def bearing(self, x, y=None):
+        """
+        Bearing (deg, positive to the right) of a keypoint. Without a row, the principal
+        row is used.
+        """
+        undistorted_x = self.point(x, self.cy if y is None else y)[0]
+        return math.degrees(math.atan2(undistorted_x - self.cx, self.fx))
+
+
+class BearingModel:
+    def __init__(self, focal_length, frame_size, principal_x=None, undistortion=None):
+        """
+        Pinhole bearing model with a per-column lookup table for one frame size.
+
+        Args:
+        - focal_length: Horizontal focal length (pixels) at frame_size.
+        - frame_size: (width, height) the focal length and principal point are given for.
+        - principal_x: Principal point column (pixels), the image centre if None.
+        - undistortion: UndistortionTable for frame_size, for keypoints with a known row.
+        """
+        self.focal_length = float(focal_length)
+        self.frame_size = tuple(frame_size)
+        self.principal_x = frame_size[0] / 2 if principal_x is None else float(principal_x)
+        self.undistortion = undistortion
+
+        # Bearing (deg) of every column, one extra for right edges (x + w). With a lens
+        # model, the columns are undistorted along the principal row.
+        if undistortion is not None:
+            row = min(max(int(round(undistortion.cy)), 0), undistortion.table.shape[0] - 1)
+            xs = undistortion.table[row, :, 0].astype(float)
+        else:
+            xs = np.arange(frame_size[0] + 1, dtype=float)
+        self.columns = np.degrees(np.arctan2(xs - self.principal_x, self.focal_length))
+        self._column_list = self.columns.tolist()  # Python floats are faster to index one at a time
+        self._resized = {self.frame_size: self}
+
+    @classmethod
+    def from_undistortion(cls, undistortion):
+        """
+        Model using the calibrated intrinsics and lens distortion of an UndistortionTable.
+        """
+        return cls(undistortion.fx, undistortion.intrinsics.image_size, undistortion.cx, undistortion)
+
+    def for_frame_size(self, frame_size):
+        """
+        The same camera at another processing resolution (built once per size, then cached).
+        """
+        frame_size = tuple(frame_size)
+        model = self._resized.get(frame_size)
+        if model is None:
+            scale = frame_size[0] / self.frame_size[0]
+            undistortion = None
+            if self.undistortion is not None:
+                undistortion = UndistortionTable(self.undistortion.intrinsics, frame_size)
+            model = BearingModel(self.focal_length * scale, frame_size, self.principal_x * scale, undistortion)
+            self._resized[frame_size] = model
+        return model
+
+    def bearing(self, x, y=None):
+        """
+        Bearing (deg, positive to the right) of a pixel column, interpolated between columns.
+        With a lens model and a row, the keypoint is undistorted at that row instead.
+        """
+        if self.undistortion is not None and y is not None:
+            return self.undistortion.bearing(x, y)
+        columns = self._column_list
+        x = min(max(x, 0), len(columns) - 1)
+        index = int(x)
+        if index == x:
+            return columns[index]
+        return columns[index] + (x - index) * (columns[index + 1] - columns[index])
+
+
+def find_corners(image, pattern=PATTERN):
+    """
+    Checkerboard corners of one BGR or gray image with subpixel refinement, None if not found.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    found, corners = cv2.findChessboardCorners(gray, pattern, cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    return cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), SUBPIX_CRITERIA)
+
+
+def calibrate(images, pattern=PATTERN, square_size=SQUARE_SIZE):
+    """
+    Calibrate the intrinsics from checkerboard images.
+
+    Args:
+    - images: Iterable of BGR or gray images, all the same size.
+    - pattern: Inner corners (columns, rows).
+    - square_size: Checkerboard square size (m).
+
+    Returns:
+    - CameraIntrinsics, and the number of images the board was found in.
+    """
+    board = np.zeros((pattern[0] * pattern[1], 3), np.float32)
+    board[:, :2] = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2) * square_size
+
+    object_points, image_points, image_size = [], [], None
+    for image in images:
+        image_size = (image.shape[1], image.shape[0])
+        corners = find_corners(image, pattern)
+        if corners is not None:
+            object_points.append(board)
+            image_points.append(corners)
+    if len(image_points) < 3:
+        raise ValueError(f"Checkerboard found in {len(image_points)} images, at least 3 are needed")
+
+    rms_error, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(object_points, image_points, image_size, None, None)
+    return CameraIntrinsics(camera_matrix, dist_coeffs.ravel(), image_size, rms_error), len(image_points)
+
+
+def main(argv=None):
+    from .calibration_store import calibration_paths
+
+    parser = argparse.ArgumentParser(description="Calibrate the camera intrinsics from checkerboard images")
+    parser.add_argument('images', nargs='+', help="Image files or glob patterns")
+    parser.add_argument('--pattern', default=f"{PATTERN[0]}x{PATTERN[1]}", help="Inner corners, columns x rows")
+    parser.add_argument('--square', type=float, default=SQUARE_SIZE, help="Square size (m)")
+    parser.add_argument('--output', default=calibration_paths()['intrinsics'], help="Intrinsics file to write")
+    args = parser.parse_args(argv)
+
+    pattern = tuple(int(value) for value in args.pattern.lower().split('x'))
+    paths = sorted({path for pattern_or_path in args.images for path in glob.glob(pattern_or_path)})
+    intrinsics, used = calibrate((cv2.imread(path) for path in paths), pattern, args.square)
+    intrinsics.save(args.output)
+    print(f"Board found in {used}/{len(paths)} images, RMS reprojection error {intrinsics.rms_error:.3f} px")
+    print(f"Camera matrix:\n{intrinsics.camera_matrix}\nDistortion: {intrinsics.dist_coeffs}")
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,33 @@
 import cv2
 import numpy as np
 
+
 class DetectionBase:
     def __init__(self, name):
         self.name = name
         self.detected_objects = []
 
+    def set_calibration(self, homography_matrix=None, focal_length=None, ground_points=None, bearing_model=None):
+        """
+        Swap in new calibration values (called between frames, see Vision.process_image).
+        Values left as None are kept.
+
+        bearing_model is the only lens-dependent value: with camera_intrinsics.csv it carries
+        the undistortion table, without it the linear model from the focal length. The
+        calibration store always builds one, so there is no need to pass None to reset it.
+        """
+        for target in (self, getattr(self, 'distance_estimator', None)):
+            if target is None:
+                continue
+            if homography_matrix is not None and hasattr(target, 'homography_matrix'):
+                target.homography_matrix = homography_matrix
+            if focal_length is not None and hasattr(target, 'focal_length'):
+                target.focal_length = focal_length
+            if ground_points is not None and hasattr(target, 'ground_points'):
+                target.ground_points = ground_points
+            if bearing_model is not None and hasattr(target, 'bearing_model'):
+                target.bearing_model = bearing_model
+
     def analyze_contours(self, image, mask, min_area=150, min_aspect_ratio=0.3, max_aspect_ratio=3.0):
         """
         Base analyze_contours function to be overridden by subclasses for specific logic.
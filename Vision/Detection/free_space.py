@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+from .detection import DetectionBase  # Import DetectionBase from detection.py
+from .range_bearing import DistanceEstimation  # Import the DistanceEstimation class
+from ..Preprocessing.frame_features import FrameFeatures
+
+
+class FreeSpace(DetectionBase):
+    # Classes treated as "not floor" and the morphology applied to each mask (shared with their detectors)
+    OBSTACLE_CLASSES = (('Obstacle', ('open', 'close')), ('Shelf', ('open',)))
+
+    def __init__(self, homography_matrix=None, camera_fov=70, min_row=30, draw=False):
+        """
+        Initializes the FreeSpace class with optional parameters.
+
+        Args:
+        - homography_matrix: Matrix used for perspective transformation (image -> ground).
+        - camera_fov: Camera field of view in degrees; the histogram has camera_fov + 1 bins.
+        - min_row: Pixels above this row are ignored (same cut-off as the Obstacle detector).
+        - draw: Flag to enable or disable drawing the free space boundary.
+        """
+        super().__init__("FreeSpace")
+        self.distance_estimator = DistanceEstimation(homography_matrix=homography_matrix)
+        self.homography_matrix = homography_matrix
+        self.camera_fov = camera_fov
+        self.min_row = min_row
+        self.draw = draw  # Flag to control drawing
+        self._column_bins = None  # Histogram bin of every image column, built on first frame
+        self._bins_model = None  # Bearing model the bins were built with
+
+    def find_free_space(self, image, RGBframe, color_ranges, features=None):
+        """
+        Scans every image column for the nearest non-floor pixel and builds a polar range histogram.
+
+        Args:
+        - image: Input image from the camera.
+        - RGBframe: RGB frame to draw on.
+        - color_ranges: Dictionary with HSV color ranges.
+        - features: Per-frame FrameFeatures cache (created if omitted).
+
+        Returns:
+        - range_profile: Array of camera_fov + 1 ranges (m), one per degree from -fov/2 to fov/2.
+                         np.inf where the column is free.
+        - final_image: Processed image with or without the free space boundary drawn.
+        - mask: Binary mask of all non-floor pixels used for the scan.
+        """
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+
+        # 1. Combine obstacle masks
+        mask = self._obstacle_mask(features)
+
+        # 2. Bottom-most non-floor pixel in each column
+        columns, rows = self._nearest_rows(mask)
+
+        # 3. Ground range for each of those pixels, reduced into 1 degree bins
+        range_profile = self._range_profile(mask.shape[1], columns, rows)
+
+        # 4. Draw if enabled
+        final_image = self._draw_if_enabled(RGBframe, columns, rows)
+
+        return range_profile, final_image, mask
+
+    def _obstacle_mask(self, features):
+        """
+        Union of the (cached) masks of every obstacle class.
+        """
+        def compute():
+            masks = [features.morphology(name, ops) for name, ops in self.OBSTACLE_CLASSES]
+            mask = masks[0].copy()
+            for other in masks[1:]:
+                cv2.bitwise_or(mask, other, dst=mask)
+            mask[:self.min_row] = 0
+            return mask
+
+        return features.get(('FreeSpace', 'mask', self.min_row), compute)
+
+    @staticmethod
+    def _nearest_rows(mask):
+        """
+        Returns the columns that contain a non-floor pixel and the row of the lowest one.
+        """
+        occupied = mask[::-1] > 0  # Flip so argmax finds the bottom-most pixel
+        has_pixel = occupied.any(axis=0)
+        columns = np.flatnonzero(has_pixel)
+        rows = mask.shape[0] - 1 - occupied[:, columns].argmax(axis=0)
+        return columns, rows
+
+    def _range_profile(self, image_width, columns, rows):
+        """
+        Maps the (column, row) pixels to ground range and keeps the minimum range per degree bin.
+        """
+        profile = np.full(self.camera_fov + 1, np.inf)
+        if self.homography_matrix is None or columns.size == 0:
+            return profile
+
+        table = self.distance_estimator.ground_points
+        if table is not None and table.shape[1] > columns.max() and table.shape[0] > rows.max():
+            ground = table[rows, columns]
+        else:
+            points = np.stack([columns, rows], axis=1).astype(np.float32).reshape(-1, 1, 2)
+            ground = cv2.perspectiveTransform(points, self.homography_matrix).reshape(-1, 2)
+        ranges = np.hypot(ground[:, 0], ground[:, 1])
+
+        np.minimum.at(profile, self._bins(image_width)[columns], ranges)
+        return profile
+
+    def _bins(self, image_width):
+        """
+        Histogram bin of each image column, using the same bearing model as the detectors.
+        """
+        model = self.distance_estimator.bearing_model
+        if self._column_bins is None or self._column_bins.size != image_width or self._bins_model is not model:
+            self._bins_model = model
+            if model is not None and model.frame_size[0] == image_width:
+                bearings = model.columns[:image_width]
+            else:
+                bearings = np.array([self.distance_estimator.estimate_bearing(x) for x in range(image_width)])
+            bins = np.rint(bearings).astype(int) + self.camera_fov // 2
+            self._column_bins = np.clip(bins, 0, self.camera_fov)
+        return self._column_bins
+
+    def _draw_if_enabled(self, image, columns, rows):
+        """
+        Draw the free space boundary if the draw flag is enabled.
+        """
+        if not self.draw:
+            return image  # Return the original image if drawing is disabled
+
+        image[rows, columns] = (0, 0, 255)
+        return image
@@ -3,6 +3,7 @@ import numpy as np
 from .detection import DetectionBase  # Import DetectionBase from detection.py
 from .range_bearing import DistanceEstimation  # Import the DistanceEstimation class
 from ..Preprocessing.preprocessing import Preprocessing  # Import Preprocessing class
+from ..Preprocessing.frame_features import FrameFeatures
 
 class Item(DetectionBase):
     def __init__(self, real_item_width=0.044, focal_length=300, draw=False):
@@ -16,28 +17,44 @@ class Item(DetectionBase):
         """
         super().__init__("Item")
         self.real_item_width = real_item_width
+        self.item_name = None  # Name of the target item, if set from the item catalog
         self.focal_length = focal_length
         self.distance_estimator = DistanceEstimation(focal_length=focal_length)
         self.draw = draw  # Flag to control drawing
 
-    def find_item(self, image, RGBframe, color_ranges):
+    def set_item(self, real_item_width, item_name=None):
+        """
+        Switch the target item in place (no need to rebuild the detector).
+
+        Args:
+        - real_item_width: Real-world width of the item (in meters).
+        - item_name: Optional item name, shown in the drawn labels.
+        """
+        self.real_item_width = real_item_width
+        self.item_name = item_name
+
+    def find_item(self, image, RGBframe, color_ranges, features=None):
         """
         Detects items using color and contour analysis.
 
         Args:
         - image: Input image from the camera.
         - color_ranges: Dictionary with HSV color ranges for item detection.
+        - features: Per-frame FrameFeatures cache (created if omitted).
 
         Returns:
         - data_list: List of detected item "data" (bearing and distance).
         - final_image: Processed image with or without bounding boxes and labels.
         - mask: Binary mask representing detected items.
         """
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+
         # 1. Preprocess Image
-        mask = self._preprocess_image(image, color_ranges)
+        mask = features.mask('Item')
 
         # 2. Detect Items (sorted by level and area)
-        detected_items = self._detect_items(mask)
+        detected_items = self._detect_items(features)
 
         # 3. Extract Data (Distance, Bearing, Level)
         data_list = [obj["data"] for obj in detected_items]
@@ -48,40 +65,29 @@ class Item(DetectionBase):
 
         return data_list, final_image, mask
 
-    def _preprocess_image(self, image, color_ranges):
-        """
-        Preprocess the image using defined color ranges.
-        """
-        lower_hsv, upper_hsv = color_ranges['Item']
-        mask, _ = Preprocessing.preprocess(image, lower_hsv=lower_hsv, upper_hsv=upper_hsv)
-        return mask
-
-    def _detect_items(self, mask, min_area=40):
+    def _detect_items(self, features, min_area=40):
         """
         Analyzes contours to detect items and estimates their distance and bearing.
 
         Args:
-        - mask: Binary mask from preprocessing.
+        - features: FrameFeatures cache for the current frame.
         - min_area: Minimum area for contour detection.
 
         Returns:
         - List of detected objects with position, distance, and bearing.
         """
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         detected_objects = []
 
-        image_height, image_width = mask.shape[:2]  # Get image dimensions for classification
+        image_height, image_width = features.shape  # Get image dimensions for classification
 
-        for contour in contours:
-            area = cv2.contourArea(contour)
+        for contour, area, (x, y, w, h) in features.contour_stats('Item'):
             if area < min_area:
                 continue
 
-            x, y, w, h = cv2.boundingRect(contour)
             distance = self.distance_estimator.estimate_distance(w, self.real_item_width)
             object_center_x = x + (w // 2)
             object_center_y = y + (h//2)
-            bearing = self.distance_estimator.estimate_bearing(object_center_x)
+            bearing = self.distance_estimator.estimate_bearing(object_center_x, object_center_y=object_center_y)
             level = self.classify_item_level(object_center_y, image_height)
 
             detected_objects.append({
@@ -134,6 +140,8 @@ class Item(DetectionBase):
 
             # Display distance and bearing below the item
             label = f"{distance:.2f}m, {bearing:.2f}deg"
+            if self.item_name:
+                label = f"{self.item_name} {label}"
             label_position = (center_x, center_y + 20)
             cv2.putText(image, label, label_position, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
 
@@ -0,0 +1,85 @@
+import csv
+import logging
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+"""
+Item catalog: geometry and pickup parameters for every item, loaded once from
+item_catalog.csv (next to this file).
+
+Columns:
+- name: Item name as used in the Order_*.csv files.
+- aliases: Other spellings of the name, separated by '|' (e.g. Wheetbots).
+- width: Real item width (m), used by the item detector for distance estimation.
+- pickup_0..pickup_2: Distance to stop from the shelf (m) at shelf height 0, 1 and 2.
+
+Items are segmented with the calibrated 'Item' range from color_thresholds.csv.
+"""
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "item_catalog.csv")
+HEIGHT_LEVELS = 3
+
+
+@dataclass(frozen=True)
+class ItemSpec:
+    name: str
+    width: float  # Real item width (m)
+    pickup_distances: tuple  # Distance to stop from the shelf (m) per height level
+
+    def pickup_distance(self, height):
+        return self.pickup_distances[height]
+
+
+class ItemCatalog:
+    def __init__(self, path=CATALOG_PATH):
+        """
+        Load the catalog.
+
+        Args:
+        - path: Path to the catalog csv.
+        """
+        self.items = {}
+        self.aliases = {}
+        with open(path, mode="r", encoding='utf-8-sig', newline='') as csv_file:
+            for record in csv.DictReader(csv_file):
+                spec = ItemSpec(
+                    name=record['name'].strip(),
+                    width=float(record['width']),
+                    pickup_distances=tuple(float(record[f'pickup_{height}']) for height in range(HEIGHT_LEVELS)),
+                )
+                self.items[spec.name] = spec
+                for alias in filter(None, (alias.strip() for alias in record['aliases'].split('|'))):
+                    self.aliases[alias] = spec.name
+        self.names = tuple(self.items)
+
+    def canonical_name(self, name):
+        name = name.strip()
+        return self.aliases.get(name, name)
+
+    def get(self, name):
+        """
+        Spec for an item name or alias, None if the item is unknown.
+        """
+        return self.items.get(self.canonical_name(name))
+
+    def __getitem__(self, name):
+        spec = self.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown item '{name}'")
+        return spec
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+@lru_cache(maxsize=None)
+def load_catalog(path=CATALOG_PATH):
+    """
+    Shared catalog instance (the file is read once per path).
+    """
+    catalog = ItemCatalog(path)
+    logger.debug(f"Loaded item catalog: {', '.join(catalog.names)}")
+    return catalog
@@ -5,6 +5,8 @@ from collections import Counter
 from .detection import DetectionBase  # Import DetectionBase from detection.py
 from .range_bearing import DistanceEstimation  # Import the DistanceEstimation class
 from ..Preprocessing.preprocessing import Preprocessing  # Import Preprocessing class
+from ..Preprocessing.frame_features import FrameFeatures
+from .wall import Wall
 
 class Marker(DetectionBase):
     def __init__(self, real_marker_height=0.07, focal_length=300, draw=False):
@@ -14,26 +16,32 @@ class Marker(DetectionBase):
         self.distance_estimator = DistanceEstimation(focal_length=focal_length)
         self.draw = draw  # Flag to control drawing
 
-    def find_marker(self, image, RGBframe, color_ranges, filled_wall_mask=None):
+    def find_marker(self, image, RGBframe, color_ranges, filled_wall_mask=None, features=None):
         """
         Detect markers using color and contour analysis.
 
         Args:
         - image: Input image from the camera.
         - RGBframe: The RGB image to display results on.
-        - filled_wall_mask: Mask used to isolate markers on walls.
+        - filled_wall_mask: Mask used to isolate markers on walls (taken from features if omitted).
         - color_ranges: Dictionary with HSV color ranges for marker detection.
+        - features: Per-frame FrameFeatures cache (created if omitted).
 
         Returns:
         - data_list: List of detected markers with average values in the format [[T, R, B]].
         - final_image: Processed image with or without bounding boxes and labels.
         - mask: Binary mask representing detected markers.
         """
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+        if filled_wall_mask is None:
+            filled_wall_mask = features.peek(Wall.FILLED_MASK_KEY)
+
         # 1. Preprocess Image
-        mask = self._preprocess_image(image, color_ranges)
+        mask = features.mask('Marker')
 
         # Use bitwise AND to keep only markers on the wall
-        marker_on_wall_mask = cv2.bitwise_and(mask, filled_wall_mask)
+        marker_on_wall_mask = cv2.bitwise_and(mask, filled_wall_mask) if filled_wall_mask is not None else mask
 
         # 2. Detect Markers and Calculate Properties
         detected_markers = self._detect_and_classify_markers(marker_on_wall_mask)
@@ -59,14 +67,6 @@ class Marker(DetectionBase):
 
         return data_list, final_image, marker_on_wall_mask
 
-    def _preprocess_image(self, image, color_ranges):
-        """
-        Preprocess the image using defined color ranges.
-        """
-        lower_hsv, upper_hsv = color_ranges['Marker']
-        mask, _ = Preprocessing.preprocess(image, lower_hsv=lower_hsv, upper_hsv=upper_hsv)
-        return mask
-
     def _detect_and_classify_markers(self, mask, min_area=15):
         """
         Detects markers, classifies shapes, and calculates distances and bearings.
@@ -115,7 +115,7 @@ class Marker(DetectionBase):
 
             # Estimate distance and bearing
             distance = self.distance_estimator.estimate_distance(marker_height, self.real_marker_height)
-            bearing = self.distance_estimator.estimate_bearing(marker_center_x)
+            bearing = self.distance_estimator.estimate_bearing(marker_center_x, object_center_y=y + (h / 2))
 
             detected_markers.append({
                 "position": (x, y, w, h),
@@ -3,9 +3,12 @@ import numpy as np
 from .detection import DetectionBase  # Import DetectionBase from detection.py
 from .range_bearing import DistanceEstimation  # Import the DistanceEstimation class
 from ..Preprocessing.preprocessing import Preprocessing  # Import Preprocessing class
+from ..Preprocessing.frame_features import FrameFeatures
 
 
 class Obstacle(DetectionBase):
+    MORPHOLOGY_OPS = ('open', 'close')
+
     def __init__(self, real_obstacle_width=0.05, focal_length=300, homography_matrix=None, draw=False):
         """
         Initializes the Obstacle class with optional parameters.
@@ -22,24 +25,28 @@ class Obstacle(DetectionBase):
         self.distance_estimator = DistanceEstimation(homography_matrix=homography_matrix)
         self.draw = draw  # Flag to control drawing
 
-    def find_obstacle(self, image, RGBframe, color_ranges):
+    def find_obstacle(self, image, RGBframe, color_ranges, features=None):
         """
         Detects obstacles using color and contour analysis.
 
         Args:
         - image: Input image from the camera.
         - color_ranges: Dictionary with HSV color ranges for obstacle detection.
+        - features: Per-frame FrameFeatures cache (created if omitted).
 
         Returns:
         - data_list: List of detected obstacle "data" (bearing and distance).
         - final_image: Processed image with or without bounding boxes and labels.
         - mask: Binary mask representing detected obstacles.
         """
-        # 1. Preprocess Image
-        mask = self._preprocess_image(image, color_ranges)
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+
+        # 1. Preprocess Image (opening removes noise, closing fills small holes)
+        mask = features.morphology('Obstacle', self.MORPHOLOGY_OPS)
 
         # 2. Detect Obstacles
-        detected_obstacles = self._detect_obstacles(mask)
+        detected_obstacles = self._detect_obstacles(features)
 
         # 3. Extract Data (Bearing, Distance)
         data_list = [obj["data"] for obj in detected_obstacles]
@@ -50,49 +57,29 @@ class Obstacle(DetectionBase):
 
         return data_list, final_image, mask
 
-    def _preprocess_image(self, image, color_ranges):
-        """
-        Preprocess the image using defined color ranges.
-        """
-        lower_hsv, upper_hsv = color_ranges['Obstacle']
-        mask, _ = Preprocessing.preprocess(image,lower_hsv=lower_hsv,upper_hsv=upper_hsv)
-
-        # Define a kernel for the morphological operations
-        kernel = np.ones((5, 5), np.uint8)  # You can adjust the size (5, 5) as needed
-
-        # Apply the opening operation (erosion followed by dilation) to remove noise
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-
-        # Apply the closing operation (dilation followed by erosion) to fill small holes
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-        
-        return mask
-
-    def _detect_obstacles(self, mask, min_area=600):
+    def _detect_obstacles(self, features, min_area=600):
         """
         Analyzes contours to detect obstacles and estimates their distance and bearing.
 
         Args:
-        - mask: Binary mask from preprocessing.
-        - image_width: Width of the input image.
+        - features: FrameFeatures cache for the current frame.
         - min_area: Minimum area for contour detection.
 
         Returns:
         - List of detected objects with position, distance, and bearing.
         """
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         detected_objects = []
 
-        for contour in contours:
-            if cv2.contourArea(contour) < min_area:
+        for contour, area, (x, y, w, h) in features.contour_stats('Obstacle', self.MORPHOLOGY_OPS):
+            if area < min_area:
                 continue
 
-            x, y, w, h = cv2.boundingRect(contour)
             if y < 30:
                 continue
             distance = self.distance_estimator.estimate_homography_distance((x, y, w, h))
             object_center_x = x + (w // 2)
-            bearing = self.distance_estimator.estimate_bearing(object_center_x)
+            object_center_y = y + (h // 2)
+            bearing = self.distance_estimator.estimate_bearing(object_center_x, object_center_y=object_center_y)
 
             # Store position, distance, and bearing with "data"
             detected_objects.append({
@@ -3,6 +3,7 @@ import numpy as np
 from .detection import DetectionBase  # Import DetectionBase from detection.py
 from .range_bearing import DistanceEstimation  # Import the DistanceEstimation class
 from ..Preprocessing.preprocessing import Preprocessing  # Import Preprocessing class
+from ..Preprocessing.frame_features import FrameFeatures
 
 class PackingStationRamp(DetectionBase):
     def __init__(self, real_station_width=0.8, focal_length=300, homography_matrix=None, draw=False):
@@ -21,24 +22,28 @@ class PackingStationRamp(DetectionBase):
         self.distance_estimator = DistanceEstimation(homography_matrix=homography_matrix)
         self.draw = draw  # Flag to control drawing
 
-    def find_packing_station_ramp(self, image, RGBframe, color_ranges):
+    def find_packing_station_ramp(self, image, RGBframe, color_ranges, features=None):
         """
         Detects the packing station ramp using color and contour analysis.
 
         Args:
         - image: Input image from the camera.
         - color_ranges: Dictionary with HSV color ranges for ramp detection.
+        - features: Per-frame FrameFeatures cache (created if omitted).
 
         Returns:
         - data_list: List of detected ramp "data" (bearing and distance).
         - final_image: Processed image with or without bounding boxes and labels.
         - mask: Binary mask representing detected ramp.
         """
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+
         # 1. Preprocess Image
-        mask = self._preprocess_image(image, color_ranges)
+        mask = features.mask('Ramp')
 
         # 2. Detect Ramp
-        detected_ramp = self._detect_ramp(mask)
+        detected_ramp = self._detect_ramp(features)
 
         # 3. Extract Data (Distance, Bearing)
         data_list = [obj["data"] for obj in detected_ramp]
@@ -49,36 +54,27 @@ class PackingStationRamp(DetectionBase):
 
         return data_list, final_image, mask
 
-    def _preprocess_image(self, image, color_ranges):
-        """
-        Preprocess the image using defined color ranges.
-        """
-        lower_hsv, upper_hsv = color_ranges['Ramp']
-        mask, _ = Preprocessing.preprocess(image, lower_hsv=lower_hsv, upper_hsv=upper_hsv)
-        return mask
-
-    def _detect_ramp(self, mask, min_area=1000):
+    def _detect_ramp(self, features, min_area=1000):
         """
         Analyzes contours to detect the ramp and estimates their distance and bearing.
 
         Args:
-        - mask: Binary mask from preprocessing.
+        - features: FrameFeatures cache for the current frame.
         - min_area: Minimum area for contour detection.
 
         Returns:
         - List of detected objects with position, distance, and bearing.
         """
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         detected_objects = []
 
-        for contour in contours:
-            if cv2.contourArea(contour) < min_area:
+        for contour, area, (x, y, w, h) in features.contour_stats('Ramp'):
+            if area < min_area:
                 continue
 
-            x, y, w, h = cv2.boundingRect(contour)
             distance = self.distance_estimator.estimate_homography_distance((x, y, w, h))
             object_center_x = x + (w // 2)
-            bearing = self.distance_estimator.estimate_bearing(object_center_x)
+            object_center_y = y + (h // 2)
+            bearing = self.distance_estimator.estimate_bearing(object_center_x, object_center_y=object_center_y)
 
             # Store position, distance, and bearing with "data"
             detected_objects.append({
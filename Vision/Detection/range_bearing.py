@@ -10,16 +10,29 @@ After contours analyzation, we can estimate the distance and bearing of the dete
 #homography_matrix = None
 
 class DistanceEstimation:
-    def __init__(self, homography_matrix=None, focal_length=None):
+    def __init__(self, homography_matrix=None, focal_length=None, ground_points=None, bearing_model=None):
         self.homography_matrix = homography_matrix
         self.focal_length = focal_length
+        self.ground_points = ground_points  # Optional pixel-to-ground table (calibration_store.ground_table)
+        self.bearing_model = bearing_model  # Calibrated intrinsics.BearingModel, set by Vision
+
+    def ground_point(self, x, y):
+        """
+        Ground coordinates of a pixel, from the ground table when the pixel is inside it.
+        """
+        if self.ground_points is not None and 0 <= y < self.ground_points.shape[0] and 0 <= x < self.ground_points.shape[1]:
+            return self.ground_points[y, x]
+        return self.apply_homography_to_point(x, y, self.homography_matrix)
         
     def estimate_distance(self, object_width, real_object_width):
         distance = (real_object_width * self.focal_length) / object_width
         return round(distance, 2)
 
-    @staticmethod
-    def estimate_bearing(object_center_x, half_image_width=210, max_bearing_angle=35):
+    def estimate_bearing(self, object_center_x, half_image_width=210, max_bearing_angle=35, object_center_y=None):
+        # Calibrated camera model (per-column lookup), the linear approximation until one is set
+        if self.bearing_model is not None:
+            return self.bearing_model.bearing(object_center_x, object_center_y)
+
         offset = object_center_x - half_image_width
         bearing = (max_bearing_angle * offset) / half_image_width
         return round(bearing, 2)
@@ -41,7 +54,7 @@ class DistanceEstimation:
         bottom_center_x = x + w // 2
         bottom_center_y = y + h
 
-        ground_coords = self.apply_homography_to_point(bottom_center_x, bottom_center_y, self.homography_matrix)
+        ground_coords = self.ground_point(bottom_center_x, bottom_center_y)
         distance = np.sqrt(ground_coords[0]**2 + ground_coords[1]**2) # type: ignore
         return round(distance, 2) # type: ignore
     
\ No newline at end of file
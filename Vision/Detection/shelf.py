@@ -3,6 +3,7 @@ import numpy as np
 from .detection import DetectionBase  # Import DetectionBase from detection.py
 from .range_bearing import DistanceEstimation  # Import the DistanceEstimation class
 from ..Preprocessing.preprocessing import Preprocessing
+from ..Preprocessing.frame_features import FrameFeatures
 
 class Shelf(DetectionBase):
     def __init__(self, real_shelf_width=0.5, focal_length=300, homography_matrix=None, draw=False):
@@ -21,15 +22,20 @@ class Shelf(DetectionBase):
         self.distance_estimator = DistanceEstimation(homography_matrix=homography_matrix)
         self.draw = draw  # Flag to control drawing
 
-    def find_shelf(self, image, RGBframe, color_ranges):
+    def find_shelf(self, image, RGBframe, color_ranges, features=None):
         """
         Detect the shelf by creating a mask based on the color range, analyzing contours, and calculating range/bearing for corners.
+
+        features is the per-frame FrameFeatures cache shared with the other detectors; a private one is created if omitted.
         """
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+
         # 1. Preprocess Image
-        mask = self._preprocess_image(image, color_ranges)
+        mask = features.mask('Shelf')
 
         # 2. Detect Shelves
-        detected_shelves = self._detect_shelves(mask)
+        detected_shelves = self._detect_shelves(features)
 
         # 3. Process Corners (Bottom-left and Bottom-right) and calculate range/bearing
         data_list = []
@@ -47,45 +53,23 @@ class Shelf(DetectionBase):
 
         return data_list, final_image, mask
 
-    def _preprocess_image(self, image, color_ranges):
-        """
-        Preprocess the image using the defined color ranges.
-        """
-        lower_hsv, upper_hsv = color_ranges['Shelf']
-        mask, _ = Preprocessing.preprocess(image, lower_hsv=lower_hsv, upper_hsv=upper_hsv)
-
-        # Define a kernel for the morphological operations
-        kernel = np.ones((5, 5), np.uint8)  # You can adjust the size (5, 5) as needed
-
-        # Apply the opening operation (erosion followed by dilation) to remove noise
-        #mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
-
-        # Apply the closing operation (dilation followed by erosion) to fill small holes
-        #mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
-
-        return mask
-
-
-    def _detect_shelves(self, mask, min_area=1200):
+    def _detect_shelves(self, features, min_area=1200):
         """
         Analyzes contours to detect shelves and calculates range/bearing for their corners.
 
         Args:
-        - mask: Binary mask from preprocessing.
+        - features: FrameFeatures cache for the current frame.
         - min_area: Minimum area for contour detection.
 
         Returns:
         - List of detected shelf objects.
         """
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         detected_objects = []
 
-        for contour in contours:
-            area = cv2.contourArea(contour)
+        for contour, area, (x, y, w, h) in features.contour_stats('Shelf'):
             if area < min_area:
                 continue  # Skip small contours
 
-            x, y, w, h = cv2.boundingRect(contour)
             hull = cv2.convexHull(contour)
 
             # Simplify contour using cv2.approxPolyDP
@@ -120,7 +104,7 @@ class Shelf(DetectionBase):
             if corner is not None:
                 # Calculate homography distance and bearing
                 distance = self.distance_estimator.estimate_homography_distance((corner[0], corner[1], 0, 0))
-                bearing = self.distance_estimator.estimate_bearing(corner[0])
+                bearing = self.distance_estimator.estimate_bearing(corner[0], object_center_y=corner[1])
 
                 # Append in the format [corner_type, distance, bearing, position] where corner_type is 1 or 2
                 shelf_data.append([corner_type, distance, bearing, corner])
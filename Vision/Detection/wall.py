@@ -3,8 +3,12 @@ import numpy as np
 from .detection import DetectionBase  # Import DetectionBase from detection.py
 from .range_bearing import DistanceEstimation  # Import the DistanceEstimation class
 from ..Preprocessing.preprocessing import Preprocessing  # Import Preprocessing class
+from ..Preprocessing.frame_features import FrameFeatures
 
 class Wall(DetectionBase):
+    # FrameFeatures key of the filled wall mask, shared with the Marker detector
+    FILLED_MASK_KEY = ('Wall', 'filled_mask', None)
+
     def __init__(self, focal_length=300, homography_matrix=None, draw=False):
         """
         Initializes the Wall class with optional parameters.
@@ -19,30 +23,34 @@ class Wall(DetectionBase):
         self.focal_length = focal_length
         self.draw = False  # Flag to control drawing
 
-    def find_wall(self, image, RGBframe, color_ranges):
+    def find_wall(self, image, RGBframe, color_ranges, features=None):
         """
         Detects walls using color and contour analysis.
 
         Args:
         - image: Input image from the camera.
         - color_ranges: Dictionary with HSV color ranges for wall detection.
+        - features: Per-frame FrameFeatures cache (created if omitted).
 
         Returns:
         - data_list: List of detected wall "data" (bearing and distance to the bottom center).
         - filled_wall_mask: Binary mask with filled wall contours.
         - mask: Binary mask representing detected walls.
         """
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+
         # 1. Preprocess Image
-        mask = self._preprocess_image(image, color_ranges)
+        mask = features.mask('Wall')
 
         # 2. Detect Walls
-        detected_walls = self._detect_walls(mask)
+        detected_walls = self._detect_walls(features)
 
         # 3. Extract Data (Bearing, Distance to Bottom Center)
         data_list = [obj["data"] for obj in detected_walls]
 
-        # 4. Create filled wall mask
-        filled_wall_mask = self._create_filled_wall_mask(mask, detected_walls)
+        # 4. Create filled wall mask (cached so the marker detector can reuse it)
+        filled_wall_mask = features.get(self.FILLED_MASK_KEY, lambda: self._create_filled_wall_mask(mask, detected_walls))
 
         # 5. Draw bounding boxes if enabled
         final_image = self._draw_if_enabled(RGBframe, detected_walls)
@@ -51,37 +59,63 @@ class Wall(DetectionBase):
 
         return data_list, final_image, filled_wall_mask
     
-    def _preprocess_image(self, image, color_ranges):
+    def find_filled_wall_mask(self, image, color_ranges, features=None, scale=0.25, min_area=1000):
         """
-        Preprocess the image by applying thresholding.
+        Computes only the filled wall mask, without the rest of wall detection.
+
+        The wall mask is downsampled by scale before contours are found and filled,
+        then scaled back up to the frame size. If full wall detection already ran on
+        this frame, its full resolution mask is reused instead.
+
+        Args:
+        - image: Input image from the camera.
+        - color_ranges: Dictionary with HSV color ranges for wall detection.
+        - features: Per-frame FrameFeatures cache (created if omitted).
+        - scale: Downsampling factor used to build the mask.
+        - min_area: Minimum wall area in full resolution pixels.
+
+        Returns:
+        - filled_wall_mask: Binary mask with filled wall contours, same size as the frame.
         """
-        lower_hsv, upper_hsv = color_ranges['Wall']
-        mask, _ = Preprocessing.preprocess(image, lower_hsv=lower_hsv, upper_hsv=upper_hsv)
-    
-        return mask
+        if features is None:
+            features = FrameFeatures(image, color_ranges)
+
+        full_mask = features.peek(self.FILLED_MASK_KEY)
+        if full_mask is not None:
+            return full_mask
+
+        def compute():
+            mask = features.mask('Wall')
+            height, width = mask.shape[:2]
+            small = cv2.resize(mask, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            small = np.where(small > 127, 255, 0).astype(np.uint8)
+            contours, _ = cv2.findContours(small, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            contours = [c for c in contours if cv2.contourArea(c) >= min_area * scale * scale]
 
-    def _detect_walls(self, mask, min_area=1000):
+            filled_small = np.zeros_like(small)
+            cv2.drawContours(filled_small, contours, -1, 255, thickness=cv2.FILLED)
+            filled = cv2.resize(filled_small, (width, height), interpolation=cv2.INTER_LINEAR)
+            return np.where(filled > 127, 255, 0).astype(np.uint8)
+
+        return features.get(('Wall', 'filled_mask', scale), compute)
+
+    def _detect_walls(self, features, min_area=1000):
         """
         Analyzes contours to detect walls and estimates their distance and bearing.
 
         Args:
-        - mask: Binary mask from preprocessing.
+        - features: FrameFeatures cache for the current frame.
         - min_area: Minimum area for contour detection.
-        - solidity_threshold: Minimum solidity to filter out non-solid contours.
 
         Returns:
         - List of detected objects with position, distance to bottom center, and bearing.
         """
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         detected_objects = []
 
-        for contour in contours:
-            area = cv2.contourArea(contour)
+        for contour, area, (x, y, w, h) in features.contour_stats('Wall'):
             if area < min_area:
                 continue
 
-            x, y, w, h = cv2.boundingRect(contour)
-
             # Estimate homography distance and bearing for the bottom center
             # distance = self.distance_estimator.estimate_homography_distance((x, y, w, h))
             #bottom_center_x = x + (w // 2)
@@ -109,9 +143,10 @@ class Wall(DetectionBase):
         Returns:
         - filled_wall_mask: Binary mask with filled wall contours.
         """
+        # A single drawContours call for all walls; a per-column band (top/bottom wall
+        # pixel) is not equivalent here since walls are occluded by shelves and obstacles
         filled_wall_mask = np.zeros_like(mask)
-        for wall in detected_walls:
-            cv2.drawContours(filled_wall_mask, [wall["contour"]], -1, 255, thickness=cv2.FILLED)
+        cv2.drawContours(filled_wall_mask, [wall["contour"] for wall in detected_walls], -1, 255, thickness=cv2.FILLED)
         return filled_wall_mask
 
     def _draw_if_enabled(self, image, detected_walls):
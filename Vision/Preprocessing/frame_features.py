@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+from .preprocessing import Preprocessing
+
+"""
+Per-frame feature cache shared by all detectors.
+
+Masks, morphology results, contours and contour stats are computed lazily the
+first time a detector asks for them and memoized by (class, operation, params),
+so two detectors asking for the same product within one frame share the work.
+"""
+
+
+class FrameFeatures:
+    def __init__(self, HSVframe, color_ranges):
+        """
+        Initialize the cache for a single frame.
+
+        Args:
+        - HSVframe: HSV image of the current frame.
+        - color_ranges: Dictionary with HSV color ranges for each class.
+        """
+        self.HSVframe = HSVframe
+        self.color_ranges = color_ranges
+        self._cache = {}
+
+    @property
+    def shape(self):
+        return self.HSVframe.shape[:2]
+
+    def get(self, key, compute):
+        """
+        Return the cached product for key, computing it with compute() on first use.
+        """
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = compute()
+            self._cache[key] = value
+            return value
+
+    def peek(self, key):
+        """
+        Return the cached product for key, or None if it has not been computed.
+        """
+        return self._cache.get(key)
+
+    def put(self, key, value):
+        """
+        Store a product computed outside the cache (e.g. by a detector).
+        """
+        self._cache[key] = value
+
+    def mask(self, name):
+        """
+        Binary color threshold mask for a class in color_ranges (e.g. 'Shelf').
+        """
+        def compute():
+            lower_hsv, upper_hsv = self.color_ranges[name]
+            mask, _ = Preprocessing.preprocess(self.HSVframe, lower_hsv=lower_hsv, upper_hsv=upper_hsv)
+            return mask
+
+        return self.get((name, 'mask', None), compute)
+
+    def morphology(self, name, ops=(), kernel_size=(5, 5)):
+        """
+        Class mask with a sequence of morphological operations applied in order.
+
+        Args:
+        - name: Class name in color_ranges.
+        - ops: Tuple of operations, each 'open' or 'close'.
+        - kernel_size: Size of the square kernel.
+        """
+        ops = tuple(ops)
+        if not ops:
+            return self.mask(name)
+
+        def compute():
+            # Reuse the result of the shorter chain so ('open',) is shared with ('open', 'close')
+            previous = self.morphology(name, ops[:-1], kernel_size)
+            kernel = np.ones(kernel_size, np.uint8)
+            op = cv2.MORPH_OPEN if ops[-1] == 'open' else cv2.MORPH_CLOSE
+            return cv2.morphologyEx(previous, op, kernel)
+
+        return self.get((name, 'morphology', (ops, tuple(kernel_size))), compute)
+
+    def contours(self, name, ops=(), kernel_size=(5, 5)):
+        """
+        External contours of the (optionally filtered) class mask.
+        """
+        def compute():
+            mask = self.morphology(name, ops, kernel_size)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            return contours
+
+        return self.get((name, 'contours', (tuple(ops), tuple(kernel_size))), compute)
+
+    def contour_stats(self, name, ops=(), kernel_size=(5, 5)):
+        """
+        Area and bounding box of every contour of the class mask.
+
+        Returns:
+        - List of (contour, area, (x, y, w, h)) tuples in contour order.
+        """
+        def compute():
+            return [(contour, cv2.contourArea(contour), cv2.boundingRect(contour))
+                    for contour in self.contours(name, ops, kernel_size)]
+
+        return self.get((name, 'contour_stats', (tuple(ops), tuple(kernel_size))), compute)
@@ -0,0 +1,183 @@
+import csv
+import logging
+import numpy as np
+import cv2
+
+"""
+Lighting compensation, so the thresholds in color_thresholds.csv stay valid when
+the lighting differs from the calibration room.
+
+Every frame, the mean color of a reference patch (by default the floor in the bottom
+centre of the frame, which is nearly always in view) is measured on a strided sample
+and compared with the same patch under the calibration lighting. Only gray pixels
+(the floor) that are neither black nor clipped are averaged, so shelves, items or
+obstacles entering the patch are ignored; frames with too few of them are skipped.
+- White balance: the per-channel gains that bring the patch back to the reference
+  chromaticity are applied to the frame with a per-channel LUT.
+- Exposure: instead of rescaling the pixels, the V bounds of the thresholds are
+  scaled by the brightness ratio (hue and saturation do not change with exposure).
+
+Gains are smoothed over frames and clipped, so a passing object does not make the
+thresholds jump. The floor is not uniform (shadows near shelves and walls move the
+measured gains by up to ~20% under constant light), so only the part of a gain
+outside a deadband is applied. With patch=None the whole frame is used (gray-world).
+
+Opt in with Vision.lighting = LightingCompensator(...). The reference is captured from
+the first frame unless it is given or loaded (save it right after calibrating colors).
+"""
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_PATCH = (0.3, 0.8, 0.7, 1.0)  # (x0, y0, x1, y1) as fractions of the frame: floor in front of the robot
+SAMPLE_STEP = 4  # Use every 4th pixel of the patch in both directions
+GRAY_SPREAD = 40  # Max - min channel value of a pixel counted as gray
+VALID_RANGE = (20, 250)  # Brightest channel of a usable pixel (not black, not clipped)
+MIN_PIXELS = 50  # Usable pixels needed to measure a frame
+SMOOTHING = 0.2  # Weight of the newest frame in the running gains
+GAIN_LIMITS = (0.5, 2.0)
+VALUE_DEADBAND = 0.12  # Brightness changes within +-12% are not compensated
+CHANNEL_DEADBAND = 0.05  # Color casts within +-5% are not compensated
+TOLERANCE = 0.02  # Gains within this of 1 are treated as 1 (frame and thresholds untouched)
+
+
+class LightingCompensator:
+    def __init__(self, reference=None, patch=REFERENCE_PATCH, step=SAMPLE_STEP, smoothing=SMOOTHING,
+                 white_balance=True, exposure=True):
+        """
+        Initialize the compensator.
+
+        Args:
+        - reference: Mean BGR of the patch under the calibration lighting (captured from the first frame if None).
+        - patch: Reference patch as (x0, y0, x1, y1) fractions of the frame, None for the whole frame.
+        - step: Sampling stride inside the patch.
+        - smoothing: Weight of the newest measurement (1 disables smoothing).
+        - white_balance: Correct the color cast of the frame.
+        - exposure: Scale the V thresholds with the brightness.
+        """
+        self.reference = None if reference is None else np.asarray(reference, dtype=float)
+        self.patch = patch
+        self.step = step
+        self.smoothing = smoothing
+        self.white_balance = white_balance
+        self.exposure = exposure
+
+        self.measured_channel_gains = np.ones(3)  # Smoothed white balance gains for B, G, R
+        self.measured_value_gain = 1.0  # Smoothed current brightness / reference brightness
+        self.channel_gains = np.ones(3)  # Applied gains (outside the deadband)
+        self.value_gain = 1.0
+        self._lut = None
+        self._lut_gains = None
+        self._ranges_cache = (None, None, None)  # (source ranges, value gain, adjusted ranges)
+
+    def _sample(self, frame):
+        """
+        Mean BGR of the usable gray pixels of the patch, None if there are too few.
+        """
+        if self.patch is None:
+            region = frame
+        else:
+            height, width = frame.shape[:2]
+            x0, y0, x1, y1 = self.patch
+            region = frame[int(y0 * height):int(y1 * height), int(x0 * width):int(x1 * width)]
+        pixels = region[::self.step, ::self.step].reshape(-1, 3).astype(np.int16)
+        brightest = pixels.max(axis=1)
+        usable = ((brightest - pixels.min(axis=1) <= GRAY_SPREAD)
+                  & (brightest >= VALID_RANGE[0]) & (brightest <= VALID_RANGE[1]))
+        if np.count_nonzero(usable) < MIN_PIXELS:
+            return None
+        return pixels[usable].mean(axis=0)
+
+    def set_reference(self, frame):
+        """
+        Use the patch of this frame (taken under the calibration lighting) as the reference.
+
+        Returns:
+        - True if the frame had enough usable pixels.
+        """
+        sample = self._sample(frame)
+        if sample is None:
+            return False
+        self.reference = sample
+        self.measured_channel_gains = np.ones(3)
+        self.measured_value_gain = 1.0
+        self.channel_gains = np.ones(3)
+        self.value_gain = 1.0
+        logger.info(f"Lighting reference set to BGR {np.round(self.reference, 1)}")
+        return True
+
+    def update(self, frame):
+        """
+        Measure the lighting of a BGR frame and update the smoothed gains.
+        """
+        if self.reference is None:
+            self.set_reference(frame)
+            return
+
+        means = self._sample(frame)
+        if means is None:
+            return  # Patch covered or too dark, keep the current gains
+        brightness = means.mean() / max(self.reference.mean(), 1.0)
+        # Gains that give the patch the reference chromaticity without changing its brightness
+        channel_gains = (self.reference / self.reference.mean()) / (means / means.mean())
+
+        low, high = GAIN_LIMITS
+        alpha = self.smoothing
+        self.measured_value_gain = float(np.clip((1 - alpha) * self.measured_value_gain + alpha * brightness, low, high))
+        self.measured_channel_gains = np.clip((1 - alpha) * self.measured_channel_gains + alpha * channel_gains, low, high)
+
+        # Apply only the part of each gain outside the deadband
+        self.value_gain = self.measured_value_gain / np.clip(self.measured_value_gain, 1 - VALUE_DEADBAND, 1 + VALUE_DEADBAND)
+        self.channel_gains = self.measured_channel_gains / np.clip(self.measured_channel_gains, 1 - CHANNEL_DEADBAND, 1 + CHANNEL_DEADBAND)
+
+    def correct(self, frame):
+        """
+        Update the gains from a BGR frame and return the white balanced frame
+        (the input frame itself when no correction is needed).
+        """
+        self.update(frame)
+        if not self.white_balance or np.all(np.abs(self.channel_gains - 1) < TOLERANCE):
+            return frame
+
+        # Rebuild the LUT only when the gains moved noticeably
+        if self._lut is None or np.any(np.abs(self.channel_gains - self._lut_gains) >= TOLERANCE / 2):
+            values = np.arange(256, dtype=float)[:, None] * self.channel_gains[None, :]
+            self._lut = np.clip(np.rint(values), 0, 255).astype(np.uint8).reshape(256, 1, 3)
+            self._lut_gains = self.channel_gains.copy()
+        return cv2.LUT(frame, self._lut)
+
+    def adjust_ranges(self, color_ranges):
+        """
+        Thresholds for the current exposure: V bounds scaled by the brightness ratio.
+        Bounds at 0 or 255 stay open. Returns color_ranges itself when no change is needed.
+        """
+        if not self.exposure or abs(self.value_gain - 1) < TOLERANCE:
+            return color_ranges
+
+        gain = round(self.value_gain, 2)  # Rebuild at most once per 1% change
+        source, cached_gain, adjusted = self._ranges_cache
+        if source is color_ranges and cached_gain == gain:
+            return adjusted
+
+        adjusted = {}
+        for name, (lower, upper) in color_ranges.items():
+            lower, upper = np.array(lower), np.array(upper)
+            if lower[2] > 0:
+                lower[2] = min(255, int(round(lower[2] * gain)))
+            if upper[2] < 255:
+                upper[2] = min(255, int(round(upper[2] * gain)))
+            adjusted[name] = (lower, upper)
+        self._ranges_cache = (color_ranges, gain, adjusted)
+        return adjusted
+
+    def save_reference(self, path):
+        with open(path, mode='w', newline='') as file:
+            csv.writer(file).writerow(['reference_bgr'] + [f"{value:.2f}" for value in self.reference])
+
+    @classmethod
+    def from_reference_file(cls, path, **kwargs):
+        """
+        Compensator with the reference saved by save_reference.
+        """
+        with open(path, mode='r') as file:
+            row = next(csv.reader(file))
+        return cls(reference=[float(value) for value in row[1:4]], **kwargs)
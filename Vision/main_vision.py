@@ -1,5 +1,6 @@
 from .Camera.camera import Camera  # Refers to Camera module in the same Vision directory
 from .Preprocessing.preprocessing import Preprocessing  # Preprocessing module within Vision
+from .Preprocessing.frame_features import FrameFeatures
 from .Detection.detection import DetectionBase
 from .Detection.shelf import Shelf
 from .Detection.marker import Marker
@@ -7,56 +8,125 @@ from .Detection.wall import Wall
 from .Detection.packing_station import PackingStationRamp
 from .Detection.obstacle import Obstacle
 from .Detection.item import Item
+from .Detection.item_catalog import load_catalog
+from .Detection.free_space import FreeSpace
 from .Calibration.calibration import Calibration
+from .Calibration.calibration_store import CalibrationStore
 from threading import Event
+from functools import lru_cache
 import logging
 import cv2
 
-# Configure the logger
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("vision_system.log", mode='a')
-    ]
-)
-logging.getLogger('picamera2').setLevel(logging.WARNING)  # Only show warnings and errors for picamera2
+# Handlers are configured by the entry point (startup.configure_logging)
 logger = logging.getLogger(__name__)
 
 # Constants for the object bitmask
 PACKING_BAY = 0b100000
-MARKERS = 0b010001
+MARKERS = 0b010000
 SHELVES = 0b001000
 ITEMS = 0b000100
 OBSTACLES = 0b000010
 WALLPOINTS = 0b000001
+FREE_SPACE = 0b1000000
 
 state_requests = {
     'INIT': 0b000000,
     'SEARCH_FOR_PS': PACKING_BAY | MARKERS,
-    'MOVE_TO_PS': PACKING_BAY | OBSTACLES,
+    'MOVE_TO_PS': PACKING_BAY | OBSTACLES | FREE_SPACE,
     'SEARCH_FOR_SHELF': MARKERS | SHELVES,
     'MOVE_TO_SHELF': SHELVES | OBSTACLES,
     'SEARCH_FOR_ROW': MARKERS,
-    'MOVE_TO_ROW': MARKERS | OBSTACLES | SHELVES,
+    'MOVE_TO_ROW': MARKERS | OBSTACLES | SHELVES | FREE_SPACE,
     'SEARCH_FOR_ITEM': ITEMS | SHELVES,
     'MOVE_TO_ITEM': ITEMS,
     'COLLECT_ITEM': ITEMS,
     'ROTATE_TO_EXIT': MARKERS,
     'MOVE_TO_EXIT': MARKERS | OBSTACLES,
     'EXIT_PS': MARKERS,
-    'ALL': 0b111111
+    'ALL': 0b1111111
 }
 
+# Detector products and the products each one needs first. Markers only need the
+# filled wall mask, not full wall detection, so requesting MARKERS no longer pulls
+# in WALLPOINTS. Declaration order breaks ties, so 'walls' runs before 'wall_mask'
+# and the wall mask can reuse the full resolution result when both are scheduled.
+PRODUCT_DEPENDENCIES = {
+    'shelves': (),
+    'walls': (),
+    'wall_mask': (),
+    'markers': ('wall_mask',),
+    'packing_bay': (),
+    'obstacles': (),
+    'items': (),
+    'free_space': (),
+}
+
+# Bitmask bit -> product that answers it
+REQUESTED_PRODUCTS = {
+    SHELVES: 'shelves',
+    WALLPOINTS: 'walls',
+    MARKERS: 'markers',
+    PACKING_BAY: 'packing_bay',
+    OBSTACLES: 'obstacles',
+    ITEMS: 'items',
+    FREE_SPACE: 'free_space',
+}
+
+# Downsampling factor for the marker-only filled wall mask
+WALL_MASK_SCALE = 0.25
+
+@lru_cache(maxsize=None)
+def schedule_products(requested_objects):
+    """
+    Resolve the products needed for a request bitmask into a run order.
+
+    Args:
+    - requested_objects: Bitmask of requested objects.
+
+    Returns:
+    - Tuple of product names in dependency order.
+    """
+    needed = set()
+    pending = [product for bit, product in REQUESTED_PRODUCTS.items() if requested_objects & bit]
+    while pending:
+        product = pending.pop()
+        if product not in needed:
+            needed.add(product)
+            pending.extend(PRODUCT_DEPENDENCIES[product])
+
+    order = []
+    visiting = set()
+
+    def visit(product):
+        if product in order:
+            return
+        if product in visiting:
+            raise ValueError(f"Dependency cycle at product '{product}'")
+        visiting.add(product)
+        for dependency in PRODUCT_DEPENDENCIES[product]:
+            visit(dependency)
+        visiting.discard(product)
+        order.append(product)
+
+    for product in PRODUCT_DEPENDENCIES:
+        if product in needed:
+            visit(product)
+    return tuple(order)
+
 class Vision(DetectionBase):
-    def __init__(self,camera):
+    def __init__(self, camera, calibration_store=None, watch_calibration=True):
         """
         Initialize the Vision system
+
+        Args:
+        - camera: Camera providing the frames.
+        - calibration_store: CalibrationStore to load from (default paths if omitted).
+        - watch_calibration: Reload the calibration while running when its files change.
         """
         logger.info("Initializing Vision system")
-        self.objectRB = [[], [], [], [], [], []]
+        self.objectRB = [[], [], [], [], [], [], []]
         self.requested_objects = 0b000000
+        self.frame_count = 0  # Frames processed since start
         # self.camera = None
         self.stop_event = Event()  # Event to signal threads to stop
         self.thread = None  # Thread for the live feed
@@ -69,9 +139,15 @@ class Vision(DetectionBase):
         #     raise  # Exit if the camera can't be initialized
 
         self.calibration = Calibration()
+        self.calibration_store = calibration_store if calibration_store is not None else CalibrationStore()
+        self.watch_calibration = watch_calibration
+        self.calibration_version = None  # Version of the snapshot the detectors use
         self.color_ranges = None
         self.homography_matrix = None
         self.focal_length = None  # Default focal length
+        self.bearing_model = None  # Calibrated BearingModel, at the calibration frame size
+        self.frame_bearing_model = None  # The same model at the size of the frames being processed
+        self.lighting = None  # Optional LightingCompensator (Vision/Preprocessing/lighting.py)
 
     def start(self, path):
         """
@@ -81,10 +157,11 @@ class Vision(DetectionBase):
         draw = True
         # focal_length = 321
         try:
-            self.color_ranges, self.homography_matrix, self.focal_length = self.calibration.load_csv()
+            snapshot = self.calibration_store.load()
         except Exception as e:
             logger.error(f"Error loading calibration data: {e}")
             return  # Exit if the calibration fails
+        self.color_ranges, self.homography_matrix, self.focal_length = snapshot.color_ranges, snapshot.homography_matrix, snapshot.focal_length
 
         # Initialize detectors
         self.shelf_detector = Shelf(homography_matrix=self.homography_matrix, draw=draw)
@@ -93,17 +170,61 @@ class Vision(DetectionBase):
         self.ramp_detector = PackingStationRamp(homography_matrix=self.homography_matrix, draw=draw)
         self.obstacle_detector = Obstacle(focal_length=self.focal_length, homography_matrix=self.homography_matrix, draw=draw)
         self.item_detector = Item(real_item_width=0.0375, focal_length=self.focal_length, draw=draw)
+        self.free_space_detector = FreeSpace(homography_matrix=self.homography_matrix, draw=draw)
+        self.apply_calibration(snapshot)
+        if self.watch_calibration:
+            self.calibration_store.start_watching()
 
         #self.thread = Thread(target=self.camera.play_video, args=(path,))  # Recorded video from files
         #self.thread = Thread(target=self.camera.live_feed, args=(self.stop_event,))
         #self.thread.start()
 
-    def update_item(self, item_width):
+    def apply_calibration(self, snapshot):
+        """
+        Point every detector at a calibration snapshot. Only called from the processing
+        thread between frames, so a frame never sees a mix of old and new values.
+        """
+        self.color_ranges = snapshot.color_ranges
+        self.homography_matrix = snapshot.homography_matrix
+        self.focal_length = snapshot.focal_length
+        self.bearing_model = self.frame_bearing_model = snapshot.bearing_model
+        for detector in self._detectors():
+            detector.set_calibration(homography_matrix=snapshot.homography_matrix, focal_length=snapshot.focal_length,
+                                     ground_points=snapshot.ground_points, bearing_model=snapshot.bearing_model)
+        self.calibration_version = snapshot.version
+        logger.info(f"Detectors using calibration v{snapshot.version}")
+
+    def _detectors(self):
+        return (self.shelf_detector, self.marker_detector, self.wall_detector, self.ramp_detector,
+                self.obstacle_detector, self.item_detector, self.free_space_detector)
+
+    def _follow_frame_size(self, frame):
         """
-        Update item width
+        Rescale the bearing model when the processing resolution differs from the calibration
+        (each size is built once, switching back and forth is a dictionary lookup).
         """
-        logger.debug(f"Updating item width to: {item_width}")
-        self.item_detector = Item(real_item_width=item_width, focal_length=self.focal_length, draw=True)
+        frame_size = (frame.shape[1], frame.shape[0])
+        if self.frame_bearing_model is None or self.frame_bearing_model.frame_size == frame_size:
+            return
+        self.frame_bearing_model = self.bearing_model.for_frame_size(frame_size)
+        for detector in self._detectors():
+            detector.set_calibration(bearing_model=self.frame_bearing_model)
+        logger.info(f"Bearing model rescaled to {frame_size[0]}x{frame_size[1]} frames")
+
+    def update_item(self, item):
+        """
+        Switch the item detector to a new target item.
+
+        Args:
+        - item: Item name (looked up in the item catalog) or real item width (m).
+        """
+        if isinstance(item, str):
+            spec = load_catalog()[item]
+            logger.debug(f"Updating item to: {spec.name} ({spec.width} m)")
+            self.item_detector.set_item(spec.width, spec.name)
+        else:
+            logger.debug(f"Updating item width to: {item}")
+            self.item_detector.set_item(item)
 
     def update_requested_objects(self, state):
         """
@@ -112,21 +233,6 @@ class Vision(DetectionBase):
         self.requested_objects = state_requests.get(state, 0b000000)
         logger.info(f"Updated requested objects for state {state}: {bin(self.requested_objects)}")
 
-    def item_to_size(self, item_type):
-        if item_type == "Bottle":
-            size = 0.02 
-        elif item_type == "Ball":
-            size = 0.045
-        elif item_type == "Cube":
-            size = 0.037
-        elif item_type == "Bowl":
-            size = 0.055
-        elif item_type == "Mug":
-            size = 0.05
-        elif item_type == "Weetbots":
-            size = 0.065
-        return size
-
     def process_image(self):
         """
         Process the current camera frame and detect objects
@@ -140,38 +246,29 @@ class Vision(DetectionBase):
                 #logger.warning("RGBframe is None, skipping frame processing")
                 return self.objectRB
             
+            self.frame_count += 1
+
+            # Swap in a calibration reloaded by the watcher since the last frame
+            snapshot = self.calibration_store.snapshot
+            if snapshot is not None and snapshot.version != self.calibration_version:
+                self.apply_calibration(snapshot)
+            self._follow_frame_size(RGBframe)
+
+            # White balance the frame and follow the exposure with the V thresholds
+            color_ranges = self.color_ranges
+            if self.lighting is not None:
+                RGBframe = self.lighting.correct(RGBframe)
+                color_ranges = self.lighting.adjust_ranges(self.color_ranges)
+
             HSVframe = cv2.cvtColor(RGBframe, cv2.COLOR_BGR2HSV)            
+            # Masks, morphology and contours shared by every detector for this frame
+            features = FrameFeatures(HSVframe, color_ranges)
 
-            # Detection logic based on requested objects
-            if self.requested_objects & SHELVES:
-                detected_shelves, shelf_frame, shelf_mask = self.shelf_detector.find_shelf(HSVframe, RGBframe, self.color_ranges)
-                # self.display_detection('Shelf Mask', shelf_mask)
-                self.objectRB[2] = detected_shelves
-
-            if self.requested_objects & WALLPOINTS:
-                detected_walls, wall_frame, filled_wall_mask = self.wall_detector.find_wall(HSVframe, RGBframe, self.color_ranges)
-                # self.display_detection('Wall Mask', filled_wall_mask)
-                self.objectRB[5] = detected_walls
-
-            if self.requested_objects & MARKERS:
-                detected_markers, marker_frame, marker_mask = self.marker_detector.find_marker(HSVframe, RGBframe, self.color_ranges, filled_wall_mask=filled_wall_mask)
-                # self.display_detection('Marker Mask', marker_mask)
-                self.objectRB[1] = detected_markers
-
-            if self.requested_objects & PACKING_BAY:
-                detected_ramp, ramp_frame, ramp_mask = self.ramp_detector.find_packing_station_ramp(HSVframe, RGBframe, self.color_ranges)
-                #self.display_detection('Ramp Mask', ramp_mask)
-                self.objectRB[0] = detected_ramp
-
-            if self.requested_objects & OBSTACLES:
-                detected_obstacles, obstacle_frame, obstacle_mask = self.obstacle_detector.find_obstacle(HSVframe, RGBframe, self.color_ranges)
-                #self.display_detection('Obstacle Mask', obstacle_mask)
-                self.objectRB[4] = detected_obstacles
-
-            if self.requested_objects & ITEMS:
-                detected_items, item_frame, item_mask = self.item_detector.find_item(HSVframe, RGBframe, self.color_ranges)
-                #self.display_detection('Item Mask', item_mask)
-                self.objectRB[3] = detected_items
+            # Detection logic based on requested objects, run in dependency order
+            products = {}
+            for product in schedule_products(self.requested_objects):
+                run = getattr(self, f"_run_{product}")
+                products[product] = run(HSVframe, RGBframe, features, products)
 
             self.display_detection('Detection', RGBframe)
             cv2.waitKey(1)
@@ -179,6 +276,52 @@ class Vision(DetectionBase):
             logger.error(f"Error processing image: {e}")
             self.stop()
 
+    def _run_shelves(self, HSVframe, RGBframe, features, products):
+        detected_shelves, shelf_frame, shelf_mask = self.shelf_detector.find_shelf(HSVframe, RGBframe, self.color_ranges, features=features)
+        # self.display_detection('Shelf Mask', shelf_mask)
+        self.objectRB[2] = detected_shelves
+        return detected_shelves
+
+    def _run_walls(self, HSVframe, RGBframe, features, products):
+        detected_walls, wall_frame, filled_wall_mask = self.wall_detector.find_wall(HSVframe, RGBframe, self.color_ranges, features=features)
+        # self.display_detection('Wall Mask', filled_wall_mask)
+        self.objectRB[5] = detected_walls
+        return detected_walls
+
+    def _run_wall_mask(self, HSVframe, RGBframe, features, products):
+        # Full resolution mask if walls already ran this frame, otherwise a cheap downsampled one
+        return self.wall_detector.find_filled_wall_mask(HSVframe, self.color_ranges, features=features, scale=WALL_MASK_SCALE)
+
+    def _run_markers(self, HSVframe, RGBframe, features, products):
+        detected_markers, marker_frame, marker_mask = self.marker_detector.find_marker(HSVframe, RGBframe, self.color_ranges, filled_wall_mask=products['wall_mask'], features=features)
+        # self.display_detection('Marker Mask', marker_mask)
+        self.objectRB[1] = detected_markers
+        return detected_markers
+
+    def _run_packing_bay(self, HSVframe, RGBframe, features, products):
+        detected_ramp, ramp_frame, ramp_mask = self.ramp_detector.find_packing_station_ramp(HSVframe, RGBframe, self.color_ranges, features=features)
+        #self.display_detection('Ramp Mask', ramp_mask)
+        self.objectRB[0] = detected_ramp
+        return detected_ramp
+
+    def _run_obstacles(self, HSVframe, RGBframe, features, products):
+        detected_obstacles, obstacle_frame, obstacle_mask = self.obstacle_detector.find_obstacle(HSVframe, RGBframe, self.color_ranges, features=features)
+        #self.display_detection('Obstacle Mask', obstacle_mask)
+        self.objectRB[4] = detected_obstacles
+        return detected_obstacles
+
+    def _run_items(self, HSVframe, RGBframe, features, products):
+        detected_items, item_frame, item_mask = self.item_detector.find_item(HSVframe, RGBframe, self.color_ranges, features=features)
+        #self.display_detection('Item Mask', item_mask)
+        self.objectRB[3] = detected_items
+        return detected_items
+
+    def _run_free_space(self, HSVframe, RGBframe, features, products):
+        range_profile, free_space_frame, free_space_mask = self.free_space_detector.find_free_space(HSVframe, RGBframe, self.color_ranges, features=features)
+        #self.display_detection('Free Space Mask', free_space_mask)
+        self.objectRB[6] = range_profile
+        return range_profile
+
     def display_detection(self, window_name, frame):
         """
         Display frames for different detections (temporarily disabled)
@@ -193,6 +336,7 @@ class Vision(DetectionBase):
         Stop the live feed and join the thread
         """
         logger.info("Stopping Vision system")
+        self.calibration_store.stop_watching()
         self.camera.close()  # Close camera resources
         self.is_stopped = True  # Mark the system as stopped
         #logger.info("Vision system already stopped.")
@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from i2c.main_i2c import I2C
+from i2c.emulator import PicoEmulator
+from i2c.telemetry import TelemetryPoller
+
+"""
+I2C throughput benchmark against the Pico emulator (i2c/emulator.py).
+
+Measures, for the Python side of the link:
+- commands: motor/LED/drive commands per second through I2C, and the latency from
+  the call to the command being executed by the emulated Pico.
+- telemetry: telemetry reads per second and decode errors.
+- mixed: command latency while the TelemetryPoller thread reads in the background,
+  as on the robot (both share the I2C lock).
+- burst: commands/s of the flow-controlled sender (i2c/main_i2c.py) against the
+  same burst with flow_control=False, and how many commands the Pico dropped
+  because its queue was full.
+- motors: left+right motor updates/s as two M commands and as one W command.
+
+The emulated bus takes as long as the bytes would on the wire at --baudrate, plus
+--latency per transaction; --error-rate and --corrupt-rate inject failures and the
+Pico needs --command-time to execute each command.
+
+Usage (from the repository root):
+    python -m i2c.benchmark_i2c [--count 2000] [--baudrate 100000] [--latency 0]
+                                [--error-rate 0] [--corrupt-rate 0] [--command-time 0.002] [--print]
+"""
+
+# One loop of commands like the state machine sends them
+COMMAND_MIX = [
+    lambda i2c: i2c.DCWrite(1, '0', 67),
+    lambda i2c: i2c.DCWrite(2, '0', 67),
+    lambda i2c: i2c.drive(0.12, -0.4),
+    lambda i2c: i2c.led(2, 1),
+    lambda i2c: i2c.DCWrite(1, 'S', 0),
+    lambda i2c: i2c.DCWrite(2, 'S', 0),
+]
+
+
+def percentiles(values):
+    """
+    Returns:
+    - (median, 95th percentile, max) of the values, in ms.
+    """
+    if not values:
+        return 0.0, 0.0, 0.0
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return statistics.median(ordered) * 1000, p95 * 1000, ordered[-1] * 1000
+
+
+def run_commands(i2c, emulator, count):
+    """
+    Send count commands and match them with their execution on the emulated Pico.
+
+    Returns:
+    - commands per second, list of latencies (s) of the commands that were executed,
+      commands dropped by the Pico.
+    """
+    logged = len(emulator.log)
+    dropped = emulator.commands_dropped
+    sent_at = []
+    start = time.perf_counter()
+    for i in range(count):
+        errors, drops = i2c.write_errors, emulator.commands_dropped
+        sent = time.perf_counter()
+        COMMAND_MIX[i % len(COMMAND_MIX)](i2c)
+        if i2c.write_errors == errors and emulator.commands_dropped == drops:
+            sent_at.append(sent)  # Failed or dropped writes never reach the log
+    elapsed = time.perf_counter() - start
+    emulator.read_byte(0)  # Let the emulated Pico finish its queue
+    executed = [command.executed_at for command in emulator.log[logged:]]
+    latencies = [done - sent for sent, done in zip(sent_at, executed)]
+    return count / elapsed, latencies, emulator.commands_dropped - dropped
+
+
+def run_telemetry(poller, count):
+    """
+    Returns:
+    - reads per second.
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        poller.poll()
+    return count / (time.perf_counter() - start)
+
+
+def run_burst(sender, emulator, count):
+    """
+    Send count LED commands back to back.
+
+    Returns:
+    - commands per second, commands dropped by the Pico.
+    """
+    dropped = emulator.commands_dropped
+    start = time.perf_counter()
+    for i in range(count):
+        sender.led(1 + i % 3, 1)
+    elapsed = time.perf_counter() - start
+    return count / elapsed, emulator.commands_dropped - dropped
+
+
+def run_motor_updates(sender, count, combined):
+    """
+    Returns:
+    - left+right motor updates per second.
+    """
+    start = time.perf_counter()
+    for i in range(count):
+        speed = 60 + i % 40
+        if combined:
+            sender.DC_motors(speed, -speed)
+        else:
+            sender.DCWrite(1, '0', speed)
+            sender.DCWrite(2, '1', speed)
+    return count / (time.perf_counter() - start)
+
+
+def report(name, rate, latencies=None, unit="commands"):
+    line = f"{name:10s} {rate:9.0f} {unit}/s"
+    if latencies is not None:
+        median, p95, worst = percentiles(latencies)
+        line += f"   latency median {median:.3f} ms  p95 {p95:.3f} ms  max {worst:.3f} ms"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="I2C throughput benchmark against the Pico emulator")
+    parser.add_argument("--count", type=int, default=2000, help="Commands/reads per measurement")
+    parser.add_argument("--baudrate", type=int, default=100000, help="Emulated bus speed in Hz (0 for instant)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Extra seconds per transaction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a bus error per transaction")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0, help="Probability of a corrupted telemetry frame")
+    parser.add_argument("--command-time", type=float, default=0.002,
+                        help="Seconds the Pico takes per command (default: a guess for slave.ino with its Serial prints)")
+    parser.add_argument("--print", action="store_true", help="Keep the per-command prints of I2C.send_command")
+    args = parser.parse_args(argv)
+
+    def emulate():
+        return PicoEmulator(baudrate=args.baudrate, latency=args.latency, error_rate=args.error_rate,
+                            corrupt_rate=args.corrupt_rate, command_time=args.command_time, seed=0)
+
+    emulator = emulate()
+    i2c = I2C(bus=emulator)
+    poller = TelemetryPoller(i2c)
+    # The prints go to the terminal on the robot, but would measure the terminal here
+    output = contextlib.nullcontext() if args.print else contextlib.redirect_stdout(io.StringIO())
+
+    with output:
+        command_rate, command_latencies, command_dropped = run_commands(i2c, emulator, args.count)
+        read_rate = run_telemetry(poller, args.count)
+        poller.start()
+        mixed_rate, mixed_latencies, mixed_dropped = run_commands(i2c, emulator, args.count)
+        poller.stop()
+
+        burst_emulator = emulate()
+        unpaced_rate, unpaced_dropped = run_burst(I2C(bus=burst_emulator, flow_control=False), burst_emulator, args.count)
+        burst_emulator = emulate()
+        paced_i2c = I2C(bus=burst_emulator)
+        paced_rate, paced_dropped = run_burst(paced_i2c, burst_emulator, args.count)
+        status_reads = paced_i2c.status_reads
+        separate_rate = run_motor_updates(paced_i2c, args.count // 2, combined=False)
+        combined_rate = run_motor_updates(paced_i2c, args.count // 2, combined=True)
+
+    print(f"Emulated bus: {args.baudrate} Hz, {args.latency * 1000:.2f} ms latency, "
+          f"error rate {args.error_rate}, corrupt rate {args.corrupt_rate}, "
+          f"{args.command_time * 1000:.2f} ms per command on the Pico")
+    report("commands", command_rate, command_latencies)
+    report("telemetry", read_rate, unit="reads")
+    report("mixed", mixed_rate, mixed_latencies)
+    print(f"Write errors {i2c.write_errors}, read errors {poller.read_errors}, bad frames {poller.bad_frames}, "
+          f"rejected by the Pico {emulator.commands_rejected}, dropped {command_dropped + mixed_dropped}")
+    print()
+    report("burst", unpaced_rate)
+    print(f"{'':10s} no flow control, {unpaced_dropped} dropped by the Pico")
+    report("burst", paced_rate)
+    print(f"{'':10s} flow controlled, {paced_dropped} dropped, {status_reads} status reads")
+    report("motors", separate_rate, unit="updates")
+    print(f"{'':10s} as two M commands (a fixed 0.1 s sleep per command allows 5 updates/s)")
+    report("motors", combined_rate, unit="updates")
+    print(f"{'':10s} as one W command")
+
+
+if __name__ == "__main__":
+    main()
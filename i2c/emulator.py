@@ -0,0 +1,378 @@
+import random
+import re
+import threading
+import time
+import logging
+from dataclasses import dataclass
+
+from i2c.telemetry import TELEMETRY_FORMAT, TELEMETRY_VERSION
+from i2c.wheel_model import COUNTS_PER_METER, MAX_DUTY, WHEEL_BASE, duty_to_speed
+
+"""
+Software stand-in for the Pico, for exercising the I2C code without the robot.
+
+PicoEmulator has the smbus.SMBus methods the Pi side uses (write_i2c_block_data,
+read_i2c_block_data, write_byte, read_byte, close), so it can be passed as the bus:
+
+    i2c = I2C(bus=PicoEmulator())
+    state_machine = StateMachine(i2c=i2c)
+
+Commands are parsed like PICO/egb320/egb320.c: M/W (duty), D (velocity), Q/X (motion
+segments), H (lift), G (gripper) and L (LEDs), with the same rejection rules, and every
+read answers with the telemetry frame of i2c/telemetry.py. The lift, gripper and wheels
+are simulated on the emulator's clock, so the encoders count and the lift/gripper
+report done after the firmware's timings.
+
+Bus behaviour can be configured:
+- baudrate: each transaction takes as long as its bytes would on the wire.
+- latency: fixed extra time per transaction (clock stretching, scheduling).
+- error_rate: probability that a transaction fails with OSError (errno 121, as smbus).
+- corrupt_rate: probability that a telemetry frame has a flipped byte.
+- command_time: time the Pico's main loop needs per command. Commands wait in the
+  firmware's queue (COMMAND_QUEUE_SIZE) meanwhile and are dropped when it is full,
+  as on the robot; 0 executes them on arrival.
+
+Every executed command is kept in `log` with its execution time, for latency
+measurements (see i2c/benchmark_i2c.py).
+"""
+
+logger = logging.getLogger(__name__)
+
+# Firmware timings and limits (PICO/egb320/egb320.c)
+MAX_COMMAND_LENGTH = 32  # Bytes including the register byte
+LIFT_POSITIONS = {1: 10, 2: 90, 3: 160}  # Servo degrees
+LIFT_START = 45
+LIFT_STEP = 0.02  # s per degree
+LIFT_SETTLE = 0.3  # s
+GRIP_MOVE = 1.0  # s
+SETPOINT_TIMEOUT = 0.5  # s
+SEGMENT_MAX = 5.0  # s
+SEGMENT_QUEUE_SIZE = 8
+COMMAND_QUEUE_SIZE = 8  # One slot stays empty, so 7 commands can wait
+CONTROL_DT = 0.005  # s, the firmware's 200 Hz control loop
+
+LEADING_INT = re.compile(r'\s*([+-]?\d+)')
+BUS_ERROR = 121  # EREMOTEIO, what smbus raises when the Pico does not answer
+
+
+@dataclass
+class Command:
+    text: str
+    executed_at: float  # clock() time the command was executed
+    accepted: bool
+
+
+@dataclass
+class Segment:
+    id: int
+    v: float
+    w: float
+    duration: float
+    distance: float  # Encoder counts, 0 for no limit
+
+
+class PicoEmulator:
+    def __init__(self, baudrate=100000, latency=0.0, error_rate=0.0, corrupt_rate=0.0, command_time=0.0,
+                 clock=time.perf_counter, sleep=time.sleep, seed=None):
+        """
+        Args:
+        - baudrate: Bus speed in Hz used for the transfer time (0 for instant transfers).
+        - latency: Extra seconds per transaction.
+        - error_rate: Probability (0-1) that a transaction raises OSError.
+        - corrupt_rate: Probability (0-1) that a telemetry frame fails its checksum.
+        - command_time: Seconds the Pico takes to execute one queued command.
+        - clock: Time source in seconds.
+        - sleep: Called with the transaction time (replace to run without waiting).
+        - seed: Seed for the error injection.
+        """
+        self.baudrate = baudrate
+        self.latency = latency
+        self.error_rate = error_rate
+        self.corrupt_rate = corrupt_rate
+        self.command_time = command_time
+        self.clock = clock
+        self.sleep = sleep
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.log = []
+        self.transactions = 0
+        self.bus_errors = 0
+        self.corrupted_frames = 0
+        self.bytes_transferred = 0
+
+        # Firmware state
+        self.pending = []  # (due time, text) of commands waiting in the command queue
+        self.leds = [0, 0, 0]
+        self.duty = [0.0, 0.0]  # Signed duty per wheel (raw mode)
+        self.target = [0.0, 0.0]  # m/s per wheel (velocity mode)
+        self.velocity_mode = False
+        self.last_setpoint = 0.0
+        self.segments = []
+        self.segment_started = None
+        self.segment_start_counts = [0.0, 0.0]
+        self.segment_done_id = 0
+        self.encoders = [0.0, 0.0]
+        self.lift_level = 0
+        self.lift_pos = LIFT_START
+        self.lift_target = LIFT_START
+        self.lift_from = LIFT_START  # Position when the lift was last commanded
+        self.lift_moved_at = None  # Time the lift was last commanded
+        self.gripper_closed = 0
+        self.grip_started = None
+        self.commands_received = 0
+        self.commands_rejected = 0
+        self.commands_dropped = 0
+        self.sequence = 0
+        self.start_time = self.clock()
+        self.sim_time = self.start_time
+
+    #===========================================================================
+    # smbus interface
+    #===========================================================================
+    def write_i2c_block_data(self, addr, register, data):
+        with self.lock:
+            self._transfer(2 + len(data))
+            self._advance()
+            self._receive(bytes([register]) + bytes(data))
+
+    def read_i2c_block_data(self, addr, register, length):
+        with self.lock:
+            self._transfer(3 + length)  # Register write, repeated start, address, data
+            self._advance()
+            frame = self._telemetry()
+            if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+                self.corrupted_frames += 1
+                frame[self.random.randrange(len(frame) - 1)] ^= 0x5A
+            # Reads past the end of the frame return 0, as the firmware does
+            return list(frame[:length]) + [0] * max(0, length - len(frame))
+
+    def write_byte(self, addr, value):
+        with self.lock:
+            self._transfer(2)  # A single byte is only a register select
+
+    def read_byte(self, addr):
+        with self.lock:
+            self._transfer(2)
+            self._advance()
+            return self._telemetry()[0]
+
+    def close(self):
+        pass
+
+    def _transfer(self, length):
+        """
+        Spend the time the transaction takes on the bus and inject bus errors.
+        """
+        self.transactions += 1
+        duration = self.latency + (length * 9 / self.baudrate if self.baudrate else 0)  # 8 bits + ACK
+        if duration > 0:
+            self.sleep(duration)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.bus_errors += 1
+            raise OSError(BUS_ERROR, "Remote I/O error")
+        self.bytes_transferred += length
+
+    #===========================================================================
+    # Firmware
+    #===========================================================================
+    def _receive(self, data):
+        if len(data) < 2:
+            return  # Register select
+        now = self.clock()
+        self._run_pending(now)
+        if len(data) > MAX_COMMAND_LENGTH or len(self.pending) >= COMMAND_QUEUE_SIZE - 1:
+            self.commands_dropped += 1
+            return
+        self.commands_received += 1
+        # The main loop works through the queue one command at a time
+        due = max(now, self.pending[-1][0] if self.pending else now) + self.command_time
+        self.pending.append((due, data[1:].decode('ascii', errors='replace')))
+        self._run_pending(now)
+
+    def _run_pending(self, now):
+        while self.pending and self.pending[0][0] <= now:
+            due, text = self.pending.pop(0)
+            accepted = self._execute(text)
+            if not accepted:
+                self.commands_rejected += 1
+            self.log.append(Command(text, due, accepted))
+
+    def _execute(self, text):
+        """
+        Run one command. Returns False if the firmware would reject it.
+        """
+        kind = text[:1]
+        if kind == 'M':
+            motor = ord(text[1]) - ord('1') if len(text) > 1 else -1
+            direction = text[3] if len(text) > 3 else ''
+            if motor not in (0, 1) or direction not in ('0', '1', 'S'):
+                return False
+            self.segments = []
+            self.velocity_mode = False
+            self.target[motor] = 0.0
+            if direction == 'S':
+                self.duty[motor] = 0.0
+            else:
+                duty = _atoi(text[5:])
+                self.duty[motor] = float(duty if direction == '0' else -duty)
+            return True
+        if kind == 'W':
+            values = _ints(text[1:], 2)
+            if values is None:
+                return False
+            self.segments = []
+            self.velocity_mode = False
+            self.target = [0.0, 0.0]
+            self.duty = [float(max(-MAX_DUTY, min(MAX_DUTY, value))) for value in values]
+            return True
+        if kind == 'D':
+            values = _ints(text[1:], 2)
+            if values is None:
+                return False
+            self.segments = []
+            self._set_velocity(values[0] / 100, values[1] / 100)
+            return True
+        if kind == 'Q':
+            values = _ints(text[1:], 5)
+            if values is None:
+                return False
+            segment_id, v_cm, w_crad, duration_ms, distance_mm = values
+            if not 1 <= segment_id <= 255 or duration_ms < 0 or distance_mm < 0 or duration_ms == distance_mm == 0:
+                return False
+            if len(self.segments) >= SEGMENT_QUEUE_SIZE - 1:
+                self.commands_dropped += 1
+                return True
+            duration = SEGMENT_MAX if duration_ms == 0 else min(duration_ms / 1000, SEGMENT_MAX)
+            self.segments.append(Segment(segment_id, v_cm / 100, w_crad / 100, duration,
+                                         distance_mm * COUNTS_PER_METER / 1000))
+            if len(self.segments) == 1:
+                self._start_segment()
+            return True
+        if kind == 'X':
+            self.segments = []
+            self._set_velocity(0, 0)
+            return True
+        if kind == 'G':
+            if text[1:2] not in ('0', '1'):
+                return False
+            self.gripper_closed = int(text[1])
+            self.grip_started = self.sim_time
+            return True
+        if kind == 'H':
+            level = text[1:2]
+            if level not in ('1', '2', '3'):
+                return False
+            self.lift_level = int(level)
+            self.lift_target = LIFT_POSITIONS[self.lift_level]
+            self.lift_moved_at = self.sim_time
+            self.lift_from = self.lift_pos
+            return True
+        if kind == 'L':
+            led = ord(text[1]) - ord('1') if len(text) > 1 else -1
+            if led not in (0, 1, 2) or text[2:3] not in ('0', '1'):
+                return False
+            self.leds[led] = int(text[2])
+            return True
+        return False
+
+    def _set_velocity(self, v, w):
+        self.target = [v - w * WHEEL_BASE / 2, v + w * WHEEL_BASE / 2]
+        self.velocity_mode = True
+        self.last_setpoint = self.sim_time
+
+    def _start_segment(self):
+        segment = self.segments[0]
+        self._set_velocity(segment.v, segment.w)
+        self.segment_started = self.sim_time
+        self.segment_start_counts = list(self.encoders)
+
+    def _advance(self):
+        """
+        Run the wheels, segments and servos up to the current time in control loop steps.
+        """
+        now = self.clock()
+        self._run_pending(now)
+        while self.sim_time + CONTROL_DT <= now:
+            self.sim_time += CONTROL_DT
+            self._control_step()
+        # Servos only depend on the time since they were commanded
+        if self.lift_moved_at is not None:
+            travel = int((self.sim_time - self.lift_moved_at) / LIFT_STEP)
+            distance = self.lift_target - self.lift_from
+            step = min(travel, abs(distance))
+            self.lift_pos = self.lift_from + (step if distance >= 0 else -step)
+
+    def _control_step(self):
+        if self.segments:
+            segment = self.segments[0]
+            travelled = (abs(self.encoders[0] - self.segment_start_counts[0])
+                         + abs(self.encoders[1] - self.segment_start_counts[1])) / 2
+            if (self.sim_time - self.segment_started >= segment.duration
+                    or (segment.distance and travelled >= segment.distance)):
+                self.segment_done_id = segment.id
+                self.segments.pop(0)
+                if self.segments:
+                    self._start_segment()
+                else:
+                    self._set_velocity(0, 0)
+        elif self.velocity_mode and self.sim_time - self.last_setpoint > SETPOINT_TIMEOUT:
+            self.target = [0.0, 0.0]
+
+        for i in range(2):
+            if self.velocity_mode:
+                speed = self.target[i]  # The speed loop is assumed to hold the target
+            else:
+                speed = duty_to_speed(self.duty[i])
+            self.encoders[i] += speed * CONTROL_DT * COUNTS_PER_METER
+
+    def _lift_reached(self):
+        if self.lift_moved_at is None or self.lift_pos != self.lift_target:
+            return False
+        arrival = self.lift_moved_at + abs(self.lift_target - self.lift_from) * LIFT_STEP
+        return self.sim_time - arrival >= LIFT_SETTLE
+
+    def _telemetry(self):
+        self.sequence = (self.sequence + 1) & 0xFF
+        gripper_done = self.grip_started is None or self.sim_time - self.grip_started >= GRIP_MOVE
+        frame = bytearray(TELEMETRY_FORMAT.pack(
+            TELEMETRY_VERSION, self.sequence, int((self.sim_time - self.start_time) * 1000) & 0xFFFFFFFF,
+            int(self.encoders[0]), int(self.encoders[1]), self.lift_level, int(self._lift_reached()),
+            self.gripper_closed, int(gripper_done), self.commands_received & 0xFFFF,
+            self.commands_rejected & 0xFFFF, self.commands_dropped & 0xFFFF, self.segment_done_id,
+            len(self.segments), len(self.pending), 0))
+        frame[-1] = sum(frame[:-1]) & 0xFF
+        return frame
+
+    #===========================================================================
+    # Inspection
+    #===========================================================================
+    def commands(self, accepted=None):
+        """
+        Texts of the executed commands, optionally only the accepted or rejected ones.
+        """
+        return [command.text for command in self.log if accepted is None or command.accepted == accepted]
+
+    def wheel_speeds(self):
+        """
+        Current wheel speeds in m/s (left, right).
+        """
+        if self.velocity_mode:
+            return tuple(self.target)
+        return tuple(duty_to_speed(duty) for duty in self.duty)
+
+
+def _atoi(text):
+    # Leading integer like C atoi, 0 if there is none
+    match = LEADING_INT.match(text)
+    return int(match.group(1)) if match else 0
+
+
+def _ints(text, count):
+    # sscanf("%d %d ...") for well-formed input: `count` integers or None
+    parts = text.split()
+    if len(parts) < count:
+        return None
+    try:
+        return [int(part) for part in parts[:count]]
+    except ValueError:
+        return None
@@ -1,10 +1,40 @@
-import smbus
 import time
+import threading
+
+from i2c.telemetry import TELEMETRY_REGISTER, TELEMETRY_VERSION, TELEMETRY_SIZE, TELEMETRY_QUEUED
+
+# Flow control, instead of a fixed sleep after every command.
+# The Pico queues received commands and its main loop executes them; a command that
+# arrives while the queue is full is dropped. The sender counts the commands that may
+# still be waiting there and only when they could fill the queue does it read the
+# queue depth back from the telemetry frame (the ready status, see i2c/telemetry.py).
+COMMAND_QUEUE_CAPACITY = 7  # COMMAND_QUEUE_SIZE - 1 in the firmware
+DRAIN_TIME = 0.005  # s, the Pico has executed everything sent this long ago (measure with i2c/benchmark_i2c.py)
+MIN_SPACING = 0.002  # s between commands while the ready status cannot be read
+READY_TIMEOUT = 0.1  # s, give up waiting and send anyway
+READY_POLL = 0.001  # s between ready status reads while the queue is full
 
 class I2C:
-    def __init__(self, addr=0x08, bus=1):
+    def __init__(self, addr=0x08, bus=1, flow_control=True, min_spacing=MIN_SPACING,
+                 clock=time.perf_counter, sleep=time.sleep):
+        # bus: I2C bus number, or an object with the smbus.SMBus methods (i2c/emulator.py)
+        # flow_control: wait for room in the Pico's command queue before every command
+        # clock, sleep: time source and wait, replaceable for offline runs (navigation/warehouse_sim.py)
         self.addr = addr 
-        self.bus = smbus.SMBus(bus)
+        if isinstance(bus, int):
+            import smbus  # Only installed on the Pi
+            bus = smbus.SMBus(bus)
+        self.bus = bus
+        self.lock = threading.Lock()  # Commands and telemetry reads come from different threads
+        self.write_errors = 0
+        self.flow_control = flow_control
+        self.min_spacing = min_spacing
+        self.clock = clock
+        self.sleep = sleep
+        self.in_flight = 0  # Commands that may still wait in the Pico's queue
+        self.last_write = 0.0
+        self.status_reads = 0
+        self.status_available = True  # False once the firmware does not answer with a usable frame
 
     def string_to_ascii_array(self, input_string):
         # Convert the input string to an array of ASCII values
@@ -15,12 +45,57 @@ class I2C:
         
         try:
             print(f"Sending command: {command}")
-            self.bus.write_i2c_block_data(self.addr, 0, command)  # Send data to I2C device
+            with self.lock:
+                if self.flow_control:
+                    self.wait_ready()
+                try:
+                    self.bus.write_i2c_block_data(self.addr, 0, command)  # Send data to I2C device
+                    self.in_flight += 1
+                finally:
+                    self.last_write = self.clock()
         except IOError as e:
+            self.write_errors += 1
             print(f"Error communicating with I2C device: {e}")
-        
-        # Optional short delay
-        # time.sleep(0.001)  # Give some time between commands
+
+    def queued_commands(self):
+        """Commands waiting in the Pico's queue, or None if the status frame could not be read. Call with the lock held."""
+        try:
+            frame = bytes(self.bus.read_i2c_block_data(self.addr, TELEMETRY_REGISTER, TELEMETRY_SIZE))
+        except IOError:
+            return None
+        self.status_reads += 1
+        if len(frame) != TELEMETRY_SIZE or sum(frame[:-1]) & 0xFF != frame[-1]:
+            return None  # Corrupted, read again
+        if frame[0] != TELEMETRY_VERSION:
+            self.status_available = False
+            print(f"Pico telemetry version {frame[0]} has no ready status, spacing commands instead")
+            return None
+        return frame[TELEMETRY_QUEUED]
+
+    def wait_ready(self):
+        """Block until the Pico's command queue has room for another command. Call with the lock held."""
+        if self.clock() - self.last_write >= DRAIN_TIME:
+            self.in_flight = 0
+        deadline = self.clock() + READY_TIMEOUT
+        while self.status_available and self.in_flight >= COMMAND_QUEUE_CAPACITY:
+            if self.clock() > deadline:
+                print("Pico command queue still full, sending anyway")
+                return
+            queued = self.queued_commands()
+            if queued is not None:
+                self.in_flight = queued
+            if self.in_flight >= COMMAND_QUEUE_CAPACITY:
+                self.sleep(READY_POLL)  # Give the Pico time to execute before reading again
+        if not self.status_available:
+            # Firmware without the ready status: keep a minimum spacing instead
+            since_write = self.clock() - self.last_write
+            if since_write < self.min_spacing:
+                self.sleep(self.min_spacing - since_write)
+
+    def read_block(self, register, length):
+        """Read a block from the Pico (telemetry, see i2c/telemetry.py). Raises IOError on bus errors."""
+        with self.lock:
+            return self.bus.read_i2c_block_data(self.addr, register, length)
 
     def drive(self, forwards:float,rotational:float): # used in the navigvation system to run at the desired 
         forwards_int = round(forwards*100)
@@ -31,6 +106,34 @@ class I2C:
         command = f"D{forwards_int} {rotational_int}"
         self.send_command(command)
 
+    def segment(self, segment_id, forwards, rotational, duration=0, distance=0):
+        """
+        Queue a motion segment on the Pico (PICO/egb320 only): hold (forwards m/s, rotational rad/s)
+        for duration seconds or distance metres of wheel travel, whichever is reached first
+        (0 for no limit). The Pico reports segment_id (1-255) in the telemetry once it is done.
+        """
+        if segment_id not in range(1, 256):
+            print(f"Invalid segment id: {segment_id}")
+            return
+        if duration <= 0 and distance <= 0:
+            print("A segment needs a duration or a distance")
+            return
+        command = f"Q{segment_id} {round(forwards*100)} {round(rotational*100)} {round(duration*1000)} {round(distance*1000)}"
+        self.send_command(command)
+
+    def clear_segments(self):
+        """Drop the queued motion segments and stop."""
+        self.send_command("X")
+
+    def DC_motors(self, left, right):
+        """Set both DC motors in one command, signed duty cycles (-255 to 255, negative is backwards)."""
+        if abs(left) > 255 or abs(right) > 255:
+            print(f"Invalid speed: {left}, {right}. Please choose between -255 and 255.")
+            return
+
+        command = f"W{int(left)} {int(right)}"
+        self.send_command(command)
+
     def DCWrite(self, number, direction, speed):
         # Validate inputs
         if number not in range(1, 3):  # DC motor numbers start from 1 to 2
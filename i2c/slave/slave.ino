@@ -17,6 +17,27 @@
 #define MAX_WHEEL_SPEED 10 
 #define SCALING_FACTOR 127.5
 
+// Wheel encoders, channel A interrupts and channel B gives the direction. The pins are
+// unmeasured defaults: keep ENCODERS_ENABLED at 0 (telemetry reports 0 counts) until
+// they are checked against the wiring.
+#define ENCODERS_ENABLED 0
+#define ENC1A 12
+#define ENC1B 13
+#define ENC2A 14
+#define ENC2B 15
+
+// Telemetry frame returned on every I2C read, layout documented in i2c/telemetry.py
+#define TELEMETRY_VERSION 3
+#define TELEMETRY_SIZE 28
+
+// Commands are queued by the I2C interrupt and executed in loop()
+#define COMMAND_QUEUE_SIZE 8
+#define MAX_COMMAND_LENGTH 32
+
+#define LIFT_STEP_MS 20     // One degree of lift travel per step
+#define LIFT_SETTLE_MS 300  // Lift reported as reached this long after the last step
+#define GRIP_MOVE_MS 1000   // Gripper servo travel time
+
 volatile int last_pos = 45;
 int gripservoPin = 11;  // SV1
 int liftservoPin = 10; // SV2
@@ -29,7 +50,42 @@ Servo liftServo;
 void receiveEvent(int howMany);
 void ControlSystem(uint8_t* command, int length);
 
-uint8_t waitingflag = 1;
+void requestEvent();
+void move_lift(int target_pos, uint8_t level);
+void update_lift();
+void update_gripper();
+
+// Command queue (written by receiveEvent, read by loop)
+uint8_t commandQueue[COMMAND_QUEUE_SIZE][MAX_COMMAND_LENGTH];
+uint8_t commandLength[COMMAND_QUEUE_SIZE];
+volatile uint8_t queueHead = 0;  // Next command to execute
+volatile uint8_t queueTail = 0;  // Next free slot
+
+// Status reported in the telemetry frame
+volatile int32_t encoderLeft = 0;
+volatile int32_t encoderRight = 0;
+volatile uint8_t liftLevel = 0;        // Commanded level, 0 before the first command
+volatile uint8_t liftReached = 0;
+volatile uint8_t gripperClosed = 0;
+volatile uint8_t gripperDone = 1;
+volatile uint16_t commandsReceived = 0;
+volatile uint16_t commandsRejected = 0;
+volatile uint16_t commandsDropped = 0;
+volatile uint8_t telemetrySequence = 0;
+
+// Non-blocking servo motion
+int liftTarget = 45;  // Same as last_pos, so nothing moves before the first command
+unsigned long lastLiftStep = 0;
+unsigned long liftArrived = 0;
+unsigned long gripStarted = 0;
+
+void encoderLeftISR() {
+  encoderLeft += digitalRead(ENC1B) ? -1 : 1;
+}
+
+void encoderRightISR() {
+  encoderRight += digitalRead(ENC2B) ? 1 : -1;  // Mirrored motor
+}
 
 void setup() {
   // Attach servos
@@ -48,8 +104,9 @@ void setup() {
   Wire.setSCL(I2C_SCL);
   Wire.begin(I2C_ADDRESS);  // Initialize I2C communication
 
-  // Attach a function to the receive event
+  // Attach a function to the receive event, and answer reads with the telemetry frame
   Wire.onReceive(receiveEvent);
+  Wire.onRequest(requestEvent);
 
   Serial.begin(115200);  // Initialize serial communication for debugging
 
@@ -60,12 +117,25 @@ void setup() {
   pinMode(PHS1, OUTPUT);
   pinMode(PHS2, OUTPUT);
 
+#if ENCODERS_ENABLED
+  // Encoders
+  pinMode(ENC1A, INPUT_PULLUP);
+  pinMode(ENC1B, INPUT_PULLUP);
+  pinMode(ENC2A, INPUT_PULLUP);
+  pinMode(ENC2B, INPUT_PULLUP);
+  attachInterrupt(digitalPinToInterrupt(ENC1A), encoderLeftISR, RISING);
+  attachInterrupt(digitalPinToInterrupt(ENC2A), encoderRightISR, RISING);
+#endif
 }
 
 void loop() {
-  if (waitingflag) {
-    delay(10);
+  // Execute queued commands outside the I2C interrupt, so reads are answered while servos move
+  while (queueHead != queueTail) {
+    ControlSystem(commandQueue[queueHead], commandLength[queueHead]);
+    queueHead = (queueHead + 1) % COMMAND_QUEUE_SIZE;
   }
+  update_lift();
+  update_gripper();
 }
 
 // LED control function
@@ -134,52 +204,60 @@ void ledControl(int led, int state) {
 
 
 void gripper_close() {
-  // Move servo to 90 degrees
+  // Move servo to 90 degrees, done after the servo travel time (see update_gripper)
   gripServo.write(0);  
-  delay(1000);  // Wait for a second
+  gripperClosed = 1;
+  gripperDone = 0;
+  gripStarted = millis();
 }
 
 void gripper_open(){
-   gripServo.write(170);  
-  delay(1000);  // Wait for a second
+  gripServo.write(170);  
+  gripperClosed = 0;
+  gripperDone = 0;
+  gripStarted = millis();
+}
+
+void update_gripper() {
+  if (!gripperDone && millis() - gripStarted >= GRIP_MOVE_MS) {
+    gripperDone = 1;
+  }
 }
 
 void lift_level3(){
-  move_lift(160);
-  delay(1000);
+  move_lift(160, 3);
 }
 
 void lift_level2(){
-  move_lift(90);
-  delay(1000);
+  move_lift(90, 2);
 }
 
 void lift_level1(){
-  move_lift(10);
-  delay(1000);
+  move_lift(10, 1);
 }
 
-void release_item(){
-  lift_level1();
-  delay(1000);
-  gripper_open();
+void move_lift(int target_pos, uint8_t level){
+  // The lift steps one degree every LIFT_STEP_MS in update_lift
+  liftTarget = target_pos;
+  liftLevel = level;
+  liftReached = 0;
+  liftArrived = 0;
 }
 
-void move_lift(int target_pos){
-  if (last_pos < target_pos){ // Moving UP
-    int delta = target_pos - last_pos;
-    for (uint8_t i = 0; i < delta; i++){
-      liftServo.write(last_pos + i);
-      delay(20);
-    }
-  } else {
-    int delta = last_pos - target_pos;
-    for (uint8_t i = 0; i < delta; i++){
-      liftServo.write(last_pos - i);
-      delay(20);
+void update_lift() {
+  unsigned long now = millis();
+  if (last_pos != liftTarget) {
+    if (now - lastLiftStep >= LIFT_STEP_MS) {
+      last_pos += (last_pos < liftTarget) ? 1 : -1;
+      liftServo.write(last_pos);
+      lastLiftStep = now;
+      if (last_pos == liftTarget) {
+        liftArrived = now;
+      }
     }
+  } else if (!liftReached && liftLevel != 0 && now - liftArrived >= LIFT_SETTLE_MS) {
+    liftReached = 1;
   }
-  last_pos = target_pos;
 }
 
 
@@ -244,6 +322,7 @@ void ControlSystem(uint8_t* command, int length) {
               break;
             }
             default:{
+              commandsRejected++;
               Serial.println("Invalid motor index");
               break;
             }
@@ -260,15 +339,37 @@ void ControlSystem(uint8_t* command, int length) {
               Serial.println("Motor 2 stopped");
               break;
             default:
+              commandsRejected++;
               Serial.println("Invalid motor index");
               break;
           }
         }
       } else {
+        commandsRejected++;
         Serial.println("Invalid command length for motor");
       }
       break;
     }
+    // Both motors in one command: W<left> <right>, signed duty (-255 to 255), positive is forward
+    case 'W': {
+      int left, right;
+      if (sscanf(text + 2, "%d %d", &left, &right) != 2) {
+        commandsRejected++;
+        Serial.println("Invalid command for both motors");
+        break;
+      }
+      left = constrain(left, -MAX_SPEED, MAX_SPEED);
+      right = constrain(right, -MAX_SPEED, MAX_SPEED);
+      digitalWrite(PHS1, left >= 0 ? HIGH : LOW);
+      digitalWrite(PHS2, right >= 0 ? HIGH : LOW);
+      analogWrite(EN1, abs(left));
+      analogWrite(EN2, abs(right));
+      Serial.print("Motors set to ");
+      Serial.print(left);
+      Serial.print(" ");
+      Serial.println(right);
+      break;
+    }
     // Gripper control
     case 'G': {
       if (text[2] == '0') {
@@ -291,6 +392,7 @@ void ControlSystem(uint8_t* command, int length) {
           lift_level3();
           break;
         default:
+          commandsRejected++;
           Serial.println("Invalid Given Index");
           break;
       }
@@ -310,8 +412,9 @@ void ControlSystem(uint8_t* command, int length) {
           led = LED3;
           break;
         default:
+          commandsRejected++;
           Serial.println("Invalid Given Index");
-          break;
+          return;
       }
       if (text[3] == '1') {
         ledControl(led, HIGH);
@@ -321,6 +424,7 @@ void ControlSystem(uint8_t* command, int length) {
       break;
     }
     default:{
+      commandsRejected++;
       Serial.println("Invalid Command");
       break;
     }
@@ -330,21 +434,59 @@ void ControlSystem(uint8_t* command, int length) {
 
 
 void receiveEvent(int howMany) {
-  if (howMany >= 2) {
-    waitingflag = 0;       // turn off waiting flag because command recieved
-    uint8_t cmd[howMany];  // Buffer to store received command
-    for (int i = 0; i < howMany; i++) {
-      if (Wire.available()) {
-        cmd[i] = Wire.read();  // Read received byte
-      }
+  // A single byte is the register select before a telemetry read, nothing to execute
+  if (howMany < 2) {
+    while (Wire.available()) {
+      Wire.read();
     }
-    Serial.print("Received command: ");
-    for (int i = 0; i < howMany; i++) {
-      Serial.print((char)cmd[i]);
+    return;
+  }
+
+  uint8_t next = (queueTail + 1) % COMMAND_QUEUE_SIZE;
+  if (next == queueHead || howMany > MAX_COMMAND_LENGTH) {
+    commandsDropped++;  // Queue full (or oversized command), the Pi sees it in the telemetry
+    while (Wire.available()) {
+      Wire.read();
     }
-    Serial.println();
+    return;
+  }
+
+  int length = 0;
+  while (Wire.available() && length < howMany) {
+    commandQueue[queueTail][length++] = Wire.read();  // Read received byte
+  }
+  commandLength[queueTail] = length;
+  queueTail = next;
+  commandsReceived++;
+}
 
-    ControlSystem(cmd, howMany);
+// Telemetry frame, sent as the answer to every I2C read
+void requestEvent() {
+  uint8_t frame[TELEMETRY_SIZE];
+  uint32_t now = millis();
+  int32_t left = encoderLeft;
+  int32_t right = encoderRight;
+
+  frame[0] = TELEMETRY_VERSION;
+  frame[1] = telemetrySequence++;
+  memcpy(&frame[2], &now, 4);  // RP2040 is little-endian, as the Pi expects
+  memcpy(&frame[6], &left, 4);
+  memcpy(&frame[10], &right, 4);
+  frame[14] = liftLevel;
+  frame[15] = liftReached;
+  frame[16] = gripperClosed;
+  frame[17] = gripperDone;
+  uint16_t counters[3] = { commandsReceived, commandsRejected, commandsDropped };
+  memcpy(&frame[18], counters, 6);
+  frame[24] = 0;  // No motion segments in this firmware (Q commands are rejected)
+  frame[25] = 0;
+  frame[26] = (queueTail - queueHead + COMMAND_QUEUE_SIZE) % COMMAND_QUEUE_SIZE;  // Waiting commands
+
+  uint8_t checksum = 0;
+  for (int i = 0; i < TELEMETRY_SIZE - 1; i++) {
+    checksum += frame[i];
   }
+  frame[TELEMETRY_SIZE - 1] = checksum;
+  Wire.write(frame, TELEMETRY_SIZE);
 }
 
@@ -0,0 +1,194 @@
+import math
+import struct
+import threading
+import time
+import logging
+from dataclasses import dataclass
+
+from i2c.wheel_model import COUNTS_PER_METER, WHEEL_BASE
+
+"""
+Telemetry read back from the Pico.
+
+The Pico answers every I2C read with one fixed-size frame (see onRequest in
+i2c/slave/slave.ino), little-endian:
+
+    offset  type  field
+    0       u8    version (TELEMETRY_VERSION)
+    1       u8    sequence, increases with every frame the Pico sends
+    2       u32   Pico time (ms)
+    6       i32   left encoder count
+    10      i32   right encoder count
+    14      u8    lift level commanded (1-3, 0 before the first command)
+    15      u8    lift reached the commanded level
+    16      u8    gripper commanded (0 open, 1 closed)
+    17      u8    gripper finished moving
+    18      u16   commands received
+    20      u16   commands rejected (malformed)
+    22      u16   commands dropped (queue full)
+    24      u8    id of the last finished motion segment (0 before the first)
+    25      u8    motion segments queued, including the running one
+    26      u8    commands waiting in the Pico's command queue (ready status for the sender)
+    27      u8    checksum, sum of bytes 0-26 modulo 256
+
+i2c/slave/slave.ino has no motion segments and always reports 0 for both.
+
+Until the encoder wiring is measured the firmware builds with ENCODERS_ENABLED 0:
+slave.ino then reports 0 counts and egb320.c counts estimated from its velocity
+setpoints, so Odometry is dead reckoning rather than measured.
+
+TelemetryPoller reads a frame every POLL_INTERVAL in a background thread and keeps
+the latest valid one; the state machine turns it into ActionSequencer events
+(lift/gripper done) and Odometry integrates the encoder counts into a pose.
+"""
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_REGISTER = 0x54  # 'T', sent before the read (the Pico ignores single byte writes)
+TELEMETRY_VERSION = 3
+TELEMETRY_FORMAT = struct.Struct('<BBIiiBBBBHHHBBBB')
+TELEMETRY_SIZE = TELEMETRY_FORMAT.size  # 28 bytes, within one SMBus block read
+TELEMETRY_QUEUED = struct.calcsize(TELEMETRY_FORMAT.format[:-2])  # Offset of queued, the byte before the checksum
+POLL_INTERVAL = 0.05  # s
+MAX_AGE = 0.5  # s, older frames are not used for feedback
+
+
+@dataclass(frozen=True)
+class Telemetry:
+    sequence: int
+    pico_time_ms: int
+    encoder_left: int
+    encoder_right: int
+    lift_level: int
+    lift_reached: bool
+    gripper_closed: bool
+    gripper_done: bool
+    commands_received: int
+    commands_rejected: int
+    commands_dropped: int
+    segment_done_id: int
+    segments_pending: int
+    commands_queued: int
+    received_at: float  # time.perf_counter() on the Pi when the frame was read
+
+    @classmethod
+    def from_bytes(cls, data, received_at=None):
+        """
+        Decode one frame. Raises ValueError if it is short, corrupted or from another firmware version.
+        """
+        data = bytes(data)
+        if len(data) != TELEMETRY_SIZE:
+            raise ValueError(f"Telemetry frame has {len(data)} bytes, expected {TELEMETRY_SIZE}")
+        fields = TELEMETRY_FORMAT.unpack(data)
+        if sum(data[:-1]) & 0xFF != fields[-1]:
+            raise ValueError("Telemetry checksum mismatch")
+        if fields[0] != TELEMETRY_VERSION:
+            raise ValueError(f"Telemetry version {fields[0]}, expected {TELEMETRY_VERSION}")
+        (_, sequence, pico_time_ms, encoder_left, encoder_right, lift_level, lift_reached,
+         gripper_closed, gripper_done, received, rejected, dropped, segment_done_id, segments_pending, queued, _) = fields
+        return cls(sequence, pico_time_ms, encoder_left, encoder_right, lift_level, bool(lift_reached),
+                   bool(gripper_closed), bool(gripper_done), received, rejected, dropped,
+                   segment_done_id, segments_pending, queued,
+                   time.perf_counter() if received_at is None else received_at)
+
+    def age(self):
+        return time.perf_counter() - self.received_at
+
+
+class TelemetryPoller:
+    def __init__(self, i2c, interval=POLL_INTERVAL):
+        """
+        Args:
+        - i2c: I2C object (i2c/main_i2c.py) to read from.
+        - interval: Seconds between reads.
+        """
+        self.i2c = i2c
+        self.interval = interval
+        self.latest = None  # Latest valid Telemetry, replaced with a single assignment
+        self.frames = 0
+        self.read_errors = 0  # Bus errors on the Pi side
+        self.bad_frames = 0  # Checksum/version/length errors
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Read one frame now.
+
+        Returns:
+        - The Telemetry, or None if the read failed.
+        """
+        try:
+            data = self.i2c.read_block(TELEMETRY_REGISTER, TELEMETRY_SIZE)
+        except IOError as e:
+            self.read_errors += 1
+            logger.debug(f"Telemetry read failed: {e}")
+            return None
+        try:
+            telemetry = Telemetry.from_bytes(data)
+        except ValueError as e:
+            self.bad_frames += 1
+            logger.debug(f"Telemetry frame rejected: {e}")
+            return None
+        self.latest = telemetry
+        self.frames += 1
+        return telemetry
+
+    def fresh(self, max_age=MAX_AGE):
+        """
+        The latest frame if it is recent enough to act on, otherwise None.
+        """
+        telemetry = self.latest
+        if telemetry is None or telemetry.age() > max_age:
+            return None
+        return telemetry
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            logger.info(f"Polling telemetry every {self.interval * 1000:.0f} ms")
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            logger.info(f"Telemetry: {self.frames} frames, {self.read_errors} read errors, {self.bad_frames} bad frames")
+
+
+class Odometry:
+    def __init__(self, counts_per_meter=COUNTS_PER_METER, wheel_base=WHEEL_BASE):
+        """
+        Dead reckoning from the encoder counts (x forward, y left, theta counter-clockwise, from the start pose).
+        """
+        self.counts_per_meter = counts_per_meter
+        self.wheel_base = wheel_base
+        self.x = self.y = self.theta = 0.0
+        self.distance = 0.0  # m, total travel of the robot centre
+        self._last = None
+
+    def update(self, telemetry):
+        """
+        Integrate the encoder counts of a new frame.
+
+        Returns:
+        - (x, y, theta) pose.
+        """
+        if self._last is not None:
+            left = (telemetry.encoder_left - self._last.encoder_left) / self.counts_per_meter
+            right = (telemetry.encoder_right - self._last.encoder_right) / self.counts_per_meter
+            forward = (left + right) / 2
+            turn = (right - left) / self.wheel_base
+            heading = self.theta + turn / 2  # Midpoint heading over the interval
+            self.x += forward * math.cos(heading)
+            self.y += forward * math.sin(heading)
+            self.theta += turn
+            self.distance += abs(forward)
+        self._last = telemetry
+        return self.x, self.y, self.theta
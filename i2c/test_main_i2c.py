@@ -1,4 +1,4 @@
-from main_i2c import I2C
+from i2c.main_i2c import I2C  # Run from the repository root: python -m i2c.test_main_i2c
 import time
 
 
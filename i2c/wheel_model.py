@@ -0,0 +1,22 @@
+"""
+Wheel model shared by the Pi side: the planner's duty conversion
+(navigation/dynamic_window.py), odometry (i2c/telemetry.py) and the Pico
+emulator (i2c/emulator.py).
+
+The firmware cannot import this, so PICO/egb320/egb320.c repeats the values
+under the same names; change both together. Duty cycles use the scale of the
+M/W commands, 0-255 as MAX_DUTY in the firmware.
+"""
+
+# Tune on the robot
+WHEEL_BASE = 0.15  # m, distance between the wheels
+MAX_WHEEL_SPEED = 0.30  # m/s of a wheel at MAX_DUTY
+MAX_DUTY = 255  # Full duty of the M/W commands (DCWrite range)
+COUNTS_PER_METER = 2000.0  # Encoder counts per metre of wheel travel, unmeasured (ENCODERS_ENABLED in the firmware)
+
+
+def duty_to_speed(duty):
+    """
+    Open-loop wheel speed (m/s) for a signed duty cycle, saturated at MAX_DUTY.
+    """
+    return max(-MAX_DUTY, min(MAX_DUTY, duty)) / MAX_DUTY * MAX_WHEEL_SPEED
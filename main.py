@@ -1,3 +1,4 @@
+from startup import configure_logging, milestone  # First import, starts the startup clock
 import logging
 from collections import deque
 from Vision.main_vision import Vision as VisionClass
@@ -6,25 +7,20 @@ from navigation.state_machine import StateMachine
 import time
 from threading import Thread, Event
 
-# Step 1: Configure the logger
-logging.basicConfig(
-    level=logging.DEBUG,  # Set the logging level to DEBUG (you can change this to INFO or WARNING)
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Outputs to the console
-        logging.FileHandler("vision_log.log", mode='a')  # Outputs to a log file
-    ]
-)
+# Step 1: Configure the logger (the only place handlers are set up, see startup.py)
+configure_logging("vision_log.log")
 
 logger = logging.getLogger(__name__)  # Create a logger for this file
 
 def main():
+    milestone("imports done")
     logger.info("Initializing Vision system for testing.")
 
     state_machine = StateMachine()
     camera = Camera()
     Vision = VisionClass(camera)
     state_machine.set_vision(Vision)
+    state_machine.telemetry.start()  # Lift/gripper feedback and encoder counts from the Pico
     stop_event = Event()  # Create an event to signal threads to stop
 
     # Start the camera's live feed in a separate thread
@@ -32,6 +28,7 @@ def main():
     live_thread.start()
 
     Vision.start("/home/edmond/egb320-team9/Videos/row2_exit_backward.mp4")  # Start the vision processing
+    milestone("vision started")
 
     # Initial state setup
     current_state = 'INIT'
@@ -39,6 +36,8 @@ def main():
     logger.info(f"Set requested objects state to: {current_state}")
 
     fps_history = deque(maxlen=10)  # Store the last 10 FPS values
+    first_frame_logged = False
+    first_command_logged = False
     time.sleep(1)
 
     try:
@@ -54,6 +53,14 @@ def main():
             # Run the state machine and update requested objects
             Vision.requested_objects = state_machine.run_state_machine(data)
 
+            # Startup milestones
+            if not first_frame_logged and Vision.frame_count > 0:
+                milestone("first frame")
+                first_frame_logged = True
+            if not first_command_logged and state_machine.last_command_time is not None:
+                milestone("first motor command", at=state_machine.last_command_time)
+                first_command_logged = True
+
             elapsed = time.time() - now  # Measure the time taken to process one frame
             fps = 1.0 / elapsed
             if fps < 100:
@@ -67,6 +74,7 @@ def main():
         logger.info("Keyboard Interrupt received. Shutting down, please wait 2 seconds...")
     finally:
         stop_event.set()  # Signal the live feed thread to stop
+        state_machine.telemetry.stop()
         live_thread.join()  # Ensure the thread finishes
         #Vision.camera.close()  # Clean up the camera resources
         Vision.stop()  # Clean up the camera and Vision system resources
@@ -1,3 +1,4 @@
+from startup import configure_logging, milestone  # First import, starts the startup clock
 import logging
 from collections import deque
 from Vision.main_vision import Vision as VisionClass
@@ -6,15 +7,8 @@ from navigation.state_machine import StateMachine
 import time
 from threading import Thread, Event
 
-# Step 1: Configure the logger
-logging.basicConfig(
-    level=logging.DEBUG,  # Set the logging level to DEBUG (you can change this to INFO or WARNING)
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Outputs to the console
-        logging.FileHandler("test_vision.log", mode='a')  # Outputs to a log file
-    ]
-)
+# Step 1: Configure the logger (the only place handlers are set up, see startup.py)
+configure_logging("test_vision.log")
 
 logger = logging.getLogger(__name__)  # Create a logger for this file
 
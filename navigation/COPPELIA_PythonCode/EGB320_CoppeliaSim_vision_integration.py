@@ -141,7 +141,7 @@ if __name__ == '__main__':
 
 		#We recommended changing this to a controlled rate loop (fixed frequency) to get more reliable control behaviour
 		while True:
-			status, frame = warehouseBotSim.GetCameraImage()
+			resolution, frame = warehouseBotSim.GetCameraFrame()
 			process_frame(frame, color_thresholds)
 
 			# Path to the JSON file
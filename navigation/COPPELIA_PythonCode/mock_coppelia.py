@@ -0,0 +1,431 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+import coppeliaConst
+
+"""
+Mock of the CoppeliaSim remote API server, to run warehousebot_lib without CoppeliaSim.
+
+MockCoppelia has the simx* functions and constants of the coppelia module that COPPELIA_WarehouseRobot
+uses, and answers them from a simple in-process warehouse scene instead of the simulator:
+- an approximate arena layout (6 shelves with 4x3 bays, packing bay, row markers, obstacles), see SHELF_X;
+- differential drive kinematics from the wheel joint target velocities, stepped every STEP_TIME of
+  simulation time (simxSynchronousTrigger in synchronous mode, wall clock otherwise);
+- the Robot child script functions getObjectsInView, getDistanceToObject, getSimState (getSimState.lua),
+  JoinRobotAndItem and RobotReleaseItem;
+- the proximity sensor, as a ray straight ahead of the robot against the shelves and walls.
+The vision sensor has no image (novalue) and objects are not occluded.
+
+Blocking calls (simx_opmode_oneshot_wait/blocking) count as a round trip to the server and take
+latency seconds, so the number of round trips of a loop can be checked against the real thing.
+
+Usage:
+    warehouseBotSim = COPPELIA_WarehouseRobot('127.0.0.1', robotParameters, sceneParameters, api=MockCoppelia())
+
+Or, to compare the batched state fetch with one call per object (from this folder):
+    python mock_coppelia.py [--steps 200] [--latency 0.001]
+"""
+
+STEP_TIME = 0.05  # s of simulation time per step, CoppeliaSim's default
+ARENA_HALF_SIZE = 1.0  # m, the arena is 2x2 m around the origin
+
+# Approximate layout: shelves run along y at these x positions, bays along the shelf and up
+SHELF_X = [-0.95, -0.45, -0.25, 0.25, 0.45, 0.95]
+SHELF_Y = (-0.7, 0.1)  # m, ends of the shelves
+SHELF_DEPTH = 0.1
+BAY_Y = [-0.6, -0.4, -0.2, 0.0]  # bay x index along the shelf
+BAY_Z = [0.05, 0.15, 0.25]  # bay y index (height), see GetItemBayHeight
+PACKING_BAY_POSITION = [0.75, 0.75, 0.0]
+ROW_MARKER_POSITIONS = [[-0.7, -0.98, 0.1], [0.0, -0.98, 0.1], [0.7, -0.98, 0.1]]
+OBSTACLE_POSITIONS = [[2.0, -0.3, 0.075], [2.0, -0.475, 0.075], [2.0, -0.65, 0.075]]  # out of the arena
+ROBOT_START = (0.0, 0.6, -math.pi/2)  # x, y, yaw
+
+WHEEL_RADIUS = 0.04
+WHEEL_BASE = 0.15
+CAMERA_FOV = math.radians(60)
+VIEW_RANGE = 3.0  # m, objects further away are not in view
+PROXIMITY_OFFSET = 0.08  # m ahead of the robot centre
+PROXIMITY_RANGE = 0.5  # m
+ITEM_NAMES = ["BOWL", "MUG", "BOTTLE", "SOCCER_BALL", "RUBIKS_CUBE", "CEREAL_BOX"]
+OBJECTS_IN_VIEW = 19  # flags returned by getObjectsInView, see warehouseObjects
+
+
+class MockCoppelia:
+    def __init__(self, latency=0.0, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+        - latency: seconds each blocking call takes (the round trip to the server).
+        - clock, sleep: time source for the wall clock stepping and the latency, replaceable in tests.
+        """
+        # The constants of the coppelia module (simx_opmode_*, simx_return_*, sim_*)
+        self.__dict__.update({name: value for name, value in vars(coppeliaConst).items() if not name.startswith('_')})
+        self.latency = latency
+        self.clock = clock
+        self.sleep = sleep
+        self.round_trips = 0
+        self.calls = 0
+        self.synchronous = False
+        self.running = False
+        self.sim_time = 0.0
+        self.started_at = 0.0
+        self.streaming = set()
+
+        self.handles = {}  # name -> handle
+        self.positions = {}  # handle -> [x, y, z], world frame
+        self.orientations = {}  # handle -> [alpha, beta, gamma]
+        self.local_positions = {}  # handle -> [x, y, z] relative to the robot, for the camera and sensors
+        self.joint_velocities = {}
+        self.shelf_handles = []
+        self.item_types = {}  # handle of a placed item -> item type
+        self.attached = {}  # handle of a collected item -> position relative to the robot (forwards, left, z)
+
+        self.robot = self.add_object('Robot', [ROBOT_START[0], ROBOT_START[1], 0.0], [0.0, 0.0, ROBOT_START[2]])
+        self.camera = self.add_object('VisionSensor', [0, 0, 0], local=[0.1, 0.0, 0.0])
+        self.proximity = self.add_object('Proximity_sensor', [0, 0, 0], local=[PROXIMITY_OFFSET, 0.0, 0.0])
+        for name in ['LeftMotor', 'RightMotor', 'LeftRearMotor', 'RightRearMotor']:
+            self.add_object(name, [0, 0, 0])
+        self.add_object('Packing_Bay', PACKING_BAY_POSITION)
+        for index, position in enumerate(OBSTACLE_POSITIONS):
+            self.add_object(f'Obstacle_{index}', position)
+        for index, position in enumerate(ROW_MARKER_POSITIONS):
+            self.add_object(f'row_marker{index + 1}', position)
+        for index, name in enumerate(ITEM_NAMES):
+            self.add_object(name, [2.0, 0.2*index, 0.0])  # Templates, out of the arena
+        for shelf, x in enumerate(SHELF_X):
+            self.shelf_handles.append(self.add_object(f'Shelf{shelf}', [x, sum(SHELF_Y)/2, 0.0]))
+            for bay_x, y in enumerate(BAY_Y):
+                for bay_y, z in enumerate(BAY_Z):
+                    self.add_object(f'/Shelf{shelf}/Bay{bay_x}{bay_y}', [x, y, z])
+        self.update_attached()
+
+    def add_object(self, name, position, orientation=(0.0, 0.0, 0.0), local=None):
+        handle = len(self.handles) + 1
+        self.handles[name] = handle
+        self.positions[handle] = list(position)
+        self.orientations[handle] = list(orientation)
+        if local is not None:
+            self.local_positions[handle] = list(local)
+        return handle
+
+    # --- Simulation -----------------------------------------------------------------
+
+    def pose(self):
+        """(x, y, yaw) of the robot."""
+        x, y, _ = self.positions[self.robot]
+        return x, y, self.orientations[self.robot][2]
+
+    def to_world(self, local):
+        x, y, yaw = self.pose()
+        return [x + local[0]*math.cos(yaw) - local[1]*math.sin(yaw),
+                y + local[0]*math.sin(yaw) + local[1]*math.cos(yaw),
+                local[2]]
+
+    def update_attached(self):
+        """Move the camera, sensors and collected items with the robot."""
+        for handle, local in self.local_positions.items():
+            self.positions[handle] = self.to_world(local)
+        for handle, local in self.attached.items():
+            self.positions[handle] = self.to_world(local)
+
+    def step(self):
+        """Simulate one STEP_TIME of differential drive."""
+        left = self.joint_velocities.get(self.handles['LeftMotor'], 0.0)
+        right = self.joint_velocities.get(self.handles['RightMotor'], 0.0)
+        forwards = WHEEL_RADIUS*(left + right)/2
+        rotational = WHEEL_RADIUS*(right - left)/WHEEL_BASE
+        x, y, yaw = self.pose()
+        x += forwards*math.cos(yaw)*STEP_TIME
+        y += forwards*math.sin(yaw)*STEP_TIME
+        limit = ARENA_HALF_SIZE - 0.075  # The walls stop the robot
+        self.positions[self.robot][0] = min(max(x, -limit), limit)
+        self.positions[self.robot][1] = min(max(y, -limit), limit)
+        self.orientations[self.robot][2] = (yaw + rotational*STEP_TIME + math.pi) % (2*math.pi) - math.pi
+        self.sim_time += STEP_TIME
+        self.update_attached()
+
+    def call(self, operationMode):
+        """Bookkeeping for every API call: catch up with the wall clock and count the round trip."""
+        self.calls += 1
+        if self.running and not self.synchronous:
+            while self.sim_time + STEP_TIME <= self.clock() - self.started_at:
+                self.step()
+        if operationMode in (self.simx_opmode_oneshot_wait, self.simx_opmode_blocking):
+            self.round_trips += 1
+            if self.latency:
+                self.sleep(self.latency)
+
+    def stream(self, key, operationMode):
+        """Return code of a read in streaming/buffer mode: no value until streaming has started."""
+        if operationMode == self.simx_opmode_streaming:
+            first = key not in self.streaming
+            self.streaming.add(key)
+            return self.simx_return_novalue_flag if first else self.simx_return_ok
+        if operationMode == self.simx_opmode_buffer and key not in self.streaming:
+            return self.simx_return_novalue_flag
+        if operationMode == self.simx_opmode_discontinue:
+            self.streaming.discard(key)
+        return self.simx_return_ok
+
+    def in_view(self, position):
+        """True if the position is within the camera's horizontal field of view and VIEW_RANGE."""
+        camera = self.positions[self.camera]
+        dx, dy = position[0] - camera[0], position[1] - camera[1]
+        bearing = (math.atan2(dy, dx) - self.pose()[2] + math.pi) % (2*math.pi) - math.pi
+        return abs(bearing) < CAMERA_FOV/2 and math.hypot(dx, dy) < VIEW_RANGE
+
+    def shelf_box(self, shelf):
+        x = SHELF_X[shelf]
+        return x - SHELF_DEPTH/2, SHELF_Y[0], x + SHELF_DEPTH/2, SHELF_Y[1]
+
+    def closest_shelf_point(self, shelf, point):
+        x0, y0, x1, y1 = self.shelf_box(shelf)
+        return [min(max(point[0], x0), x1), min(max(point[1], y0), y1), 0.1]
+
+    def proximity_distance(self):
+        """Distance from the proximity sensor to the first shelf or wall straight ahead, or None."""
+        sx, sy, _ = self.positions[self.proximity]
+        yaw = self.pose()[2]
+        dx, dy = math.cos(yaw), math.sin(yaw)
+        boxes = [self.shelf_box(shelf) for shelf in range(len(SHELF_X))]
+        hits = []
+        for x0, y0, x1, y1 in boxes:  # Slab test of the ray against each shelf
+            near, far = 0.0, PROXIMITY_RANGE
+            for start, direction, low, high in ((sx, dx, x0, x1), (sy, dy, y0, y1)):
+                if abs(direction) < 1e-9:
+                    if not low <= start <= high:
+                        near, far = 1, 0
+                    continue
+                t0, t1 = sorted(((low - start)/direction, (high - start)/direction))
+                near, far = max(near, t0), min(far, t1)
+            if near <= far:
+                hits.append(near)
+        for start, direction in ((sx, dx), (sy, dy)):  # Walls
+            if abs(direction) > 1e-9:
+                wall = math.copysign(ARENA_HALF_SIZE, direction)
+                hits.append((wall - start)/direction)
+        hits = [hit for hit in hits if 0 <= hit <= PROXIMITY_RANGE]
+        return min(hits) if hits else None
+
+    # --- Robot child script functions -----------------------------------------------
+
+    def getObjectsInView(self, ints, floats, strings, buffer):
+        flags = [0]*OBJECTS_IN_VIEW
+        for handle, item_type in self.item_types.items():
+            if handle not in self.attached and self.in_view(self.positions[handle]):
+                flags[item_type] = 1
+        for index in range(3):
+            flags[6 + index] = int(self.in_view(self.positions[self.handles[f'Obstacle_{index}']]))
+            flags[10 + index] = int(self.in_view(self.positions[self.handles[f'row_marker{index + 1}']]))
+        flags[9] = int(self.in_view(self.positions[self.handles['Packing_Bay']]))
+        for shelf in range(len(SHELF_X)):
+            x0, y0, x1, y1 = self.shelf_box(shelf)
+            corners = [[x, y] for x in (x0, x1) for y in (y0, y1)] + [[(x0 + x1)/2, (y0 + y1)/2]]
+            flags[13 + shelf] = int(any(self.in_view(corner) for corner in corners))
+        return flags, [], [], bytearray()
+
+    def getDistanceToObject(self, ints, floats, strings, buffer):
+        # Per object: 0 if within the distance, and the closest points (camera, object) and the distance
+        results, data = [], []
+        camera = self.positions[self.camera]
+        for handle, limit in zip(ints, floats):
+            shelf = self.shelf_handles.index(handle)
+            point = self.closest_shelf_point(shelf, camera)
+            distance = math.dist(camera[:2], point[:2])
+            results.append(0 if distance < limit else 1)
+            data += list(camera) + point + [distance]
+        return results, data, [], bytearray()
+
+    def getSimState(self, ints, floats, strings, buffer):
+        robot, proximity, shelf_count = ints[0:3]
+        shelves, handles = ints[3:3 + shelf_count], ints[3 + shelf_count:]
+        out_ints, out_floats = [], list(self.orientations[robot])
+        distance = self.proximity_distance()
+        out_ints.append(0 if distance is None else 1)
+        out_floats += [0.0, 0.0, distance or 0.0]  # Detected point in the sensor frame (z ahead)
+        for handle in handles:
+            out_floats += self.positions.get(handle, [math.nan]*3)
+        shelf_ints, shelf_floats, _, _ = self.getDistanceToObject(shelves, floats*shelf_count, [], bytearray())
+        view_ints, _, _, _ = self.getObjectsInView([], [], [], bytearray())
+        return out_ints + shelf_ints + view_ints, out_floats + shelf_floats, [], bytearray()
+
+    def JoinRobotAndItem(self, ints, floats, strings, buffer):
+        handle = ints[0]
+        x, y, yaw = self.pose()
+        dx, dy = self.positions[handle][0] - x, self.positions[handle][1] - y
+        self.attached[handle] = [dx*math.cos(yaw) + dy*math.sin(yaw), -dx*math.sin(yaw) + dy*math.cos(yaw),
+                                 self.positions[handle][2]]
+        return [], [], [], bytearray()
+
+    def RobotReleaseItem(self, ints, floats, strings, buffer):
+        self.attached.clear()
+        return [], [], [], bytearray()
+
+    # --- Remote API -----------------------------------------------------------------
+
+    def simxStart(self, connectionAddress, connectionPort, waitUntilConnected, doNotReconnectOnceDisconnected, timeOutInMs, commThreadCycleInMs):
+        return 0
+
+    def simxFinish(self, clientID):
+        pass
+
+    def simxGetPingTime(self, clientID):
+        self.call(self.simx_opmode_blocking)
+        return self.simx_return_ok, int(self.latency*1000)
+
+    def simxSynchronous(self, clientID, enable):
+        self.call(self.simx_opmode_blocking)
+        self.synchronous = bool(enable)
+        return self.simx_return_ok
+
+    def simxSynchronousTrigger(self, clientID):
+        self.call(self.simx_opmode_oneshot)
+        if self.running:
+            self.step()
+        return self.simx_return_ok
+
+    def simxStartSimulation(self, clientID, operationMode):
+        self.call(operationMode)
+        self.running = True
+        self.started_at = self.clock() - self.sim_time
+        return self.simx_return_ok
+
+    def simxStopSimulation(self, clientID, operationMode):
+        self.call(operationMode)
+        self.running = False
+        return self.simx_return_ok
+
+    def simxGetObjectHandle(self, clientID, objectName, operationMode):
+        self.call(operationMode)
+        if objectName not in self.handles:
+            return self.simx_return_remote_error_flag, 0
+        return self.simx_return_ok, self.handles[objectName]
+
+    def simxGetObjectPosition(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        self.call(operationMode)
+        if objectHandle not in self.positions:
+            return self.simx_return_remote_error_flag, [0.0, 0.0, 0.0]
+        ret = self.stream(('position', objectHandle), operationMode)
+        return ret, list(self.positions[objectHandle])
+
+    def simxGetObjectOrientation(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        self.call(operationMode)
+        if objectHandle not in self.orientations:
+            return self.simx_return_remote_error_flag, [0.0, 0.0, 0.0]
+        ret = self.stream(('orientation', objectHandle), operationMode)
+        return ret, list(self.orientations[objectHandle])
+
+    def simxSetObjectPosition(self, clientID, objectHandle, relativeToObjectHandle, position, operationMode):
+        self.call(operationMode)
+        if objectHandle not in self.positions:
+            return self.simx_return_remote_error_flag
+        if relativeToObjectHandle == self.sim_handle_parent and objectHandle in self.local_positions:
+            self.local_positions[objectHandle] = list(position)
+            self.update_attached()
+        else:
+            self.positions[objectHandle] = list(position)
+        return self.simx_return_ok
+
+    def simxSetObjectOrientation(self, clientID, objectHandle, relativeToObjectHandle, eulerAngles, operationMode):
+        self.call(operationMode)
+        if objectHandle not in self.orientations:
+            return self.simx_return_remote_error_flag
+        if objectHandle in self.local_positions:
+            return self.simx_return_ok  # The camera tilt does not matter here
+        self.orientations[objectHandle] = list(eulerAngles)
+        return self.simx_return_ok
+
+    def simxSetObjectIntParameter(self, clientID, objectHandle, parameterID, parameterValue, operationMode):
+        self.call(operationMode)
+        return self.simx_return_ok
+
+    def simxSetJointTargetVelocity(self, clientID, jointHandle, targetVelocity, operationMode):
+        self.call(operationMode)
+        self.joint_velocities[jointHandle] = float(np.squeeze(targetVelocity))  # Can be a 1 element array with wheel bias
+        return self.simx_return_ok
+
+    def simxCopyPasteObjects(self, clientID, objectHandles, operationMode):
+        self.call(operationMode)
+        copies = []
+        for handle in objectHandles:
+            template = next(name for name, value in self.handles.items() if value == handle)
+            copy = self.add_object(f'{template}#{len(self.handles)}', self.positions[handle])
+            if template in ITEM_NAMES:
+                self.item_types[copy] = ITEM_NAMES.index(template)
+            copies.append(copy)
+        return self.simx_return_ok, copies
+
+    def simxReadProximitySensor(self, clientID, sensorHandle, operationMode):
+        self.call(operationMode)
+        ret = self.stream(('proximity', sensorHandle), operationMode)
+        distance = self.proximity_distance()
+        return ret, distance is not None, [0.0, 0.0, distance or 0.0], 0, [0.0, 0.0, 1.0]
+
+    def simxGetVisionSensorImage(self, clientID, sensorHandle, options, operationMode):
+        self.call(operationMode)
+        return self.simx_return_novalue_flag, [], []
+
+    def simxGetVisionSensorImageArray(self, clientID, sensorHandle, options, operationMode):
+        self.call(operationMode)
+        return self.simx_return_novalue_flag, [], None
+
+    def simxCallScriptFunction(self, clientID, scriptDescription, options, functionName, inputInts, inputFloats, inputStrings, inputBuffer, operationMode):
+        self.call(operationMode)
+        function = getattr(self, functionName, None) if functionName in SCRIPT_FUNCTIONS else None
+        if scriptDescription != 'Robot' or function is None:
+            return self.simx_return_remote_error_flag, [], [], [], bytearray()
+        ints, floats, strings, buffer = function(list(inputInts), list(inputFloats), list(inputStrings), inputBuffer)
+        return self.simx_return_ok, ints, floats, strings, buffer
+
+
+SCRIPT_FUNCTIONS = {'getObjectsInView', 'getDistanceToObject', 'getSimState', 'JoinRobotAndItem', 'RobotReleaseItem'}
+
+
+def run(robotParameters, sceneParameters, steps, latency):
+    """
+    Drive a circle in synchronous mode against a MockCoppelia, like the example loop does.
+
+    Returns:
+    - round trips per step, steps per second of wall time.
+    """
+    from warehousebot_lib import COPPELIA_WarehouseRobot
+
+    api = MockCoppelia(latency=latency)
+    warehouseBotSim = COPPELIA_WarehouseRobot('127.0.0.1', robotParameters, sceneParameters, api=api)
+    warehouseBotSim.StartSimulator()
+    round_trips = api.round_trips
+    start = time.perf_counter()
+    for _ in range(steps):
+        warehouseBotSim.GetDetectedObjects()
+        warehouseBotSim.readProximity()
+        warehouseBotSim.SetTargetVelocities(0.1, 0.5)
+        warehouseBotSim.UpdateObjectPositions()
+        warehouseBotSim.stepSim()
+    elapsed = time.perf_counter() - start
+    return (api.round_trips - round_trips)/steps, steps/elapsed
+
+
+def main(argv=None):
+    from warehousebot_lib import RobotParameters, SceneParameters
+
+    parser = argparse.ArgumentParser(description="Step warehousebot_lib against the mock CoppeliaSim server")
+    parser.add_argument("--steps", type=int, default=200, help="Simulation steps per run")
+    parser.add_argument("--latency", type=float, default=0.001, help="Seconds per blocking call (round trip)")
+    args = parser.parse_args(argv)
+
+    print(f"{args.steps} synchronous steps of {STEP_TIME*1000:.0f} ms, {args.latency*1000:.2f} ms per round trip")
+    for batchState in (False, True):
+        robotParameters = RobotParameters()
+        robotParameters.sync = True
+        robotParameters.batchState = batchState
+        sceneParameters = SceneParameters()
+        sceneParameters.bayContents = np.random.default_rng(0).integers(-1, 6, (6, 4, 3), dtype=np.int16)
+        trips, rate = run(robotParameters, sceneParameters, args.steps, args.latency)
+        name = "batched" if batchState else "per object"
+        print(f"{name:10s} {trips:6.1f} round trips/step {rate:8.0f} steps/s ({rate*STEP_TIME:.1f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import struct
 import sys
 import os
 import ctypes as ct
+import numpy as np
 from coppeliaConst import *
 
 #load library
@@ -310,6 +311,44 @@ def simxGetVisionSensorDepthBuffer(clientID, sensorHandle, operationMode):
             reso.append(resolution[i])
     return ret, reso, buffer
 
+def simxGetVisionSensorImageArray(clientID, sensorHandle, options, operationMode):
+    '''
+    Same as simxGetVisionSensorImage, but the image is returned as a numpy uint8 array of
+    shape (height, width, 3), or (height, width) with options bit 0 set (greyscale), made
+    with a single copy of the C buffer instead of a Python list built byte by byte.
+    Rows are in the sensor's order (bottom row first), channels are RGB.
+    Returns ret, [width, height], image (None if ret is not simx_return_ok).
+    '''
+    resolution = (ct.c_int*2)()
+    c_image  = ct.POINTER(ct.c_byte)()
+    bytesPerPixel = 1 if options & 1 else 3
+    ret = c_GetVisionSensorImage(clientID, sensorHandle, resolution, ct.byref(c_image), options, operationMode)
+
+    reso = []
+    image = None
+    if (ret == 0):
+        reso = [resolution[0], resolution[1]]
+        shape = (resolution[1], resolution[0], bytesPerPixel) if bytesPerPixel == 3 else (resolution[1], resolution[0])
+        # View of the library's buffer (reused by the next call), copied once
+        image = np.ctypeslib.as_array(ct.cast(c_image, ct.POINTER(ct.c_ubyte)), shape=shape).copy()
+    return ret, reso, image
+
+def simxGetVisionSensorDepthBufferArray(clientID, sensorHandle, operationMode):
+    '''
+    Same as simxGetVisionSensorDepthBuffer, but the buffer is returned as a numpy float32
+    array of shape (height, width) made with a single copy, bottom row first.
+    Returns ret, [width, height], buffer (None if ret is not simx_return_ok).
+    '''
+    c_buffer  = ct.POINTER(ct.c_float)()
+    resolution = (ct.c_int*2)()
+    ret = c_GetVisionSensorDepthBuffer(clientID, sensorHandle, resolution, ct.byref(c_buffer), operationMode)
+    reso = []
+    buffer = None
+    if (ret == 0):
+        reso = [resolution[0], resolution[1]]
+        buffer = np.ctypeslib.as_array(c_buffer, shape=(resolution[1], resolution[0])).copy()
+    return ret, reso, buffer
+
 def simxGetObjectChild(clientID, parentObjectHandle, childIndex, operationMode):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
@@ -0,0 +1,60 @@
+-- Batched state fetch for warehousebot_lib (COPPELIA_WarehouseRobot.GetSimState).
+-- Add this function to the Robot's child script in the scene, next to getObjectsInView and
+-- getDistanceToObject. It returns everything the Python side reads each loop in one remote API
+-- call, instead of one round trip per object position, detection and sensor read.
+--
+-- inInts:    robot handle, proximity sensor handle, number of shelves, shelf handles...,
+--            handles of the objects to get the position of...
+-- inFloats:  maximum shelf detection distance
+-- outInts:   proximity detected (0/1), getDistanceToObject results per shelf..., getObjectsInView flags...
+-- outFloats: robot orientation (3), proximity point (3), object positions (3 each, NaN if the handle
+--            is not valid), getDistanceToObject data...
+function getSimState(inInts,inFloats,inStrings,inBuffer)
+    local robot=inInts[1]
+    local proximity=inInts[2]
+    local shelfCount=inInts[3]
+    local outInts={}
+    local outFloats={}
+
+    for _,angle in ipairs(sim.getObjectOrientation(robot,-1)) do
+        table.insert(outFloats,angle)
+    end
+
+    local detected,_,point=sim.readProximitySensor(proximity)
+    table.insert(outInts,detected>0 and 1 or 0)
+    point=point or {0,0,0}
+    for i=1,3 do
+        table.insert(outFloats,point[i])
+    end
+
+    for i=4+shelfCount,#inInts do
+        local ok,position=pcall(sim.getObjectPosition,inInts[i],-1)
+        if not ok then
+            position={0/0,0/0,0/0}
+        end
+        for j=1,3 do
+            table.insert(outFloats,position[j])
+        end
+    end
+
+    local shelves={}
+    local distances={}
+    for i=1,shelfCount do
+        shelves[i]=inInts[3+i]
+        distances[i]=inFloats[1]
+    end
+    local shelfInts,shelfFloats=getDistanceToObject(shelves,distances,{},'')
+    for _,value in ipairs(shelfInts) do
+        table.insert(outInts,value)
+    end
+    for _,value in ipairs(shelfFloats) do
+        table.insert(outFloats,value)
+    end
+
+    local viewInts=getObjectsInView({},{},{},'')
+    for _,value in ipairs(viewInts) do
+        table.insert(outInts,value)
+    end
+
+    return outInts,outFloats,{},''
+end
@@ -62,7 +62,11 @@ class COPPELIA_WarehouseRobot(object):
 	#### COPPELIA WAREHOUSE BOT INIT ###
 	####################################
 
-	def __init__(self, coppelia_server_ip, robotParameters, sceneParameters):
+	# api: the remote API module (coppelia), or an object with the same functions such as MockCoppelia (mock_coppelia.py)
+	def __init__(self, coppelia_server_ip, robotParameters, sceneParameters, api=None):
+		# Remote API used for every call to COPPELIA
+		self.coppelia = api or coppelia
+
 		# Robot Parameters
 		self.robotParameters = robotParameters
 		self.leftWheelBias = 0
@@ -111,6 +115,11 @@ class COPPELIA_WarehouseRobot(object):
 		self.obstaclePositions = [None, None, None]
 		self.rowMarkerPositions = [None, None, None]
 
+		# Scene state from the last batched fetch (GetSimState), None when the positions were read one by one
+		self.objectsInView = None
+		self.shelfDistances = None
+		self.proximityPoint = None
+
 		# Variable to hold whether the item has been joined to the robot
 		self.itemConnectedToRobot = False
 
@@ -138,7 +147,7 @@ class COPPELIA_WarehouseRobot(object):
 	def StartSimulator(self):
 		print('Attempting to Start the Simulator')
 		
-		if coppelia.simxStartSimulation(self.clientID, coppelia.simx_opmode_oneshot_wait) != 0:
+		if self.coppelia.simxStartSimulation(self.clientID, self.coppelia.simx_opmode_oneshot_wait) != 0:
 			print('An error occurred while trying to start the simulator via the Python API. Terminating Program!')
 			print('Comment out calls to StartSimulator() and start the simulator manully by pressing the Play button in COPPELIA.')
 			sys.exit(-1)
@@ -149,24 +158,24 @@ class COPPELIA_WarehouseRobot(object):
 		self.SetScene()
 		
 		# Setup streaming modes to each object
-		coppelia.simxGetObjectPosition(self.clientID, self.robotHandle, -1, coppelia.simx_opmode_streaming)
-		coppelia.simxGetObjectOrientation(self.clientID, self.robotHandle, -1, coppelia.simx_opmode_streaming)
-		coppelia.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, coppelia.simx_opmode_streaming)
-		coppelia.simxGetObjectPosition(self.clientID, self.packingBayHandle, -1, coppelia.simx_opmode_streaming)
-		coppelia.simxReadProximitySensor(self.clientID,self.proximityHandle,coppelia.simx_opmode_streaming)
+		self.coppelia.simxGetObjectPosition(self.clientID, self.robotHandle, -1, self.coppelia.simx_opmode_streaming)
+		self.coppelia.simxGetObjectOrientation(self.clientID, self.robotHandle, -1, self.coppelia.simx_opmode_streaming)
+		self.coppelia.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, self.coppelia.simx_opmode_streaming)
+		self.coppelia.simxGetObjectPosition(self.clientID, self.packingBayHandle, -1, self.coppelia.simx_opmode_streaming)
+		self.coppelia.simxReadProximitySensor(self.clientID,self.proximityHandle,self.coppelia.simx_opmode_streaming)
 
 		
-		res,resolution,image=coppelia.simxGetVisionSensorImage(self.clientID,self.cameraHandle,0,coppelia.simx_opmode_streaming)
+		res,resolution,image=self.coppelia.simxGetVisionSensorImageArray(self.clientID,self.cameraHandle,0,self.coppelia.simx_opmode_streaming)
 
 
 		for handle in self.obstacleHandles:
-			coppelia.simxGetObjectPosition(self.clientID, handle, -1, coppelia.simx_opmode_streaming)
+			self.coppelia.simxGetObjectPosition(self.clientID, handle, -1, self.coppelia.simx_opmode_streaming)
 
 		for handle in self.itemHandles.flatten():
-			coppelia.simxGetObjectPosition(self.clientID, handle, -1, coppelia.simx_opmode_streaming)
+			self.coppelia.simxGetObjectPosition(self.clientID, handle, -1, self.coppelia.simx_opmode_streaming)
 
 		for handle in self.rowMarkerHandles:
-			coppelia.simxGetObjectPosition(self.clientID, handle, -1, coppelia.simx_opmode_streaming)
+			self.coppelia.simxGetObjectPosition(self.clientID, handle, -1, self.coppelia.simx_opmode_streaming)
 
 		time.sleep(1)
 
@@ -178,23 +187,23 @@ class COPPELIA_WarehouseRobot(object):
 	# The COPPELIA Simulator can also be stopped manually by pressing the Stop Button in COPPELIA.
 	def StopSimulator(self):
 		print('Attempting to Stop the Simulator')
-		if coppelia.simxStopSimulation(self.clientID, coppelia.simx_opmode_oneshot_wait) != 0:
+		if self.coppelia.simxStopSimulation(self.clientID, self.coppelia.simx_opmode_oneshot_wait) != 0:
 			print('Could not stop the simulator. You can stop the simulator manually by pressing the Stop button in COPPELIA.')
 		else:
 			print('Successfully stoped the COPPELIA Simulator.')
 
 		# Stop streaming modes to each object
-		coppelia.simxGetObjectPosition(self.clientID, self.robotHandle, -1, coppelia.simx_opmode_discontinue)
-		coppelia.simxGetObjectOrientation(self.clientID, self.robotHandle, -1, coppelia.simx_opmode_discontinue)
-		coppelia.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, coppelia.simx_opmode_discontinue)
-		coppelia.simxGetObjectPosition(self.clientID, self.packingBayHandle, -1, coppelia.simx_opmode_discontinue)
-		coppelia.simxReadProximitySensor(self.clientID,self.proximityHandle,coppelia.simx_opmode_discontinue)
+		self.coppelia.simxGetObjectPosition(self.clientID, self.robotHandle, -1, self.coppelia.simx_opmode_discontinue)
+		self.coppelia.simxGetObjectOrientation(self.clientID, self.robotHandle, -1, self.coppelia.simx_opmode_discontinue)
+		self.coppelia.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, self.coppelia.simx_opmode_discontinue)
+		self.coppelia.simxGetObjectPosition(self.clientID, self.packingBayHandle, -1, self.coppelia.simx_opmode_discontinue)
+		self.coppelia.simxReadProximitySensor(self.clientID,self.proximityHandle,self.coppelia.simx_opmode_discontinue)
 
 		for handle in self.obstacleHandles:
-			coppelia.simxGetObjectPosition(self.clientID, handle, -1, coppelia.simx_opmode_discontinue)
+			self.coppelia.simxGetObjectPosition(self.clientID, handle, -1, self.coppelia.simx_opmode_discontinue)
 
 		for handle in self.itemHandles.flatten():
-			coppelia.simxGetObjectPosition(self.clientID, handle, -1, coppelia.simx_opmode_discontinue)
+			self.coppelia.simxGetObjectPosition(self.clientID, handle, -1, self.coppelia.simx_opmode_discontinue)
 
 	# Gets the Range and Bearing to All Detected Objects.
 	# returns:
@@ -216,7 +225,10 @@ class COPPELIA_WarehouseRobot(object):
 		if self.cameraPose != None:
 
 			#check which objects are currently in FOV using object detection sensor within COPPELIA sim
-			retCode,objectsDetected,_,_,_ = coppelia.simxCallScriptFunction(self.clientID, 'Robot', coppelia.sim_scripttype_childscript, 'getObjectsInView',[],[],[],bytearray(),coppelia.simx_opmode_oneshot_wait)
+			# (already fetched with the rest of the scene state when batchState is on)
+			objectsDetected = self.objectsInView
+			if objectsDetected is None:
+				retCode,objectsDetected,_,_,_ = self.coppelia.simxCallScriptFunction(self.clientID, 'Robot', self.coppelia.sim_scripttype_childscript, 'getObjectsInView',[],[],[],bytearray(),self.coppelia.simx_opmode_oneshot_wait)
 			if objectsDetected != []:
 
 				# check to see if blue shelves are in field of view
@@ -228,48 +240,40 @@ class COPPELIA_WarehouseRobot(object):
 							if rb[0] < self.robotParameters.maxShelfDetectionDistance:
 								shelfRangeBearing[index] = rb
 
+				# Range, bearing and the FOV/range gates are computed for each kind of object in one numpy batch
+				detected = np.asarray(objectsDetected) == True
+
 				# check to see if item is in field of view
+				# all 6x4x3 bays at once, the boolean mask keeps the shelf, x, y order of the bays
 				if warehouseObjects.items in objects:
-					for shelf in range(6):
-						if shelfRangeBearing[shelf] is None and warehouseObjects.shelves in objects:
-							continue
-						for x,y in [(x,y) for x in range(4) for y in range(3)]:
-							item_type = self.sceneParameters.bayContents[shelf,x,y]
-							if item_type == -1: 
-								continue
-							
-							itemPosition = self.itemPositions[shelf,x,y]
-							#if detected calculate range and bearing from camera pose location
-							if objectsDetected[warehouseObjects.bowl + item_type] == True\
-							and shelfRangeBearing[shelf] is not None\
-							and self.PointInsideArena(itemPosition):
-								_valid, _range, _bearing = self.GetRBInCameraFOV(itemPosition)
-														
-								# check range is not too far away
-								if _range < self.robotParameters.maxItemDetectionDistance \
-									and abs(_bearing) < self.robotParameters.cameraPerspectiveAngle/2:
-									# make itemRangeBearing into empty lists, if currently set to None
-									if itemRangeBearing[item_type] == None:
-										itemRangeBearing[item_type] = []
-									itemRangeBearing[item_type].append([_range, _bearing])
-							
-					
-				# check to see which obstacles are within the field of view
-				if warehouseObjects.obstacles in objects:
-					for index, obstaclePosition in enumerate(self.obstaclePositions):
-						if obstaclePosition != None:
+					itemTypes = self.sceneParameters.bayContents
+					shelfVisible = np.array([rb is not None for rb in shelfRangeBearing])
+					candidates = (itemTypes != -1) & shelfVisible[:,None,None]
+					candidates[candidates] &= detected[warehouseObjects.bowl + itemTypes[candidates]]
+					itemPositions = self.itemPositions[candidates]
+					_valid, _range, _bearing = self.GetRBInCameraFOVArray(itemPositions)
+					# check range is not too far away
+					visible = self.PointsInsideArena(itemPositions) & (_range < self.robotParameters.maxItemDetectionDistance) & _valid
+					for item_type, rb in zip(itemTypes[candidates][visible].tolist(), np.column_stack((_range, _bearing))[visible].tolist()):
+						# make itemRangeBearing into empty lists, if currently set to None
+						if itemRangeBearing[item_type] == None:
+							itemRangeBearing[item_type] = []
+						itemRangeBearing[item_type].append(rb)
 
-							# check to see if the current obstacle is in the FOV and within the field. If so add to detected obstacle range bearing list
-							if objectsDetected[warehouseObjects.obstacle0 + index] == True and self.PointInsideArena(obstaclePosition):
-								_valid, _range, _bearing = self.GetRBInCameraFOV(obstaclePosition)
-								if _valid:
 
-									# make obstaclesRangeBearing into empty lists, if currently set to None
-									if obstaclesRangeBearing == None:
-										obstaclesRangeBearing = []
+				# check to see which obstacles are within the field of view
+				if warehouseObjects.obstacles in objects:
+					indices = [index for index, position in enumerate(self.obstaclePositions) if position != None]
+					if indices:
+						obstaclePositions = np.array([self.obstaclePositions[index] for index in indices], dtype=float)
+						_valid, _range, _bearing = self.GetRBInCameraFOVArray(obstaclePositions)
 
-									if _range <  self.robotParameters.maxObstacleDetectionDistance:
-										obstaclesRangeBearing.append([_range, _bearing])
+						# check to see if the current obstacle is in the FOV and within the field. If so add to detected obstacle range bearing list
+						_valid &= detected[warehouseObjects.obstacle0 + np.array(indices)] & self.PointsInsideArena(obstaclePositions)
+						if _valid.any():
+							# an obstacle in view makes obstaclesRangeBearing a list, even if all of them are too far away
+							inRange = _valid & (_range < self.robotParameters.maxObstacleDetectionDistance)
+							obstaclesRangeBearing = np.column_stack((_range, _bearing))[inRange].tolist()
 
 
 				# check to see if yellow packingBay is in field of view
@@ -287,16 +291,14 @@ class COPPELIA_WarehouseRobot(object):
 
 				# check to see if black row markers are in field of view
 				if warehouseObjects.row_markers in objects:
-					for index, rowMarkerPosition in enumerate(self.rowMarkerPositions):
-						if rowMarkerPosition != None:
-							
-							#if detected calculate range and bearing from camera pose location
-							if objectsDetected[warehouseObjects.row_marker_1 + index] == True:
-								_valid, _range, _bearing = self.GetRBInCameraFOV(rowMarkerPosition)
-								if _valid:
-									# check range is not to far away
-									if _range < self.robotParameters.maxRowMarkerDetectionDistance:
-										rowMarkerRangeBearing[index] = [_range, _bearing]
+					indices = [index for index, position in enumerate(self.rowMarkerPositions) if position != None]
+					if indices:
+						_valid, _range, _bearing = self.GetRBInCameraFOVArray(np.array([self.rowMarkerPositions[index] for index in indices], dtype=float))
+
+						#if detected calculate range and bearing from camera pose location, check range is not to far away
+						_valid &= detected[warehouseObjects.row_marker_1 + np.array(indices)] & (_range < self.robotParameters.maxRowMarkerDetectionDistance)
+						for index, rb in zip(np.array(indices)[_valid].tolist(), np.column_stack((_range, _bearing))[_valid].tolist()):
+							rowMarkerRangeBearing[index] = rb
 
 
 		return itemRangeBearing, packingBayRangeBearing, obstaclesRangeBearing, rowMarkerRangeBearing, shelfRangeBearing
@@ -307,13 +309,30 @@ class COPPELIA_WarehouseRobot(object):
 		if self.cameraHandle == None:
 			None, None
 	
-		res,resolution,image=coppelia.simxGetVisionSensorImage(self.clientID,self.cameraHandle,0,coppelia.simx_opmode_buffer)
+		res,resolution,image=self.coppelia.simxGetVisionSensorImage(self.clientID,self.cameraHandle,0,self.coppelia.simx_opmode_buffer)
 		
-		if res==coppelia.simx_return_ok:
+		if res==self.coppelia.simx_return_ok:
 			return resolution, image    
 		else:
 			return None, None
 			# res=coppelia.simxSetVisionSensorImage(clientID,v1,image,0,coppelia.simx_opmode_oneshot)
+
+	# Gets the camera image as a numpy array for the vision code (OpenCV): uint8, height x width x 3, BGR, top row first.
+	# Uses the numpy variant of the image call (one copy of the buffer) instead of a Python list of signed bytes.
+	# returns:
+	#	None, None - if no image is available yet
+	#	resolution [width, height] and the image
+	def GetCameraFrame(self):
+
+		if self.cameraHandle == None:
+			return None, None
+
+		res,resolution,image=self.coppelia.simxGetVisionSensorImageArray(self.clientID,self.cameraHandle,0,self.coppelia.simx_opmode_buffer)
+
+		if res==self.coppelia.simx_return_ok:
+			return resolution, np.ascontiguousarray(image[::-1, :, ::-1])  # Sensor rows are bottom up and RGB
+		else:
+			return None, None
 	
 	# Gets the Range and Bearing to the wall(s)
 	# returns:
@@ -382,10 +401,10 @@ class COPPELIA_WarehouseRobot(object):
 				rightWheelSpeed = 0
 
 			# set motor speeds
-			errorCode = coppelia.simxSetJointTargetVelocity(self.clientID, self.leftMotorHandle, leftWheelSpeed, coppelia.simx_opmode_oneshot)
-			errorCode = coppelia.simxSetJointTargetVelocity(self.clientID, self.rightMotorHandle, rightWheelSpeed, coppelia.simx_opmode_oneshot) 
-			errorCode2 = coppelia.simxSetJointTargetVelocity(self.clientID, self.leftRearMotorHandle, leftWheelSpeed, coppelia.simx_opmode_oneshot)
-			errorCode2 = coppelia.simxSetJointTargetVelocity(self.clientID, self.rightRearMotorHandle, rightWheelSpeed, coppelia.simx_opmode_oneshot) 
+			errorCode = self.coppelia.simxSetJointTargetVelocity(self.clientID, self.leftMotorHandle, leftWheelSpeed, self.coppelia.simx_opmode_oneshot)
+			errorCode = self.coppelia.simxSetJointTargetVelocity(self.clientID, self.rightMotorHandle, rightWheelSpeed, self.coppelia.simx_opmode_oneshot) 
+			errorCode2 = self.coppelia.simxSetJointTargetVelocity(self.clientID, self.leftRearMotorHandle, leftWheelSpeed, self.coppelia.simx_opmode_oneshot)
+			errorCode2 = self.coppelia.simxSetJointTargetVelocity(self.clientID, self.rightRearMotorHandle, rightWheelSpeed, self.coppelia.simx_opmode_oneshot) 
 			if errorCode != 0:
 				print('Failed to set left and/or right motor speed. Error code %d'%errorCode)
 
@@ -400,7 +419,7 @@ class COPPELIA_WarehouseRobot(object):
 	
 	def Dropitem(self):
 		if self.itemConnectedToRobot:
-				coppelia.simxCallScriptFunction(self.clientID, 'Robot', coppelia.sim_scripttype_childscript, 'RobotReleaseItem',[],[],[],bytearray(),coppelia.simx_opmode_blocking)
+				self.coppelia.simxCallScriptFunction(self.clientID, 'Robot', self.coppelia.sim_scripttype_childscript, 'RobotReleaseItem',[],[],[],bytearray(),self.coppelia.simx_opmode_blocking)
 				self.itemConnectedToRobot = False
 
 	# Use this to force a physical connection between item and rover
@@ -420,7 +439,7 @@ class COPPELIA_WarehouseRobot(object):
 
 			if itemDist != None and itemDist < self.robotParameters.maxCollectDistance and self.itemConnectedToRobot == False and self.GetItemBayHeight(itemPosition) == shelf_height:
 				# make physical connection between item and robot to simulate collector
-				coppelia.simxCallScriptFunction(self.clientID, 'Robot', coppelia.sim_scripttype_childscript, 'JoinRobotAndItem',[handle],[],[],bytearray(),coppelia.simx_opmode_blocking)
+				self.coppelia.simxCallScriptFunction(self.clientID, 'Robot', self.coppelia.sim_scripttype_childscript, 'JoinRobotAndItem',[handle],[],[],bytearray(),self.coppelia.simx_opmode_blocking)
 				self.itemConnectedToRobot = True
 				
 		
@@ -457,7 +476,10 @@ class COPPELIA_WarehouseRobot(object):
 
 
 	def readProximity(self):
-		error_code,objectDetected,detected_point,objectHandle,surfaceNormal= coppelia.simxReadProximitySensor(self.clientID,self.proximityHandle,coppelia.simx_opmode_buffer)
+		if self.proximityPoint is not None:
+			return np.linalg.norm(self.proximityPoint)
+
+		error_code,objectDetected,detected_point,objectHandle,surfaceNormal= self.coppelia.simxReadProximitySensor(self.clientID,self.proximityHandle,self.coppelia.simx_opmode_buffer)
 		if error_code != 0:
 			print(f"Failed to read proximity sensor. Error code {error_code}")
 		return np.linalg.norm(detected_point)
@@ -471,11 +493,11 @@ class COPPELIA_WarehouseRobot(object):
 	def OpenConnectionToCOPPELIA(self, coppelia_server_ip):
 		# Close any open connections to coppelia in case any are still running in the background
 		print('Closing any existing COPPELIA connections.')
-		coppelia.simxFinish(-1)
+		self.coppelia.simxFinish(-1)
 
 		# Attempt to connect to coppelia API server
 		print('Attempting connection to COPPELIA API Server.')
-		self.clientID = coppelia.simxStart(coppelia_server_ip, 19997, True, True, 5000, 5)
+		self.clientID = self.coppelia.simxStart(coppelia_server_ip, 19997, True, True, 5000, 5)
 		if self.clientID != -1:
 			print('Connected to COPPELIA API Server.')
 		else:
@@ -483,10 +505,12 @@ class COPPELIA_WarehouseRobot(object):
 			sys.exit(-1)
 
 		if self.robotParameters.sync:
-			coppelia.simxSynchronous(self.clientID, True)
+			self.coppelia.simxSynchronous(self.clientID, True)
 
+	# Steps the simulator once in synchronous mode (robotParameters.sync). The simulator then runs as fast as the loop
+	# steps it rather than in real time. The next blocking call (getSimState with batchState) returns after the step.
 	def stepSim(self):
-		coppelia.simxSynchronousTrigger(self.clientID)
+		self.coppelia.simxSynchronousTrigger(self.clientID)
 
 	# Get COPPELIA Object Handles
 	def GetCOPPELIAObjectHandles(self):
@@ -546,13 +570,13 @@ class COPPELIA_WarehouseRobot(object):
 
 	# Get COPPELIA Robot Handle
 	def GetRobotHandle(self):
-		errorCode, self.robotHandle = coppelia.simxGetObjectHandle(self.clientID, 'Robot', coppelia.simx_opmode_oneshot_wait)
+		errorCode, self.robotHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'Robot', self.coppelia.simx_opmode_oneshot_wait)
 		return errorCode
 
 
 	# Get COPPELIA Camera Handle
 	def GetCameraHandle(self):
-		errorCode, self.cameraHandle = coppelia.simxGetObjectHandle(self.clientID, 'VisionSensor', coppelia.simx_opmode_oneshot_wait)
+		errorCode, self.cameraHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'VisionSensor', self.coppelia.simx_opmode_oneshot_wait)
 		return errorCode
 
 			
@@ -563,23 +587,23 @@ class COPPELIA_WarehouseRobot(object):
 		errorCode3 = 0
 
 		if self.robotParameters.driveType == 'differential':
-			errorCode1, self.leftMotorHandle = coppelia.simxGetObjectHandle(self.clientID, 'LeftMotor', coppelia.simx_opmode_oneshot_wait)
-			errorCode2, self.rightMotorHandle = coppelia.simxGetObjectHandle(self.clientID, 'RightMotor', coppelia.simx_opmode_oneshot_wait)
-			errorCode3, self.leftRearMotorHandle = coppelia.simxGetObjectHandle(self.clientID, 'LeftRearMotor', coppelia.simx_opmode_oneshot_wait)
-			errorCode4, self.rightRearMotorHandle = coppelia.simxGetObjectHandle(self.clientID, 'RightRearMotor', coppelia.simx_opmode_oneshot_wait)
+			errorCode1, self.leftMotorHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'LeftMotor', self.coppelia.simx_opmode_oneshot_wait)
+			errorCode2, self.rightMotorHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'RightMotor', self.coppelia.simx_opmode_oneshot_wait)
+			errorCode3, self.leftRearMotorHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'LeftRearMotor', self.coppelia.simx_opmode_oneshot_wait)
+			errorCode4, self.rightRearMotorHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'RightRearMotor', self.coppelia.simx_opmode_oneshot_wait)
 		
 		return errorCode1, errorCode2, errorCode3,errorCode4
 
 	# Get COPPELIA PackingBay Handles
 	def GetPackingBayHandle(self):
-		packingBayErrorCode, self.packingBayHandle = coppelia.simxGetObjectHandle(self.clientID, 'Packing_Bay', coppelia.simx_opmode_oneshot_wait)	
+		packingBayErrorCode, self.packingBayHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'Packing_Bay', self.coppelia.simx_opmode_oneshot_wait)	
 		return packingBayErrorCode
 
 	# Get COPPELIA item Template Handles
 	def GetItemTemplateHandles(self):
 		error_codes = []
 		for index,name in enumerate(["BOWL","MUG","BOTTLE","SOCCER_BALL","RUBIKS_CUBE","CEREAL_BOX",]):
-			code,handle = coppelia.simxGetObjectHandle(self.clientID, name, coppelia.simx_opmode_oneshot_wait)
+			code,handle = self.coppelia.simxGetObjectHandle(self.clientID, name, self.coppelia.simx_opmode_oneshot_wait)
 			error_codes.append(code)
 			self.itemTemplateHandles[index] = handle
 			
@@ -587,16 +611,16 @@ class COPPELIA_WarehouseRobot(object):
 
 	# Get COPPELIA Obstacle Handles
 	def GetObstacleHandles(self):
-		obs0ErrorCode, self.obstacleHandles[0] = coppelia.simxGetObjectHandle(self.clientID, 'Obstacle_0', coppelia.simx_opmode_oneshot_wait)
-		obs1ErrorCode, self.obstacleHandles[1] = coppelia.simxGetObjectHandle(self.clientID, 'Obstacle_1', coppelia.simx_opmode_oneshot_wait)
-		obs2ErrorCode, self.obstacleHandles[2] = coppelia.simxGetObjectHandle(self.clientID, 'Obstacle_2', coppelia.simx_opmode_oneshot_wait)
+		obs0ErrorCode, self.obstacleHandles[0] = self.coppelia.simxGetObjectHandle(self.clientID, 'Obstacle_0', self.coppelia.simx_opmode_oneshot_wait)
+		obs1ErrorCode, self.obstacleHandles[1] = self.coppelia.simxGetObjectHandle(self.clientID, 'Obstacle_1', self.coppelia.simx_opmode_oneshot_wait)
+		obs2ErrorCode, self.obstacleHandles[2] = self.coppelia.simxGetObjectHandle(self.clientID, 'Obstacle_2', self.coppelia.simx_opmode_oneshot_wait)
 		return obs0ErrorCode, obs1ErrorCode, obs2ErrorCode
 	
 	# Get COPPELIA Row marker handles
 	def GetRowMarkerHandles(self):
-		rowMarker1ErrorCode, self.rowMarkerHandles[0] = coppelia.simxGetObjectHandle(self.clientID, 'row_marker1', coppelia.simx_opmode_oneshot_wait)
-		rowMarker2ErrorCode, self.rowMarkerHandles[1] = coppelia.simxGetObjectHandle(self.clientID, 'row_marker2', coppelia.simx_opmode_oneshot_wait)
-		rowMarker3ErrorCode, self.rowMarkerHandles[2] = coppelia.simxGetObjectHandle(self.clientID, 'row_marker3', coppelia.simx_opmode_oneshot_wait)
+		rowMarker1ErrorCode, self.rowMarkerHandles[0] = self.coppelia.simxGetObjectHandle(self.clientID, 'row_marker1', self.coppelia.simx_opmode_oneshot_wait)
+		rowMarker2ErrorCode, self.rowMarkerHandles[1] = self.coppelia.simxGetObjectHandle(self.clientID, 'row_marker2', self.coppelia.simx_opmode_oneshot_wait)
+		rowMarker3ErrorCode, self.rowMarkerHandles[2] = self.coppelia.simxGetObjectHandle(self.clientID, 'row_marker3', self.coppelia.simx_opmode_oneshot_wait)
 		return rowMarker1ErrorCode, rowMarker2ErrorCode, rowMarker3ErrorCode
 
 
@@ -604,24 +628,27 @@ class COPPELIA_WarehouseRobot(object):
 	def getShelfHandles(self):
 		errorCodes = [None]*6
 		for i in range(6):
-			errorCodes[i],self.shelfHandles[i] = coppelia.simxGetObjectHandle(self.clientID, f'Shelf{i}', coppelia.simx_opmode_oneshot_wait)
+			errorCodes[i],self.shelfHandles[i] = self.coppelia.simxGetObjectHandle(self.clientID, f'Shelf{i}', self.coppelia.simx_opmode_oneshot_wait)
 		return tuple(errorCodes)
 
 	# Get COPPELIA proximity sensor handle.
 	def getProximityhandle(self):
-		error_code,self.proximityHandle = coppelia.simxGetObjectHandle(self.clientID, 'Proximity_sensor', coppelia.simx_opmode_oneshot_wait)
+		error_code,self.proximityHandle = self.coppelia.simxGetObjectHandle(self.clientID, 'Proximity_sensor', self.coppelia.simx_opmode_oneshot_wait)
 		return error_code
 
 
 	def GetShelfRangeBearing(self):
-		ec,rets,data,_,_ = coppelia.simxCallScriptFunction(
-			self.clientID,
-			'Robot',
-			coppelia.sim_scripttype_childscript,
-			'getDistanceToObject',
-			self.shelfHandles,[self.robotParameters.maxShelfDetectionDistance]*len(self.shelfHandles),[],bytearray(),
-			coppelia.simx_opmode_oneshot_wait
-		)
+		if self.shelfDistances is not None:
+			ec,rets,data = 0,*self.shelfDistances
+		else:
+			ec,rets,data,_,_ = self.coppelia.simxCallScriptFunction(
+				self.clientID,
+				'Robot',
+				self.coppelia.sim_scripttype_childscript,
+				'getDistanceToObject',
+				self.shelfHandles,[self.robotParameters.maxShelfDetectionDistance]*len(self.shelfHandles),[],bytearray(),
+				self.coppelia.simx_opmode_oneshot_wait
+			)
 		
 		rb = [None]*6
 		if ec == 0:
@@ -655,8 +682,8 @@ class COPPELIA_WarehouseRobot(object):
 		for shelf in range(6):
 			for x in range(4):
 				for y in range(3):
-					errorCode, bayHandles[shelf,x,y] = coppelia.simxGetObjectHandle(self.clientID,f"/Shelf{shelf}/Bay{x}{y}",coppelia.simx_opmode_oneshot_wait)
-					coppelia.simxGetObjectPosition(self.clientID,bayHandles[shelf,x,y],-1,coppelia.simx_opmode_streaming)
+					errorCode, bayHandles[shelf,x,y] = self.coppelia.simxGetObjectHandle(self.clientID,f"/Shelf{shelf}/Bay{x}{y}",self.coppelia.simx_opmode_oneshot_wait)
+					self.coppelia.simxGetObjectPosition(self.clientID,bayHandles[shelf,x,y],-1,self.coppelia.simx_opmode_streaming)
 		
 		if np.sum(self.sceneParameters.bayContents >= 0) == 0:
 			print("\033[93mWarning: Bay contents has not been initialised to contain any "+\
@@ -673,25 +700,25 @@ class COPPELIA_WarehouseRobot(object):
 						if itemType == -1:
 							continue
 						itemHandle = self.itemTemplateHandles[itemType]
-						errorCode2,position = coppelia.simxGetObjectPosition(self.clientID,bayHandles[shelf,x,y],-1,coppelia.simx_opmode_buffer)
-						errorCode, clonedHandles = coppelia.simxCopyPasteObjects(
+						errorCode2,position = self.coppelia.simxGetObjectPosition(self.clientID,bayHandles[shelf,x,y],-1,self.coppelia.simx_opmode_buffer)
+						errorCode, clonedHandles = self.coppelia.simxCopyPasteObjects(
 							self.clientID,
 							[itemHandle],
-							coppelia.simx_opmode_oneshot_wait
+							self.coppelia.simx_opmode_oneshot_wait
 						)
-						coppelia.simxSetObjectPosition(self.clientID,clonedHandles[0],-1,position,coppelia.simx_opmode_oneshot)
+						self.coppelia.simxSetObjectPosition(self.clientID,clonedHandles[0],-1,position,self.coppelia.simx_opmode_oneshot)
 						self.itemHandles[shelf,x,y] = clonedHandles[0]
-						coppelia.simxGetObjectHandle(self.clientID,f"/Shelf{shelf}/Bay{x}{y}",coppelia.simx_opmode_discontinue)
-						coppelia.simxGetObjectPosition(self.clientID,bayHandles[shelf,x,y],-1,coppelia.simx_opmode_discontinue)
+						self.coppelia.simxGetObjectHandle(self.clientID,f"/Shelf{shelf}/Bay{x}{y}",self.coppelia.simx_opmode_discontinue)
+						self.coppelia.simxGetObjectPosition(self.clientID,bayHandles[shelf,x,y],-1,self.coppelia.simx_opmode_discontinue)
 
 		obstacleHeight = 0.15
 		for index, obstaclePosition in enumerate([self.sceneParameters.obstacle0_StartingPosition, self.sceneParameters.obstacle1_StartingPosition, self.sceneParameters.obstacle2_StartingPosition]):
 			if obstaclePosition != -1:
 				if obstaclePosition != None:
 					coppeliaStartingPosition = [obstaclePosition[0], obstaclePosition[1], obstacleHeight/2]
-					coppelia.simxSetObjectPosition(self.clientID, self.obstacleHandles[index], -1, coppeliaStartingPosition, coppelia.simx_opmode_oneshot_wait)
+					self.coppelia.simxSetObjectPosition(self.clientID, self.obstacleHandles[index], -1, coppeliaStartingPosition, self.coppelia.simx_opmode_oneshot_wait)
 				else:
-					coppelia.simxSetObjectPosition(self.clientID, self.obstacleHandles[index], -1, [2,  -0.3 + (-0.175*index), 0.8125], coppelia.simx_opmode_oneshot_wait)
+					self.coppelia.simxSetObjectPosition(self.clientID, self.obstacleHandles[index], -1, [2,  -0.3 + (-0.175*index), 0.8125], self.coppelia.simx_opmode_oneshot_wait)
 		
 		
 
@@ -719,8 +746,8 @@ class COPPELIA_WarehouseRobot(object):
 		pitch = pitch + math.pi/2.0
 
 		# set camera pose
-		coppelia.simxSetObjectPosition(self.clientID, self.cameraHandle, coppelia.sim_handle_parent, [x,0,z], coppelia.simx_opmode_oneshot_wait)
-		coppelia.simxSetObjectOrientation(self.clientID, self.cameraHandle, coppelia.sim_handle_parent, [0,pitch,math.pi/2.0], coppelia.simx_opmode_oneshot_wait)
+		self.coppelia.simxSetObjectPosition(self.clientID, self.cameraHandle, self.coppelia.sim_handle_parent, [x,0,z], self.coppelia.simx_opmode_oneshot_wait)
+		self.coppelia.simxSetObjectOrientation(self.clientID, self.cameraHandle, self.coppelia.sim_handle_parent, [0,pitch,math.pi/2.0], self.coppelia.simx_opmode_oneshot_wait)
 
 	
 	# Sets the camera's height relative to the floor in metres
@@ -760,8 +787,8 @@ class COPPELIA_WarehouseRobot(object):
 		self.robotParameters.cameraOrientation = orientation
 
 		# set resolution of camera (vision sensor object) - resolution parameters are int32 parameters
-		coppelia.simxSetObjectIntParameter(self.clientID, self.cameraHandle, coppelia.sim_visionintparam_resolution_x, x_res, coppelia.simx_opmode_oneshot_wait)
-		coppelia.simxSetObjectIntParameter(self.clientID, self.cameraHandle, coppelia.sim_visionintparam_resolution_y, y_res, coppelia.simx_opmode_oneshot_wait)
+		self.coppelia.simxSetObjectIntParameter(self.clientID, self.cameraHandle, self.coppelia.sim_visionintparam_resolution_x, x_res, self.coppelia.simx_opmode_oneshot_wait)
+		self.coppelia.simxSetObjectIntParameter(self.clientID, self.cameraHandle, self.coppelia.sim_visionintparam_resolution_y, y_res, self.coppelia.simx_opmode_oneshot_wait)
 		
 
 	####################################
@@ -798,15 +825,26 @@ class COPPELIA_WarehouseRobot(object):
 		# self.itemPositions = [None]*len(self.itemHandles)
 		self.packingBayPosition = None
 		self.obstaclePositions = [None, None, None]
+		self.objectsInView = None
+		self.shelfDistances = None
+		self.proximityPoint = None
+
+		# One script call for the whole scene, instead of a call per object plus the detection calls
+		if self.robotParameters.batchState:
+			errorCode = self.GetSimState()
+			if errorCode == 0:
+				return
+			print('Failed to get the scene state with getSimState (error code %d), add getSimState.lua to the Robot child script. Reading objects one by one instead.'%(errorCode))
+			self.robotParameters.batchState = False
 
 		# GET 2D ROBOT POSE
-		errorCode, robotPosition = coppelia.simxGetObjectPosition(self.clientID, self.robotHandle, -1, coppelia.simx_opmode_buffer)
-		errorCode, robotOrientation = coppelia.simxGetObjectOrientation(self.clientID, self.robotHandle, -1, coppelia.simx_opmode_buffer)
+		errorCode, robotPosition = self.coppelia.simxGetObjectPosition(self.clientID, self.robotHandle, -1, self.coppelia.simx_opmode_buffer)
+		errorCode, robotOrientation = self.coppelia.simxGetObjectOrientation(self.clientID, self.robotHandle, -1, self.coppelia.simx_opmode_buffer)
 		if errorCode == 0:
 			self.robotPose = [robotPosition[0], robotPosition[1], robotPosition[1], robotOrientation[0], robotOrientation[1], robotOrientation[2]]
 
 		# GET 3D CAMERA POSE
-		errorCode, cameraPosition = coppelia.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, coppelia.simx_opmode_buffer)
+		errorCode, cameraPosition = self.coppelia.simxGetObjectPosition(self.clientID, self.cameraHandle, -1, self.coppelia.simx_opmode_buffer)
 		if errorCode == 0:
 			self.cameraPose = [cameraPosition[0], cameraPosition[1], cameraPosition[2], robotOrientation[0], robotOrientation[1], robotOrientation[2]]
 		
@@ -814,12 +852,12 @@ class COPPELIA_WarehouseRobot(object):
 		# GET POSITION OF EACH OBJECT
 		for shelf,x,y in [(s,x,y) for s in range(6) for x in range(4) for y in range(3)]:
 			handle = self.itemHandles[shelf,x,y]
-			errorCode, itemPosition = coppelia.simxGetObjectPosition(self.clientID, handle, -1, coppelia.simx_opmode_buffer)
+			errorCode, itemPosition = self.coppelia.simxGetObjectPosition(self.clientID, handle, -1, self.coppelia.simx_opmode_buffer)
 			if errorCode == 0:
 				self.itemPositions[shelf,x,y] = itemPosition
 
 		# packingBay position
-		errorCode, packingBayPosition = coppelia.simxGetObjectPosition(self.clientID, self.packingBayHandle, -1, coppelia.simx_opmode_buffer)
+		errorCode, packingBayPosition = self.coppelia.simxGetObjectPosition(self.clientID, self.packingBayHandle, -1, self.coppelia.simx_opmode_buffer)
 		if errorCode == 0:
 			self.packingBayPosition = packingBayPosition
 
@@ -827,17 +865,60 @@ class COPPELIA_WarehouseRobot(object):
 		# obstacle positions
 		obstaclePositions = [None, None, None]
 		for index, obs in enumerate(self.obstaclePositions):
-			errorCode, obstaclePositions[index] = coppelia.simxGetObjectPosition(self.clientID, self.obstacleHandles[index], -1, coppelia.simx_opmode_buffer)
+			errorCode, obstaclePositions[index] = self.coppelia.simxGetObjectPosition(self.clientID, self.obstacleHandles[index], -1, self.coppelia.simx_opmode_buffer)
 			if errorCode == 0:
 				self.obstaclePositions[index] = obstaclePositions[index]
 
 		# row marker positions
 		rowMarkerPositions = [None,None,None]
 		for index, rowMarker in enumerate(self.rowMarkerPositions):
-			errorCode,rowMarkerPositions[index] = coppelia.simxGetObjectPosition(self.clientID,self.rowMarkerHandles[index],-1,coppelia.simx_opmode_buffer)
+			errorCode,rowMarkerPositions[index] = self.coppelia.simxGetObjectPosition(self.clientID,self.rowMarkerHandles[index],-1,self.coppelia.simx_opmode_buffer)
 			if errorCode == 0:
 				self.rowMarkerPositions[index] = rowMarkerPositions[index]
 
+	# Gets the state of the scene in a single script call (getSimState in getSimState.lua, in the Robot child script):
+	# robot and camera pose, the positions of the packing bay, obstacles, row markers and items, the objects in view,
+	# the shelf distances and the proximity sensor. Stores them like GetObjectPositions and keeps the objects in view,
+	# shelf distances and proximity point for GetDetectedObjects, GetShelfRangeBearing and readProximity.
+	# returns:
+	#	errorCode - 0 if the state was updated
+	def GetSimState(self):
+		filledBays = self.sceneParameters.bayContents != -1
+		objectHandles = [self.robotHandle, self.cameraHandle, self.packingBayHandle] + self.obstacleHandles + self.rowMarkerHandles + self.itemHandles[filledBays].tolist()
+		errorCode,ints,floats,_,_ = self.coppelia.simxCallScriptFunction(
+			self.clientID,
+			'Robot',
+			self.coppelia.sim_scripttype_childscript,
+			'getSimState',
+			[self.robotHandle, self.proximityHandle, len(self.shelfHandles)] + self.shelfHandles + objectHandles,
+			[self.robotParameters.maxShelfDetectionDistance],[],bytearray(),
+			self.coppelia.simx_opmode_oneshot_wait
+		)
+		if errorCode != 0:
+			return errorCode
+
+		# ints: proximity detected, shelf results, objects in view
+		# floats: robot orientation, proximity point, object positions (x,y,z each), shelf distance data
+		shelfCount = len(self.shelfHandles)
+		robotOrientation = floats[0:3]
+		positions = np.array(floats[6:6+3*len(objectHandles)]).reshape(-1,3)
+		positionList = [None if np.isnan(position).any() else position.tolist() for position in positions[:9]]
+
+		robotPosition, cameraPosition = positionList[0:2]
+		if robotPosition is not None:
+			self.robotPose = [robotPosition[0], robotPosition[1], robotPosition[1], robotOrientation[0], robotOrientation[1], robotOrientation[2]]
+		if cameraPosition is not None:
+			self.cameraPose = [cameraPosition[0], cameraPosition[1], cameraPosition[2], robotOrientation[0], robotOrientation[1], robotOrientation[2]]
+		self.packingBayPosition = positionList[2]
+		self.obstaclePositions = positionList[3:6]
+		self.rowMarkerPositions = [position if position is not None else previous for position, previous in zip(positionList[6:9], self.rowMarkerPositions)]
+		self.itemPositions[filledBays] = positions[9:]
+
+		self.proximityPoint = floats[3:6] if ints[0] else [0, 0, 0]
+		self.shelfDistances = (ints[1:1+shelfCount], floats[6+3*len(objectHandles):])
+		self.objectsInView = ints[1+shelfCount:]
+		return errorCode
+
 	# Checks to see if an Object is within the field of view of the camera
 	def GetRBInCameraFOV(self, objectPosition):
 		# calculate range and bearing on 2D plane - relative to the camera
@@ -867,6 +948,18 @@ class COPPELIA_WarehouseRobot(object):
 		# return True to indicate is in FOV and range and bearing
 		return _valid, _range, _bearing
 
+	# Batch version of GetRBInCameraFOV for an (N,2) or (N,3) array of positions
+	# returns:
+	#	arrays of N elements: valid (within the camera's horizontal FOV), range and bearing
+	def GetRBInCameraFOVArray(self, objectPositions):
+		objectPositions = np.asarray(objectPositions, dtype=float).reshape(-1, np.shape(objectPositions)[-1])
+		dx = objectPositions[:,0] - self.cameraPose[0]
+		dy = objectPositions[:,1] - self.cameraPose[1]
+		_range = np.sqrt(dx**2 + dy**2)
+		_bearing = self.WrapToPi(np.arctan2(dy, dx) - self.cameraPose[5])
+		_valid = np.abs(_bearing) < self.robotParameters.cameraPerspectiveAngle/2
+		return _valid, _range, _bearing
+
 	def ObjectInCameraFOV(self,objectPosition):
 		_,_bearing = self.GetRBInCameraFOV(objectPosition)
 		return np.abs(_bearing) <= self.robotParameters.cameraPerspectiveAngle / 2
@@ -879,6 +972,11 @@ class COPPELIA_WarehouseRobot(object):
 
 		return False
 
+	# Batch version of PointInsideArena for an (N,2) or (N,3) array of positions, NaN positions are outside
+	def PointsInsideArena(self, positions):
+		positions = np.asarray(positions, dtype=float)
+		return (positions[:,0] > -1) & (positions[:,0] < 1) & (positions[:,1] > -1) & (positions[:,1] < 1)
+
 
 	# Update the item
 	def UpdateItem(self):
@@ -900,7 +998,7 @@ class COPPELIA_WarehouseRobot(object):
 					# random chance to disconnect
 					if np.random.rand() > self.robotParameters.collectorQuality:
 						# terminate connection between item and robot to simulate collector
-						coppelia.simxCallScriptFunction(self.clientID, 'Robot', coppelia.sim_scripttype_childscript, 'RobotReleaseItem',[],[],[],bytearray(),coppelia.simx_opmode_blocking)
+						self.coppelia.simxCallScriptFunction(self.clientID, 'Robot', self.coppelia.sim_scripttype_childscript, 'RobotReleaseItem',[],[],[],bytearray(),self.coppelia.simx_opmode_blocking)
 						self.itemConnectedToRobot = False
 
 				elif itemDist != None and itemDist > 0.03:
@@ -1167,4 +1265,5 @@ class RobotParameters(object):
 		self.maxCollectDistance = 0.03 #specificies the operating distance of the automatic collector function. Item needs to be less than this distance to the collector
 
 		self.sync = False
+		self.batchState = True # get the scene state with one script call per update (needs getSimState.lua in the Robot child script, falls back to one call per object)
 
@@ -0,0 +1,127 @@
+import time
+import logging
+from dataclasses import dataclass
+
+"""
+Non-blocking timed action sequences for the actuators.
+
+A state queues a list of Steps instead of chaining time.sleep calls. The main loop
+calls tick() once per frame: the action of the current step runs when the step
+starts, and the sequence moves on when the step's time is up, so vision keeps
+processing frames while the lift, gripper or LEDs are moving.
+
+A step can also finish early on feedback instead of waiting out its worst-case
+duration:
+- event: finishes when notify(event) is called after the step started (e.g. the
+  Pico reporting the lift has reached its level).
+- until: finishes as soon as the callable returns True on a tick.
+min_duration keeps a step going for at least that long even if feedback comes first.
+
+StateMachine.run_state_machine ticks its sequencer before the state logic and
+holds the state logic while a sequence is running, so the order of commands is
+the same as with the sleeps. A state that queues a sequence can switch to its next
+state straight away; that state runs once the sequence has finished.
+
+Steps advance on frame ticks, so a step can run up to one frame longer than its
+duration (~0.05-0.1 s at the current frame rates).
+"""
+
+logger = logging.getLogger(__name__)
+
+# Feedback events (sent with ActionSequencer.notify)
+LIFT_DONE = 'lift_done'
+GRIP_DONE = 'grip_done'
+SEGMENT_DONE = 'segment_done'  # The Pico finished the queued motion segments
+
+
+@dataclass
+class Step:
+    action: object = None  # Callable run once when the step starts (None for a plain wait)
+    duration: float = 0.0  # s, the step finishes after this long at the latest
+    event: str = None  # Finish early when this event is notified
+    until: object = None  # Finish early when this callable returns True
+    min_duration: float = 0.0  # s, never finish before this
+    name: str = None  # For the log
+
+
+class ActionSequencer:
+    def __init__(self, clock=time.monotonic):
+        """
+        Args:
+        - clock: Time source in seconds (replaceable for offline runs).
+        """
+        self.clock = clock
+        self.steps = []
+        self.index = 0
+        self.step_start = None
+        self.label = None
+        self._events = set()  # Events notified since the current step started
+
+    @property
+    def busy(self):
+        return self.index < len(self.steps)
+
+    def start(self, steps, label=None):
+        """
+        Replace any running sequence with a new one. The first step's action runs at
+        the next tick.
+
+        Args:
+        - steps: List of Step.
+        - label: Name for the log.
+        """
+        if self.busy:
+            logger.warning(f"Sequence {self.label} cancelled at step {self.index} by {label}")
+        self.steps = list(steps)
+        self.index = 0
+        self.step_start = None
+        self.label = label
+        self._events.clear()
+        logger.info(f"Sequence {label} started ({len(self.steps)} steps)")
+
+    def cancel(self):
+        self.steps = []
+        self.index = 0
+        self.step_start = None
+
+    def notify(self, event):
+        """
+        Report a feedback event, completing the current step if it waits for it.
+        """
+        self._events.add(event)
+
+    def _finished(self, step, elapsed):
+        if elapsed >= step.duration:
+            return True
+        if elapsed < step.min_duration:
+            return False
+        if step.event is not None and step.event in self._events:
+            return True
+        return step.until is not None and step.until()
+
+    def tick(self):
+        """
+        Advance the sequence. Steps that finish immediately (no duration) run in the
+        same tick, up to the first step that has to wait.
+
+        Returns:
+        - True while the sequence is still running.
+        """
+        while self.busy:
+            step = self.steps[self.index]
+            now = self.clock()
+            if self.step_start is None:
+                self.step_start = now
+                self._events.clear()
+                if step.action is not None:
+                    step.action()
+            elapsed = now - self.step_start
+            if not self._finished(step, elapsed):
+                return True
+            if step.name:
+                logger.debug(f"Sequence {self.label}: {step.name} done after {elapsed:.2f} s")
+            self.index += 1
+            self.step_start = None
+            if not self.busy:
+                logger.info(f"Sequence {self.label} finished")
+        return False
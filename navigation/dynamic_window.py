@@ -0,0 +1,299 @@
+import numpy as np
+import logging
+
+from i2c.wheel_model import MAX_DUTY, MAX_WHEEL_SPEED, WHEEL_BASE
+
+"""
+Dynamic window local planner for the differential drive.
+
+Every control tick a grid of (v, w) commands reachable from the current command
+within one tick is forward-simulated as circular arcs, all at once with numpy
+broadcasting. Arcs that hit an obstacle or shelf point are discarded and the rest
+are scored on how long they stay collision free, clearance, heading to the goal
+and progress towards the goal. The best command is
+converted to signed left/right duty cycles (StateMachine.drive_wheels), or sent
+as is when the Pico runs the speed loop (StateMachine.velocity_control).
+
+Opt in with StateMachine.local_planner = DynamicWindowPlanner(). For offline runs,
+MockDrive can stand in for StateMachine.i2c and integrates the commands into a pose.
+
+Robot frame: x forward, y to the left, w positive turning left (counter-clockwise).
+Vision bearings are positive to the right, so a target at (range, bearing) sits at
+(range * cos(bearing), -range * sin(bearing)).
+"""
+
+logger = logging.getLogger(__name__)
+
+# Robot model (tune on the robot), wheel constants in i2c/wheel_model.py
+ROBOT_RADIUS = 0.09 #m
+MIN_DUTY = 67 # 0-255 like MAX_DUTY, the slowest straight move of the states (MIN_SPEED - 20); the motors stall below it
+MAX_LINEAR_VEL = 0.20 #m/s
+MAX_ANGULAR_VEL = 1.5 #rad/s
+MAX_LINEAR_ACC = 0.5 #m/s^2
+MAX_ANGULAR_ACC = 4.0 #rad/s^2
+
+# Search and scoring
+CONTROL_DT = 0.1 #s, one control tick
+HORIZON = 2.5 #s, length of the simulated arcs
+SIM_STEPS = 15
+LINEAR_SAMPLES = 9
+ANGULAR_SAMPLES = 21
+HEADING_WEIGHT = 0.1
+FREE_TIME_WEIGHT = 1.0
+CLEARANCE_WEIGHT = 0.2
+PROGRESS_WEIGHT = 1.0
+MAX_CLEARANCE = 0.1 #m, clearance beyond this scores the same
+SAFETY_MARGIN = 0.02 #m, poses closer than this to an obstacle count as a collision
+SHELF_POINT_SPACING = 0.05 #m, shelf edges are filled in with points this far apart
+
+
+def range_bearing_to_points(range_bearing):
+    """
+    Convert Vision [bearing (deg), range (m)] pairs to robot frame points.
+
+    Args:
+    - range_bearing: Iterable of [bearing, range], e.g. Vision.objectRB[4].
+
+    Returns:
+    - Array of shape (n, 2).
+    """
+    data = np.asarray([rb for rb in range_bearing if rb[1] is not None], dtype=float).reshape(-1, 2)
+    bearing = np.deg2rad(data[:, 0])
+    return np.stack([data[:, 1] * np.cos(bearing), -data[:, 1] * np.sin(bearing)], axis=1)
+
+
+def shelves_to_points(shelves, spacing=SHELF_POINT_SPACING):
+    """
+    Convert Vision shelves (Vision.objectRB[2]) to robot frame points along their bottom edge.
+
+    Args:
+    - shelves: List of shelves, each a list of [corner_type, range, bearing, pixel] corners.
+    - spacing: Distance between the points filled in between two corners (m).
+
+    Returns:
+    - Array of shape (n, 2).
+    """
+    point_sets = [np.empty((0, 2))]
+    for shelf in shelves:
+        corners = range_bearing_to_points([[corner[2], corner[1]] for corner in shelf])
+        if len(corners) < 2:
+            point_sets.append(corners)
+            continue
+        # Bottom-left to bottom-right corner, so the robot cannot plan through the shelf
+        count = max(2, int(np.ceil(np.linalg.norm(corners[-1] - corners[0]) / spacing)) + 1)
+        point_sets.append(np.linspace(corners[0], corners[-1], count))
+    return np.concatenate(point_sets)
+
+
+def profile_to_points(range_profile, camera_fov=70):
+    """
+    Convert a free space profile (Vision.objectRB[6], one range per degree) to robot frame points.
+    """
+    ranges = np.asarray(range_profile, dtype=float)
+    bearings = np.arange(ranges.size) - camera_fov // 2
+    occupied = np.isfinite(ranges)
+    return range_bearing_to_points(np.stack([bearings[occupied], ranges[occupied]], axis=1))
+
+
+class DynamicWindowPlanner:
+    def __init__(self, dt=CONTROL_DT, horizon=HORIZON, sim_steps=SIM_STEPS,
+                 linear_samples=LINEAR_SAMPLES, angular_samples=ANGULAR_SAMPLES):
+        """
+        Initialize the planner.
+
+        Args:
+        - dt: Control tick (s); the dynamic window is what the robot can reach in one tick.
+        - horizon: Length of each simulated arc (s).
+        - sim_steps: Number of poses checked along each arc.
+        - linear_samples, angular_samples: Size of the (v, w) grid.
+        """
+        self.dt = dt
+        self.linear_samples = linear_samples
+        self.angular_samples = angular_samples
+        self.times = np.linspace(horizon / sim_steps, horizon, sim_steps)
+        self.v = 0.0 # Last commanded linear velocity
+        self.w = 0.0 # Last commanded angular velocity
+
+    def reset(self):
+        self.v = 0.0
+        self.w = 0.0
+
+    def _window(self):
+        """
+        Grid of (v, w) commands reachable within one tick. v is never negative, but the
+        wheels may turn in opposite directions so the robot can rotate on the spot.
+        """
+        v = np.linspace(max(0.0, self.v - MAX_LINEAR_ACC * self.dt),
+                        min(MAX_LINEAR_VEL, self.v + MAX_LINEAR_ACC * self.dt), self.linear_samples)
+        w = np.linspace(max(-MAX_ANGULAR_VEL, self.w - MAX_ANGULAR_ACC * self.dt),
+                        min(MAX_ANGULAR_VEL, self.w + MAX_ANGULAR_ACC * self.dt), self.angular_samples)
+        v, w = np.meshgrid(v, w, indexing='ij')
+        return v.ravel(), w.ravel()
+
+    def rollout(self, v, w):
+        """
+        Poses along the arcs of every (v, w) command.
+
+        Returns:
+        - x, y, theta: Arrays of shape (n_commands, sim_steps).
+        """
+        v = v[:, None]
+        w = w[:, None]
+        theta = w * self.times
+        straight = np.abs(w) < 1e-6
+        safe_w = np.where(straight, 1.0, w)
+        x = np.where(straight, v * self.times, v / safe_w * np.sin(theta))
+        y = np.where(straight, 0.0, v / safe_w * (1 - np.cos(theta)))
+        return x, y, theta
+
+    def plan(self, goal_point, obstacle_points=None):
+        """
+        Choose the best (v, w) command.
+
+        Args:
+        - goal_point: Goal (x, y) in the robot frame.
+        - obstacle_points: Array of obstacle and shelf points (n, 2) in the robot frame.
+
+        Returns:
+        - (v, w) of the best command, or (0, 0) if every arc collides.
+        """
+        v, w = self._window()
+        x, y, theta = self.rollout(v, w)
+
+        # Distance from every pose along each arc to the closest obstacle point
+        if obstacle_points is not None and len(obstacle_points):
+            points = np.asarray(obstacle_points, dtype=float)
+            dx = x[:, :, None] - points[None, None, :, 0]
+            dy = y[:, :, None] - points[None, None, :, 1]
+            distance = np.sqrt(np.min(dx * dx + dy * dy, axis=2)) - ROBOT_RADIUS
+        else:
+            distance = np.full(x.shape, np.inf)
+
+        # Time until the first pose that touches an obstacle (the full horizon if none does)
+        collides = distance <= SAFETY_MARGIN
+        first_hit = np.where(collides.any(axis=1), collides.argmax(axis=1), len(self.times))
+        free_time = np.concatenate([[0.0], self.times])[first_hit]
+        clearance = distance.min(axis=1)
+
+        # Admissible if the robot can still brake within the free part of the arc
+        admissible = v <= np.sqrt(2 * MAX_LINEAR_ACC * v * free_time)
+        if not admissible.any():
+            logger.debug("Dynamic window: every arc collides, stopping")
+            self.reset()
+            return 0.0, 0.0
+
+        # Heading: angle between the final pose and the direction to the goal
+        goal_angle = np.arctan2(goal_point[1] - y[:, -1], goal_point[0] - x[:, -1])
+        heading_error = np.abs(np.arctan2(np.sin(goal_angle - theta[:, -1]), np.cos(goal_angle - theta[:, -1])))
+
+        # Progress: how much closer to the goal the arc ends, relative to the longest possible arc
+        goal_distance = np.hypot(goal_point[0] - x[:, -1], goal_point[1] - y[:, -1])
+        progress = (np.hypot(goal_point[0], goal_point[1]) - goal_distance) / (MAX_LINEAR_VEL * self.times[-1])
+
+        score = (HEADING_WEIGHT * (1 - heading_error / np.pi)
+                 + FREE_TIME_WEIGHT * free_time / self.times[-1]
+                 + CLEARANCE_WEIGHT * np.clip(clearance, 0, MAX_CLEARANCE) / MAX_CLEARANCE
+                 + PROGRESS_WEIGHT * progress)
+        score[~admissible] = -np.inf
+
+        best = int(np.argmax(score))
+        self.v, self.w = float(v[best]), float(w[best])
+        return self.v, self.w
+
+    def plan_velocity(self, goal_position, obstacles=None, range_profile=None, shelves=None):
+        """
+        Plan from Vision data and return the (v, w) command, for the Pico's velocity mode.
+
+        Args:
+        - goal_position: Dictionary with 'range' (m) and 'bearing' (deg).
+        - obstacles: Vision obstacles, [bearing, range] pairs.
+        - range_profile: Optional free space profile (Vision.objectRB[6]).
+        - shelves: Optional Vision shelves (Vision.objectRB[2]) to keep clear of.
+
+        Returns:
+        - v, w: Linear (m/s) and angular (rad/s, positive left) velocity.
+        """
+        goal_range = goal_position.get('range', 1.0)
+        goal_point = range_bearing_to_points([[goal_position['bearing'], goal_range]])[0]
+
+        point_sets = []
+        if obstacles:
+            point_sets.append(range_bearing_to_points(obstacles))
+        if range_profile is not None:
+            point_sets.append(profile_to_points(range_profile))
+        if shelves:
+            point_sets.append(shelves_to_points(shelves))
+        obstacle_points = np.concatenate(point_sets) if point_sets else None
+
+        return self.plan(goal_point, obstacle_points)
+
+    def plan_speeds(self, goal_position, obstacles=None, range_profile=None, shelves=None):
+        """
+        Plan from Vision data and return signed duty cycles (negative is backwards).
+
+        Args: as plan_velocity.
+
+        Returns:
+        - left_motor_speed, right_motor_speed: Signed duty cycles.
+        """
+        return self.to_duty(*self.plan_velocity(goal_position, obstacles, range_profile, shelves))
+
+    @staticmethod
+    def to_duty(v, w):
+        """
+        Convert (v, w) to signed left/right duty cycles.
+        """
+        left = v - w * WHEEL_BASE / 2
+        right = v + w * WHEEL_BASE / 2
+        duty = np.array([left, right]) / MAX_WHEEL_SPEED * MAX_DUTY
+        # Wheels that should turn get at least the stall duty
+        duty = np.sign(duty) * np.where(np.abs(duty) > 1e-9, np.clip(np.abs(duty), MIN_DUTY, MAX_DUTY), 0)
+        return float(duty[0]), float(duty[1])
+
+    @staticmethod
+    def from_duty(left_duty, right_duty):
+        """
+        Convert signed left/right duty cycles to (v, w), the inverse of to_duty without the stall floor.
+        """
+        left = left_duty / MAX_DUTY * MAX_WHEEL_SPEED
+        right = right_duty / MAX_DUTY * MAX_WHEEL_SPEED
+        return (left + right) / 2, (right - left) / WHEEL_BASE
+
+
+class MockDrive:
+    """
+    Stand-in for the I2C motor interface that integrates commanded duty cycles into a pose,
+    so the planner and the state machine can be exercised offline.
+    """
+    def __init__(self, x=0.0, y=0.0, theta=0.0):
+        self.pose = np.array([x, y, theta], dtype=float)
+        self.duty = {1: 0.0, 2: 0.0}
+
+    def DCWrite(self, motor, direction, speed):
+        if direction == 'S':
+            speed = 0
+        sign = -1 if direction == '1' else 1
+        self.duty[motor] = sign * float(speed)
+
+    def DC_motors(self, left, right):
+        self.duty[1] = float(left)
+        self.duty[2] = float(right)
+
+    def drive(self, forwards, rotational):
+        # Velocity mode: the Pico's speed loop holds the wheel speeds, modelled as exact here
+        left = forwards - rotational * WHEEL_BASE / 2
+        right = forwards + rotational * WHEEL_BASE / 2
+        self.duty[1] = left / MAX_WHEEL_SPEED * MAX_DUTY
+        self.duty[2] = right / MAX_WHEEL_SPEED * MAX_DUTY
+
+    def step(self, dt):
+        """
+        Advance the pose by dt seconds at the current wheel speeds.
+        """
+        left = self.duty[1] / MAX_DUTY * MAX_WHEEL_SPEED
+        right = self.duty[2] / MAX_DUTY * MAX_WHEEL_SPEED
+        v = (left + right) / 2
+        w = (right - left) / WHEEL_BASE
+        x, y, theta = self.pose
+        self.pose = np.array([x + v * np.cos(theta) * dt, y + v * np.sin(theta) * dt, theta + w * dt])
+        return self.pose
@@ -0,0 +1,67 @@
+import logging
+import multiprocessing
+import queue
+
+"""
+Out-of-band plotting of the potential fields.
+
+The control loop only pushes nav_state dictionaries into a bounded queue; a separate
+process owns matplotlib and redraws at its own pace. When the plot falls behind,
+old states are dropped instead of blocking the planner.
+"""
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('attractive_field', 'repulsive_field', 'residual_field')
+
+
+def _plot_loop(states):
+    import matplotlib.pyplot as plt  # Only the plotting process needs matplotlib
+
+    plt.ion()  # Turn on interactive mode
+    while True:
+        nav_state = states.get()
+        if nav_state is None:
+            break
+
+        plt.clf()  # Clear the current figure
+        for name in FIELDS:
+            plt.plot(nav_state[name], label=name.replace('_', ' ').title())
+        plt.legend()
+        plt.pause(0.01)  # Pause briefly to allow the plot to update
+    plt.close('all')
+
+
+class FieldVisualiser:
+    def __init__(self, max_pending=2):
+        """
+        Args:
+        - max_pending: Number of states buffered before new ones are dropped.
+        """
+        self.states = multiprocessing.Queue(maxsize=max_pending)
+        self.process = None
+
+    def start(self):
+        if self.process is None:
+            self.process = multiprocessing.Process(target=_plot_loop, args=(self.states,), daemon=True)
+            self.process.start()
+            logger.info("Field visualiser started")
+
+    def publish(self, nav_state):
+        """
+        Queue a nav_state for plotting without blocking the caller.
+        """
+        self.start()
+        try:
+            self.states.put_nowait({name: nav_state[name] for name in FIELDS})
+        except queue.Full:
+            pass  # Plot is behind, drop this state
+
+    def stop(self):
+        if self.process is not None:
+            try:
+                self.states.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self.process.join(timeout=1)
+            self.process = None
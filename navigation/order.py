@@ -0,0 +1,78 @@
+import csv
+import logging
+from dataclasses import dataclass, asdict
+from Vision.Detection.item_catalog import load_catalog
+
+"""
+Order data model.
+
+Order_*.csv files are read with the csv module into OrderItem records, with the row
+and the pickup parameters (from the item catalog, Vision/Detection/item_catalog.csv)
+worked out once at load time. pandas is only needed for offline analysis through
+to_dataframe().
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def item_row(shelf):
+    """
+    Row (aisle) number of a shelf; shelves 2r-2 and 2r-1 face row r.
+    """
+    return shelf // 2 + 1
+
+
+@dataclass(frozen=True)
+class OrderItem:
+    item_number: int
+    shelf: int
+    bay: int
+    height: int
+    name: str  # Catalog name (aliases such as Wheetbots are resolved)
+    row: int
+    width: float = None  # Real item width (m), None if the item is unknown
+    pickup_distance: float = None  # Distance to stop from the shelf (m), None if unknown
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Build an item from one csv record (column names as in the Order_*.csv files).
+        """
+        shelf = int(record['Shelf'])
+        height = int(record['Height'])
+        catalog = load_catalog()
+        name = catalog.canonical_name(record['Item Name'])
+        spec = catalog.get(name)
+        if spec is None:
+            logger.warning(f"Unknown item '{name}', no width or pickup distance")
+        return cls(
+            item_number=int(record['Item Number']),
+            shelf=shelf,
+            bay=int(record['Bay']),
+            height=height,
+            name=name,
+            row=item_row(shelf),
+            width=spec.width if spec else None,
+            pickup_distance=spec.pickup_distance(height) if spec else None,
+        )
+
+
+def load_order(path):
+    """
+    Read an Order_*.csv file.
+
+    Returns:
+    - List of OrderItem in file order.
+    """
+    with open(path, mode="r", encoding='utf-8-sig', newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        return [OrderItem.from_record({key.strip(): value for key, value in record.items()}) for record in reader]
+
+
+def to_dataframe(items):
+    """
+    pandas DataFrame of the items, for offline analysis (pandas is imported on demand).
+    """
+    import pandas as pd
+
+    return pd.DataFrame([asdict(item) for item in items])
@@ -0,0 +1,206 @@
+import glob
+import itertools
+import math
+import sys
+from navigation.order import load_order
+
+"""
+Pick sequence optimiser for the Order_*.csv files.
+
+Travel cost is the estimated driving distance (m) in the arena. Every trip starts
+and ends at the packing station and visits up to items_per_trip items:
+
+    packing station -> row entry -> bay -> (row entry -> next row entry -> bay ...) -> row entry -> packing station
+
+The arena layout below is taken from the distances the state machine already uses
+(row_position_L, goal_bay_position) and should be updated if the arena changes.
+
+Orders of up to EXACT_LIMIT items are solved exactly with dynamic programming over
+subsets; larger orders use a nearest-neighbour heuristic.
+
+Batch mode:
+    python -m navigation.order_optimiser [--items-per-trip N] [navigation/Order_*.csv ...]
+"""
+
+# Arena layout (m). x runs across the rows, y runs down a row from its row marker.
+ROW_X = {1: 0.38, 2: 1.1, 3: 1.55}  # Row centre lines (StateMachine.row_position_L)
+ROW_ENTRY_Y = 1.0  # Distance from the row marker to the row entry
+BAY_Y = [0.8, 0.58, 0.32, 0.18]  # Distance from the row marker to each bay (StateMachine.goal_bay_position)
+PACKING_STATION = (0.2, 1.7)  # Drop-off point in front of the ramp
+
+EXACT_LIMIT = 8
+ITEMS_PER_TRIP = 1  # The gripper holds one item
+
+
+def _distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+class OrderOptimiser:
+    def __init__(self, items_per_trip=ITEMS_PER_TRIP, exact_limit=EXACT_LIMIT, packing_station=PACKING_STATION):
+        """
+        Args:
+        - items_per_trip: Number of items carried per trip.
+        - exact_limit: Largest order solved exactly.
+        - packing_station: (x, y) of the drop-off point.
+        """
+        self.items_per_trip = items_per_trip
+        self.exact_limit = exact_limit
+        self.packing_station = packing_station
+
+    # ------------------------------------------------------------------
+    # Travel costs
+    def _entry(self, item):
+        return (ROW_X[item.row], ROW_ENTRY_Y)
+
+    def _bay(self, item):
+        return (ROW_X[item.row], BAY_Y[item.bay])
+
+    def leg_cost(self, a, b):
+        """
+        Driving distance between two bays. Within a row the robot drives along the row,
+        otherwise it leaves through the row entry and enters the next row.
+        """
+        if a.row == b.row:
+            return abs(BAY_Y[a.bay] - BAY_Y[b.bay])
+        return (_distance(self._bay(a), self._entry(a)) + _distance(self._entry(a), self._entry(b))
+                + _distance(self._entry(b), self._bay(b)))
+
+    def station_cost(self, item):
+        """
+        Driving distance between the packing station and a bay.
+        """
+        return _distance(self.packing_station, self._entry(item)) + _distance(self._entry(item), self._bay(item))
+
+    def trip_cost(self, items, sequence):
+        """
+        Cost of one trip visiting the items in sequence and returning to the packing station.
+        """
+        cost = self.station_cost(items[sequence[0]]) + self.station_cost(items[sequence[-1]])
+        for a, b in zip(sequence, sequence[1:]):
+            cost += self.leg_cost(items[a], items[b])
+        return cost
+
+    def plan_cost(self, items, trips):
+        return sum(self.trip_cost(items, trip) for trip in trips)
+
+    # ------------------------------------------------------------------
+    # Solvers
+    def _best_trip(self, items, subset):
+        """
+        Cheapest visiting order of a small set of items (brute force, subset size <= items_per_trip).
+        """
+        best = None
+        for sequence in itertools.permutations(subset):
+            cost = self.trip_cost(items, sequence)
+            if best is None or cost < best[0] - 1e-9:
+                best = (cost, list(sequence))
+        return best
+
+    def _solve_exact(self, items):
+        """
+        DP over subsets of collected items: best[mask] is the cheapest way to collect mask in
+        whole trips. Each step adds one trip that contains the lowest uncollected item, so
+        every partition into trips is considered once.
+        """
+        n = len(items)
+        full = (1 << n) - 1
+        best = {0: (0.0, [])}
+        trip_cache = {}
+
+        for mask in range(full + 1):
+            if mask not in best:
+                continue
+            cost, trips = best[mask]
+            remaining = [i for i in range(n) if not mask & (1 << i)]
+            if not remaining:
+                continue
+            first, others = remaining[0], remaining[1:]
+            for extra in range(min(self.items_per_trip, len(remaining))):
+                for rest in itertools.combinations(others, extra):
+                    subset = (first,) + rest
+                    if subset not in trip_cache:
+                        trip_cache[subset] = self._best_trip(items, subset)
+                    trip_cost, sequence = trip_cache[subset]
+                    new_mask = mask | sum(1 << i for i in subset)
+                    new_cost = cost + trip_cost
+                    if new_mask not in best or new_cost < best[new_mask][0] - 1e-9:
+                        best[new_mask] = (new_cost, trips + [sequence])
+
+        return best[full][1]
+
+    def _solve_heuristic(self, items):
+        """
+        Nearest neighbour: start each trip at the item closest to the packing station and
+        keep adding the closest remaining item until the trip is full.
+        """
+        remaining = list(range(len(items)))
+        trips = []
+        while remaining:
+            current = min(remaining, key=lambda i: self.station_cost(items[i]))
+            trip = [current]
+            remaining.remove(current)
+            while remaining and len(trip) < self.items_per_trip:
+                current = min(remaining, key=lambda i: self.leg_cost(items[trip[-1]], items[i]))
+                trip.append(current)
+                remaining.remove(current)
+            trips.append(trip)
+        return trips
+
+    def optimise(self, items):
+        """
+        Solve the pick sequence for an order.
+
+        Args:
+        - items: List of OrderItem (see navigation/order.py).
+
+        Returns:
+        - Dictionary with 'trips' (lists of item indices), 'sequence' (flattened pick order),
+          'cost' (estimated travel in m) and 'file_order_cost' (travel in file order).
+        """
+        if not items:
+            return {'trips': [], 'sequence': [], 'cost': 0.0, 'file_order_cost': 0.0}
+
+        if len(items) <= self.exact_limit:
+            trips = self._solve_exact(items)
+        else:
+            trips = self._solve_heuristic(items)
+        # Total travel does not depend on the order of the trips, so do the shortest
+        # trips first: if the run is cut short, the most items have been delivered
+        trips.sort(key=lambda trip: self.trip_cost(items, trip))
+
+        file_order = list(range(len(items)))
+        file_trips = [file_order[i:i + self.items_per_trip] for i in range(0, len(items), self.items_per_trip)]
+        return {
+            'trips': trips,
+            'sequence': [index for trip in trips for index in trip],
+            'cost': self.plan_cost(items, trips),
+            'file_order_cost': self.plan_cost(items, file_trips),
+        }
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    items_per_trip = ITEMS_PER_TRIP
+    if '--items-per-trip' in argv:
+        index = argv.index('--items-per-trip')
+        items_per_trip = int(argv[index + 1])
+        del argv[index:index + 2]
+    paths = argv or sorted(glob.glob("navigation/Order_*.csv"))
+
+    optimiser = OrderOptimiser(items_per_trip=items_per_trip)
+    total_file = total_optimised = 0.0
+    for path in paths:
+        items = load_order(path)
+        plan = optimiser.optimise(items)
+        total_file += plan['file_order_cost']
+        total_optimised += plan['cost']
+        names = [f"{items[i].name}(S{items[i].shelf}B{items[i].bay})" for i in plan['sequence']]
+        print(f"{path}: {len(items)} items, file order {plan['file_order_cost']:.2f} m, "
+              f"optimised {plan['cost']:.2f} m")
+        print(f"    trips: {plan['trips']}  ->  {', '.join(names)}")
+    print(f"Total: file order {total_file:.2f} m, optimised {total_optimised:.2f} m (items per trip: {items_per_trip})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import numpy as np
+import logging
+
+"""
+Vectorized potential field planner.
+
+Used by path_planning.calculate_goal_velocities. The attractive field for every
+integer goal bearing is precomputed once, the repulsive field for all obstacles
+is one broadcasted numpy operation, and many candidate goals can be evaluated in
+a single call.
+
+Field layout: CAMERA_FOV + 1 bins, bin i is bearing i - CAMERA_FOV//2 degrees.
+"""
+
+logger = logging.getLogger(__name__)
+
+MIN_ROBOT_VEL = 50 # duty cycle
+MAX_ROBOT_VEL = 70 # duty cycle
+CAMERA_FOV = 70
+WORKER_WIDTH_SCALE = 0.15 #m
+GOAL_GAIN = 0.75 # heading error -> duty cycle
+REPULSIVE_RANGE = 0.8 #m, obstacles further away are ignored
+
+
+class PotentialFieldPlanner:
+    def __init__(self, camera_fov=CAMERA_FOV, worker_width=WORKER_WIDTH_SCALE, goal_gain=GOAL_GAIN,
+                 min_vel=MIN_ROBOT_VEL, max_vel=MAX_ROBOT_VEL, visualiser=None):
+        """
+        Initialize the planner and precompute the attractive field kernels.
+
+        Args:
+        - camera_fov: Camera field of view in degrees.
+        - worker_width: Obstacle half-width used to spread the repulsive field (m).
+        - goal_gain: Gain from heading error (deg) to duty cycle.
+        - min_vel: Base duty cycle.
+        - max_vel: Maximum duty cycle.
+        - visualiser: Optional FieldVisualiser that receives every planned nav_state.
+        """
+        self.camera_fov = camera_fov
+        self.half_fov = camera_fov // 2
+        self.worker_width = worker_width
+        self.goal_gain = goal_gain
+        self.min_vel = min_vel
+        self.max_vel = max_vel
+        self.visualiser = visualiser
+
+        # Goals at or beyond these bearings produce an all-zero field (every index is clipped)
+        self.min_goal = -2 * self.half_fov
+        self.max_goal = camera_fov - 1
+        self.attractive_kernels = np.stack([self._attractive_kernel(goal) for goal in range(self.min_goal, self.max_goal + 1)])
+        self.columns = np.arange(camera_fov)
+
+    def _attractive_kernel(self, goal_deg):
+        """
+        Attractive field for one integer goal bearing (same construction as path_planning).
+        """
+        angles = np.arange(-self.half_fov, self.half_fov + 1)
+        field_indices = np.clip(goal_deg + self.half_fov + angles, 0, self.camera_fov - 1)
+        gradient = 1 / 30 # gradient of the field
+        attractive_field = np.maximum(1 - gradient * np.abs(angles), 0)
+        field = np.zeros(self.camera_fov + 1)
+        field[field_indices] = attractive_field
+        return field
+
+    def attractive_field(self, goal_deg):
+        """
+        Attractive field(s) for one goal bearing or an array of goal bearings (deg).
+
+        Returns:
+        - Array of shape (camera_fov + 1,) or (n_goals, camera_fov + 1).
+        """
+        goal_deg = np.asarray(goal_deg, dtype=float)
+        goal_index = np.clip(np.floor(goal_deg), self.min_goal, self.max_goal).astype(int) - self.min_goal
+        return self.attractive_kernels[goal_index]
+
+    def repulsive_field(self, obstacles):
+        """
+        Repulsive field for a list of (range, bearing) obstacles, bearing in radians.
+        """
+        if obstacles is None or len(obstacles) == 0:
+            return np.zeros(self.camera_fov + 1)
+
+        obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 2)
+        obs_range, obs_bearing = obstacles[:, 0], obstacles[:, 1]
+        obs_deg = np.clip(np.rad2deg(obs_bearing) + self.camera_fov / 2, 0, self.camera_fov).astype(int)
+        return self._repulsive_from_bins(obs_deg, obs_range)
+
+    def repulsive_field_from_profile(self, range_profile):
+        """
+        Repulsive field for a free space profile (one range per degree bin, np.inf if free).
+        """
+        ranges = np.asarray(range_profile, dtype=float)
+        return self._repulsive_from_bins(np.arange(ranges.size), ranges)
+
+    def _repulsive_from_bins(self, obs_deg, obs_range):
+        """
+        Broadcasted repulsive field: every obstacle contributes a linear fall-off around
+        its bin and the strongest contribution per bin is kept.
+
+        As in the original loop implementation the spread only reaches the first camera_fov
+        bins, and the last bin is only set by an obstacle directly in it.
+        """
+        repulsive_field = np.zeros(self.camera_fov + 1)
+
+        near = (obs_range < REPULSIVE_RANGE) & (obs_range > 0)
+        if not near.any():
+            return repulsive_field
+        obs_deg = obs_deg[near]
+        obs_range = obs_range[near]
+
+        # Width of the obstacle in degrees and its effect on the field
+        obs_width_deg = np.rad2deg(2 * np.arctan(self.worker_width / obs_range)).astype(int)
+        obs_effect = np.maximum(0, 1 - np.minimum(1, obs_range - self.worker_width * 2))
+
+        offsets = np.abs(self.columns[None, :] - obs_deg[:, None])
+        # An obstacle in the last bin is clipped onto the bin before it at full effect
+        offsets[obs_deg == self.camera_fov, -1] = 0
+        effects = obs_effect[:, None] * np.maximum(0, 1 - offsets / obs_width_deg[:, None])
+        repulsive_field[:self.camera_fov] = effects.max(axis=0)
+        np.maximum.at(repulsive_field, obs_deg, obs_effect)
+        return repulsive_field
+
+    def evaluate(self, goal_degs, obstacles=None, range_profile=None):
+        """
+        Evaluate many candidate goals against the same obstacles.
+
+        Args:
+        - goal_degs: Array of goal bearings (deg).
+        - obstacles: List of (range, bearing) obstacles, bearing in radians.
+        - range_profile: Optional free space profile from Vision (objectRB[6]).
+
+        Returns:
+        - heading_angles: Heading (deg) chosen for every goal.
+        - left_speeds, right_speeds: Duty cycles for every goal.
+        """
+        attractive = np.atleast_2d(self.attractive_field(goal_degs))
+        repulsive = self.repulsive_field(obstacles)
+        if range_profile is not None:
+            repulsive = np.maximum(repulsive, self.repulsive_field_from_profile(range_profile))
+
+        residual = np.maximum(attractive - repulsive, 0)
+        heading_angles = np.argmax(residual, axis=1) - self.half_fov
+        left_speeds, right_speeds = self.heading_to_speeds(heading_angles)
+        return heading_angles, left_speeds, right_speeds
+
+    def heading_to_speeds(self, heading_angles):
+        """
+        Proportional mapping from heading error (deg) to left/right duty cycles.
+        """
+        control_signal = np.asarray(heading_angles) * self.goal_gain
+        left_speeds = np.clip(self.min_vel + control_signal, 0, self.max_vel)
+        right_speeds = np.clip(self.min_vel - control_signal, 0, self.max_vel)
+        return left_speeds, right_speeds
+
+    def plan(self, goal_deg, obstacles=None, range_profile=None):
+        """
+        Plan for a single goal bearing.
+
+        Returns:
+        - left_motor_speed, right_motor_speed: Duty cycles.
+        - nav_state: Dictionary with the attractive, repulsive and residual fields and the heading.
+        """
+        nav_state = {}
+        nav_state['attractive_field'] = self.attractive_field(goal_deg)
+        nav_state['repulsive_field'] = self.repulsive_field(obstacles)
+        if range_profile is not None:
+            nav_state['repulsive_field'] = np.maximum(nav_state['repulsive_field'], self.repulsive_field_from_profile(range_profile))
+        nav_state['residual_field'] = np.maximum(nav_state['attractive_field'] - nav_state['repulsive_field'], 0)
+
+        heading_angle = int(np.argmax(nav_state['residual_field'])) - self.half_fov
+        nav_state['heading'] = heading_angle
+        left_motor_speed, right_motor_speed = self.heading_to_speeds(heading_angle)
+        logger.debug(f"Heading: {heading_angle}, Speeds: {left_motor_speed:.1f}, {right_motor_speed:.1f}")
+
+        if self.visualiser is not None:
+            self.visualiser.publish(nav_state)
+
+        return float(left_motor_speed), float(right_motor_speed), nav_state
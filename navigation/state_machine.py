@@ -1,10 +1,15 @@
 import numpy as np
-import pandas as pd
 from enum import Enum
 import time 
 import logging
 import navigation.path_planning as navigation
 from i2c.main_i2c import I2C
+from i2c.telemetry import TelemetryPoller, Odometry
+from navigation.order import load_order
+from Vision.Detection.item_catalog import load_catalog
+from navigation.order_optimiser import OrderOptimiser
+from navigation.action_sequencer import ActionSequencer, Step, LIFT_DONE, GRIP_DONE, SEGMENT_DONE
+from navigation.dynamic_window import DynamicWindowPlanner
 
 # define the numbers
 # 0b000000 = [Packing bay, Rowmarkers, Shelves, Items,  Obstacles, Wallpoints]
@@ -27,21 +32,13 @@ from i2c.main_i2c import I2C
 # 	])
 
 PACKING_BAY = 0b100000
-ROW_MARKERS = 0b010001
+ROW_MARKERS = 0b010000
 SHELVES =     0b001000
 ITEMS =       0b000100
 OBSTACLES =   0b000010
 WALLPOINTS =  0b000001
-# Configure the logger
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("state_machine.log", mode='w')
-    ]
-)
-#logging.getLogger('pandas').setLevel(logging.WARNING)  # Only show warnings and errors for picamera2
+FREE_SPACE = 0b1000000  # Range per degree to the nearest shelf or obstacle (Vision.objectRB[6])
+# Handlers (including state_machine.log) are configured by the entry point (startup.configure_logging)
 logger = logging.getLogger(__name__)
 
 
@@ -51,6 +48,13 @@ RIGHT = 1
 ON = 1
 OFF = 0
 MIN_SPEED = 87
+# Open loop rotate: duty taken off the wheel driving backwards and the one driving forwards
+ROTATE_REVERSE_OFFSET = 10
+ROTATE_FORWARD_OFFSET = 25
+ROTATE_MEAN_OFFSET = (ROTATE_REVERSE_OFFSET + ROTATE_FORWARD_OFFSET) / 2  # Velocity mode turns at the mean
+SETPOINT_REPEAT = 0.25  # s, velocity mode: resend the setpoint within the Pico's 500 ms timeout
+SEGMENT_TIME_FACTOR = 1.5  # Motion segments stop by distance, with this much of the nominal time as the limit
+SEGMENT_MARGIN = 0.3  # s, extra wait for the segment acknowledgement before moving on anyway
 
 
 class StateMachine():
@@ -68,16 +72,20 @@ class StateMachine():
         found_ps (bool): Flag indicating if the packing station is found.
         at_ps (bool): Flag indicating if at the packing station.
         action (list): List of actions.
-        final_df (dict): Final DataFrame for item order.
+        final_df (list): OrderItem list in pick order.
         goal_position (dict): Goal position for the robot.
         current_item (int): Index of the current item.
         draw (bool): Flag for drawing.
         holding_item (bool): Flag indicating if holding an item.
-        i2c (I2C): I2C communication object.
+        i2c (I2C): I2C communication object (injectable, e.g. with the Pico emulator in i2c/emulator.py).
+        sequencer (ActionSequencer): Timed actuator steps, advanced once per tick.
+        telemetry (TelemetryPoller): Status frames read back from the Pico (started by the entry point).
+        odometry (Odometry): Pose integrated from the encoder counts in the telemetry.
         vision (object): Vision system object.
         robot_state (str): Current state of the robot.
+        clock, sleep (callable): Time source and sleep used by the states (time.perf_counter, time.sleep).
     Methods:
-        __init__(): Initializes the StateMachine with default values and reads the object order file.
+        __init__(i2c=None, order_path): Initializes the StateMachine with default values and reads the object order file.
         set_vision(vision): Sets the vision system object.
         item_to_size(item_type): Returns the size of the given item type.
         item_pickup_distance(item_type, height): Returns the pickup distance for the given item type and height.
@@ -106,7 +114,7 @@ class StateMachine():
 
     # INITIALIZATION
     #===========================================================================
-    def __init__(self):
+    def __init__(self, i2c=None, order_path="navigation/Order_4.csv"):
         self.goal_bay_position = [0.8, 0.58, 0.32, 0.18] # bay positions in the row
         self.row_position_L = [0.38, 1.1, 1.55] # Entry positions for left shelf
         self.row_position_R = [1.55, 1.1, 0.40] # Entry positions for Right shelf
@@ -120,21 +128,36 @@ class StateMachine():
         self.found_ps = False
         self.at_ps = False
         self.action = []
-        self.final_df = {}
+        self.final_df = []
         self.goal_position = {}
         self.current_item = 0
         self.draw = False
-        self.i2c = I2C()
+        self.i2c = i2c if i2c is not None else I2C()
         self.vision = None
+        self.local_planner = None  # Optional DynamicWindowPlanner, replaces the potential field when set
+        # Time source and sleep of the state logic, replaced by simulators that run on
+        # virtual time (navigation/warehouse_sim.py)
+        self.clock = time.perf_counter
+        self.sleep = time.sleep
+        self.last_command_time = None  # self.clock() of the last motor command
+        # True when PICO/egb320 is flashed: motor commands become (v, w) setpoints for the
+        # Pico's wheel speed loop (I2C.drive) instead of raw duty cycles
+        self.velocity_control = False
+        self.velocity_setpoint = (0.0, 0.0)  # Last (v, w) sent in velocity mode
+        self.setpoint_time = None  # self.clock() when it was sent
+        self.segment_id = 0  # Id of the last motion segment sent to the Pico (1-255, wraps)
+        self.sequencer = ActionSequencer()  # Lift/gripper/LED choreography without blocking the main loop
+        self.request = 0  # Objects requested from vision by the last tick
+        self.telemetry = TelemetryPoller(self.i2c)
+        self.odometry = Odometry()
+        self.lift_target = None  # Last commanded lift level, matched against the telemetry
+        self.grip_target = None  # Last commanded gripper state (0 open, 1 closed)
         self.holding_item = False
 
-        # Read the object order file
-        with open("navigation/Order_4.csv", mode="r", encoding='utf-8-sig') as csv_file:
-            # Load the CSV into a DataFrame, automatically using the first row as column names
-            df = pd.read_csv(csv_file)
+        # Read the object order file (OrderItem list, Row and pickup distance precomputed)
+        order = load_order(order_path)
 
         # Group by 'Height' and find the minimum 'Shelf' for each height
-        df['Row'] = df['Shelf'] // 2 + 1
         # min_shelf_by_height = df.loc[df.groupby('Height')['Shelf'].idxmin()]
 
         # Ensure the first item is from Row 3 with the highest Bay number
@@ -148,9 +171,14 @@ class StateMachine():
         # self.final_df = pd.concat([sorted_min_shelf, sorted_remaining_rows])
 
         # Redefine the index
-        self.final_df = df
+        # self.final_df = df
         # self.final_df = self.final_df.reset_index(drop=True)
 
+        # Follow the optimised pick sequence (see navigation/order_optimiser.py)
+        self.order_plan = OrderOptimiser().optimise(order)
+        self.final_df = [order[i] for i in self.order_plan['sequence']]
+        logger.info(f"Order plan: {self.order_plan['trips']}, estimated travel {self.order_plan['cost']:.2f} m")
+
 		# final_df for Order_1.csv
 		# 	 Item Number  Shelf  Bay  Height Item Name  Row
 		# 0            2      2    0       1    Bottle    1+1
@@ -174,7 +202,8 @@ class StateMachine():
 		
         # Display the result
         print("Optimised pickup order:")
-        print(self.final_df)
+        for order_item in self.final_df:
+            print(order_item)
         logger.debug(f"Final: {self.final_df}")
         
 
@@ -187,40 +216,34 @@ class StateMachine():
     # HELPER FUNCTIONS
     #===========================================================================
     def item_to_size(self, item_type):
-        if item_type == "Bottle":
-            size = 0.02 
-        elif item_type == "Ball":
-            size = 0.045
-        elif item_type == "Cube":
-            size = 0.037
-        elif item_type == "Bowl":
-            size = 0.055
-        elif item_type == "Mug":
-            size = 0.05
-        elif item_type == "Weetbots":
-            size = 0.065
-        return size
+        return load_catalog()[item_type].width
     
     def item_pickup_distance(self, item_type, height):
-        Weetbots = [0.17, 0.2, 0.19]
-        Bottle = [0.17, 0.19, 0.18]
-        Bowls = [0.18, 0.2, 0.2]
-        Ball = [0.18, 0.19, 0.19]
-        Cube = [0.15, 0.17, 0.17]
-        Mug = [0.17, 0.21, 0.26]
-        if item_type == "Bottle":
-            distance = Bottle[height]
-        elif item_type == "Ball":
-            distance = Ball[height]
-        elif item_type == "Cube":
-            distance = Cube[height]
-        elif item_type == "Bowl":
-            distance = Bowls[height]
-        elif item_type == "Mug":
-            distance = Mug[height]
-        elif item_type == "Weetbots":
-            distance = Weetbots[height]
-        return distance
+        return load_catalog()[item_type].pickup_distance(height)
+
+    def set_lift(self, level):
+        self.lift_target = level
+        self.i2c.lift(level)
+
+    def set_grip(self, state):
+        self.grip_target = state
+        self.i2c.grip(state)
+
+    def update_feedback(self):
+        """
+        Publish the latest Pico telemetry: lift/gripper completion ends the waiting
+        sequencer step early, and the encoder counts update the odometry.
+        """
+        telemetry = self.telemetry.fresh()
+        if telemetry is None:
+            return
+        self.odometry.update(telemetry)
+        if telemetry.lift_reached and telemetry.lift_level == self.lift_target:
+            self.sequencer.notify(LIFT_DONE)
+        if telemetry.gripper_done and self.grip_target is not None and telemetry.gripper_closed == bool(self.grip_target):
+            self.sequencer.notify(GRIP_DONE)
+        if telemetry.segments_pending == 0 and telemetry.segment_done_id == self.segment_id:
+            self.sequencer.notify(SEGMENT_DONE)
 
     #===========================================================================
     # STATE MACHINE
@@ -258,11 +281,12 @@ class StateMachine():
 
         # Set the target item position
         
-        self.target_shelf = self.final_df['Shelf'][self.current_item]
-        self.target_row = self.final_df['Row'][self.current_item]
-        self.target_bay = self.final_df['Bay'][self.current_item]
-        self.target_height = self.final_df['Height'][self.current_item]
-        self.target_item= self.final_df['Item Name'][self.current_item]
+        order_item = self.final_df[self.current_item]
+        self.target_shelf = order_item.shelf
+        self.target_row = order_item.row
+        self.target_bay = order_item.bay
+        self.target_height = order_item.height
+        self.target_item= order_item.name
 
         # Mockup values
         # self.target_shelf = 0
@@ -274,28 +298,26 @@ class StateMachine():
         print("Collecting the ", self.current_item + 1, "item : ", self.target_item)
         if self.vision:
             logger.debug(f"Updating item: {self.target_item}")
-            self.vision.update_item(item_width=self.item_to_size(self.target_item))
+            self.vision.update_item(order_item.name)
             logger.info("Vision set, item width updated")
         else:
             print("Vision not set")
             logger.warning("Vision not set==================")
-        self.pickup_distance = self.item_pickup_distance(self.target_item, self.target_height)
+        self.pickup_distance = order_item.pickup_distance
         # Set the subtarget shelf (Opposite side of the target shelf)
         if self.target_shelf % 2 == 1:  # Odd
             self.subtarget_shelf = self.target_shelf - 1
         else:  # Even
             self.subtarget_shelf = self.target_shelf + 1
 
-        # Reset the actuators
-        self.i2c.led(1,ON)
-        time.sleep(0.05)
-        self.i2c.led(2,OFF)
-        time.sleep(0.05)
-        self.i2c.led(3,OFF)
-        time.sleep(0.05)
-        self.stop()
-        time.sleep(0.05)
-        self.i2c.grip(0) # Gripper Open
+        # Reset the actuators (SEARCH_FOR_PS starts once the sequence is done)
+        self.sequencer.start([
+            Step(lambda: self.i2c.led(1,ON), 0.05),
+            Step(lambda: self.i2c.led(2,OFF), 0.05),
+            Step(lambda: self.i2c.led(3,OFF), 0.05),
+            Step(self.stop, 0.05),
+            Step(lambda: self.set_grip(0)), # Gripper Open
+        ], label='reset actuators')
 
     def search_for_ps(self, packStationRangeBearing, rowMarkerRangeBearing):
         """
@@ -364,11 +386,11 @@ class StateMachine():
 
         
 
-    def move_to_ps_marker(self, rowMarkerRangeBearing, obstaclesRB):
+    def move_to_ps_marker(self, rowMarkerRangeBearing, obstaclesRB, range_profile=None):
         if not rowMarkerRangeBearing:
             self.robot_state = 'SEARCH_FOR_PS'
             self.stop()
-            time.sleep(1)
+            self.sleep(1)
             self.found_ps = False
         else:
             print("PS RB: ", rowMarkerRangeBearing[0])
@@ -377,23 +399,24 @@ class StateMachine():
             print(self.goal_position)
 
             # Calculate goal velocities
-            self.LeftmotorSpeed, self.RightmotorSpeed = navigation.calculate_goal_velocities(self.goal_position, obstaclesRB)
+            self.LeftmotorSpeed, self.RightmotorSpeed = navigation.calculate_goal_velocities(self.goal_position, obstaclesRB, range_profile=range_profile)
             if self.holding_item:
                 self.LeftmotorSpeed = self.LeftmotorSpeed
                 self.RightmotorSpeed = self.RightmotorSpeed
                 self.move(0, self.LeftmotorSpeed + 15, self.RightmotorSpeed + 15)
                 if self.goal_position['range'] - 0.26 < 0.01:
                 # if self.goal_position['range'] - self.ps_return_distance[0] < 0.01:
-                    self.stop()
-                    time.sleep(0.1)
-                    self.i2c.grip(0)
-                    time.sleep(1)
+                    # Release the item, EXIT_PS starts once the gripper has opened
+                    self.sequencer.start([
+                        Step(self.stop, 0.1),
+                        Step(lambda: self.set_grip(0), 1, event=GRIP_DONE, name='release'),
+                    ], label='drop item')
                     self.holding_item = False
                     self.current_item += 1
                     self.robot_state = 'EXIT_PS'
 
 
-    def move_to_ps(self, packStationRangeBearing, obstaclesRB, rowMarkerRangeBearing): # Using Ramp to determine the distance
+    def move_to_ps(self, packStationRangeBearing, obstaclesRB, rowMarkerRangeBearing, range_profile=None): # Using Ramp to determine the distance
 
         if rowMarkerRangeBearing and self.holding_item:
             if rowMarkerRangeBearing[0] == 0:
@@ -413,7 +436,7 @@ class StateMachine():
             print(self.goal_position)
 
             # Calculate goal velocities
-            self.LeftmotorSpeed, self.RightmotorSpeed = navigation.calculate_goal_velocities(self.goal_position, obstaclesRB)
+            self.LeftmotorSpeed, self.RightmotorSpeed = navigation.calculate_goal_velocities(self.goal_position, obstaclesRB, range_profile=range_profile)
             if self.holding_item:
                 #self.LeftmotorSpeed = self.LeftmotorSpeed + 50
                 #self.RightmotorSpeed = self.RightmotorSpeed + 50
@@ -506,8 +529,11 @@ class StateMachine():
                     self.move(1, MIN_SPEED - 20, MIN_SPEED - 20)  # Move backward at a slower speed
                 else:
                     print("TOO CLOSE - CHANGE TO RIGHT")
-                    self.move(1, MIN_SPEED, MIN_SPEED)
-                    time.sleep(1)
+                    if self.velocity_control:
+                        self.sequencer.start(self.move_steps(1, MIN_SPEED, 1), label='back off shelf')
+                    else:
+                        self.move(1, MIN_SPEED, MIN_SPEED)
+                        self.sleep(1)
                     self.robot_state = 'SEARCH_FOR_SHELF'
                     self.shelf_side = RIGHT
 
@@ -528,8 +554,7 @@ class StateMachine():
                 self.shelf_side = LEFT
         
         # Calculate goal velocities
-        self.LeftmotorSpeed, self.RightmotorSpeed = navigation.calculate_goal_velocities(self.goal_position, obstaclesRB)
-        self.move(0, self.LeftmotorSpeed + 20, self.RightmotorSpeed + 20)
+        self.drive_to_goal(obstaclesRB, offset=20)
 
 
         
@@ -541,7 +566,7 @@ class StateMachine():
             #if rowMarkerRangeBearing[0] == self.target_row and self.rotation_complete:
             if rowMarkerRangeBearing[0] is not None and self.rotation_complete:
                 self.stop()
-                time.sleep(0.5)
+                self.sleep(0.5)
                 self.rotation_complete = False
             if rowMarkerRangeBearing[0] != 0 and not self.rotation_complete:
                 if rowMarkerRangeBearing[2] < -10:
@@ -563,7 +588,7 @@ class StateMachine():
             self.rotation_complete = True
             self.robot_state = 'MOVE_TO_ROW'
 
-    def move_to_row(self, rowMarkerRangeBearing, obstaclesRB, shelfRangeBearing):
+    def move_to_row(self, rowMarkerRangeBearing, obstaclesRB, shelfRangeBearing, range_profile=None):
         error_angle = 0
         # Check if shelfRangeBearing has data for left and right shelves
         if shelfRangeBearing and len(shelfRangeBearing) > 1:
@@ -595,22 +620,16 @@ class StateMachine():
             print("GOAL POSITION ANGLE (with shelf correction): ", self.goal_position['bearing'])
             print(self.goal_position)
 
-            # Add shelves to obstacles
-            # if shelfRangeBearing is not None and len(shelfRangeBearing) > 1:
-            #     np.append(obstaclesRB, shelfRangeBearing[0][2])
-            #     np.append(obstaclesRB, shelfRangeBearing[1][1])
-
-            # Calculate goal velocities
+            # Calculate goal velocities, keeping clear of the shelves either side of the row
             self.L_dir = '0'
             self.R_dir = '0'
-            self.LeftmotorSpeed, self.RightmotorSpeed = navigation.calculate_goal_velocities(self.goal_position, obstaclesRB)
-            self.move(0, self.LeftmotorSpeed, self.RightmotorSpeed)
+            self.drive_to_goal(obstaclesRB, shelvesRB=shelfRangeBearing, range_profile=range_profile)
             if self.goal_position['range'] - self.goal_bay_position[self.target_bay] < 0.01:
                 self.robot_state = 'SEARCH_FOR_ITEM'
                 self.rotation_complete = True
                 self.wait_for_shelf_alignment = True
                 self.stop()
-                time.sleep(0.3)
+                self.sleep(0.3)
                 # if self.target_bay == 3:
                 #     self.move(0,MIN_SPEED-40,MIN_SPEED-40)
                 #     time.sleep(1.5)
@@ -705,11 +724,11 @@ class StateMachine():
                         if abs(closest_item[1]) < 4:
                             logger.info(f"EXIT Step 2 ROTATION")
                             self.robot_state = 'MOVE_TO_ITEM'
-                            self.i2c.led(1,OFF)
-                            time.sleep(0.05)
-                            self.i2c.led(2,ON)
-                            time.sleep(0.05)
-                            self.stop()
+                            self.sequencer.start([
+                                Step(lambda: self.i2c.led(1,OFF), 0.05),
+                                Step(lambda: self.i2c.led(2,ON), 0.05),
+                                Step(self.stop),
+                            ], label='item found LEDs')
                             self.rotation_complete = True
                         else:
                             if closest_item[1] < 0:
@@ -772,41 +791,27 @@ class StateMachine():
     def collect_item(self, itemsRB):
         logger.info(f"COLLECT ITEM")
         if itemsRB is not None:
-            
-            self.stop()
-            # time.sleep(1)
-
             print("Collecting item")
-            self.i2c.grip(0) #
-            time.sleep(0.1)
-            if self.target_height == 2: # Level 3 Move Forward Longer Duration
-                self.i2c.lift(self.target_height + 1)
-                print("Lifting")
-                time.sleep(4)
+            # Timed steps, run by the sequencer while vision keeps running. Lift and grip
+            # steps finish early when the Pico reports they are done (LIFT_DONE, GRIP_DONE).
+            level = self.target_height + 1
+            steps = [
+                Step(self.stop),
+                Step(lambda: self.set_grip(0), 0.1),
+            ]
+            if self.target_height in (1, 2):
+                # Level 3 lifts and moves forward longer than level 2
+                lift_time, forward_time = (4, 0.6) if self.target_height == 2 else (3, 0.4)
+                steps.append(Step(lambda: self.set_lift(level), lift_time, event=LIFT_DONE, name='lift'))
                 if self.target_item != 'Bottle':
-                    self.move(0, MIN_SPEED-20, MIN_SPEED-20) # move forward
-                    time.sleep(0.6)
-                    self.stop()
-            if self.target_height == 1: # Level 2 Move Forward Shorter Duration
-                self.i2c.lift(self.target_height + 1)
-                time.sleep(3)
-                if self.target_item != 'Bottle':
-                    self.move(0, MIN_SPEED-20, MIN_SPEED-20) # move forward
-                    time.sleep(0.4)
-                    self.stop()
-            self.i2c.grip(1)
-            print("Grip")
-            time.sleep(1.6)
-            self.move(1, MIN_SPEED-20, MIN_SPEED-20) # move backwards
-            if self.target_height == 2: # Level 3 Move Backward Longer Duration
-                time.sleep(1.2)
-            else:
-                time.sleep(0.9)
-            self.stop()
+                    steps += self.move_steps(0, MIN_SPEED-20, forward_time) # move forward
+            steps.append(Step(lambda: self.set_grip(1), 1.6, event=GRIP_DONE, name='grip'))
+            # Level 3 moves backward longer
+            steps += self.move_steps(1, MIN_SPEED-20, 1.2 if self.target_height == 2 else 0.9) # move backwards
             if self.target_height != 0:
-                self.i2c.lift(1)
-                time.sleep(3)
-            self.robot_state = 'CHECK_ITEM'
+                steps.append(Step(lambda: self.set_lift(1), 3, event=LIFT_DONE, name='lower'))
+            self.sequencer.start(steps, label='collect item')
+            self.robot_state = 'CHECK_ITEM'  # Runs once the sequence is done
             # else:
             #     logger.info(f"No ITEM DETECTED in target height in collect_item")
             #     print("No item detected in target height")
@@ -825,10 +830,10 @@ class StateMachine():
             # Check is the item is collected
             # if target_height_itemRB == None:
             
-            self.i2c.led(2,OFF)
-            time.sleep(0.05)
-            self.i2c.led(3,ON)
-            time.sleep(0.05)
+            self.sequencer.start([
+                Step(lambda: self.i2c.led(2,OFF), 0.05),
+                Step(lambda: self.i2c.led(3,ON), 0.05),
+            ], label='holding item LEDs')
             self.holding_item = True
             self.robot_state = 'ROTATE_TO_EXIT' # should create a retry method if it misses it?
             # call check item inside the rotate_to_exit state
@@ -916,16 +921,22 @@ class StateMachine():
         # co-responding to the binary number 0b000000
         if dataRB is None:
             return 0b111111
+        self.update_feedback()
+        self.repeat_setpoint()
+        # Actuator sequences advance every tick; the state logic waits for them to finish
+        # while vision keeps processing frames for the current request
+        if self.sequencer.tick():
+            return self.request
         print(self.robot_state)
         if self.robot_state == 'INIT':
             self.init_state()
-            return 0
+            request = 0
         elif self.robot_state == 'SEARCH_FOR_PS':
             self.search_for_ps(dataRB[0], dataRB[1])
             request = PACKING_BAY | ROW_MARKERS
         elif self.robot_state == 'MOVE_TO_PS':
-            self.move_to_ps(dataRB[0], dataRB[4], dataRB[1])
-            request = PACKING_BAY | OBSTACLES | ROW_MARKERS
+            self.move_to_ps(dataRB[0], dataRB[4], dataRB[1], dataRB[6])
+            request = PACKING_BAY | OBSTACLES | ROW_MARKERS | FREE_SPACE
         elif self.robot_state == 'SEARCH_FOR_SHELF':
             self.search_for_shelf(dataRB[1], dataRB[2])
             request = ROW_MARKERS | SHELVES
@@ -936,8 +947,8 @@ class StateMachine():
             self.search_for_row(dataRB[1])
             request = ROW_MARKERS
         elif self.robot_state == 'MOVE_TO_ROW':
-            self.move_to_row(dataRB[1], dataRB[4], dataRB[2])
-            request = ROW_MARKERS | OBSTACLES | SHELVES
+            self.move_to_row(dataRB[1], dataRB[4], dataRB[2], dataRB[6])
+            request = ROW_MARKERS | OBSTACLES | SHELVES | FREE_SPACE
         elif self.robot_state == 'SEARCH_FOR_ITEM':
             self.search_for_item(dataRB[3], dataRB[2])
             request = ITEMS | SHELVES
@@ -957,12 +968,14 @@ class StateMachine():
             self.move_to_exit(dataRB[1], dataRB[2])
             request = ROW_MARKERS | SHELVES
         elif self.robot_state == 'MOVE_TO_PS_MARKER':
-            self.move_to_ps_marker(dataRB[1], dataRB[4])
-            request = ROW_MARKERS | OBSTACLES
+            self.move_to_ps_marker(dataRB[1], dataRB[4], dataRB[6])
+            request = ROW_MARKERS | OBSTACLES | FREE_SPACE
         elif self.robot_state == 'EXIT_PS':
             self.exit_ps(dataRB[1])
             request = ROW_MARKERS
         # Add other state transitions...
+        self.sequencer.tick()  # Start a sequence queued by this state straight away
+        self.request = request
         return request
         
 
@@ -979,27 +992,68 @@ class StateMachine():
         self.LeftmotorSpeed = int(round(L_speed))
         self.RightmotorSpeed = int(round(R_speed))
         print("Moving: ", self.L_dir, self.LeftmotorSpeed, self.R_dir, self.RightmotorSpeed)
-        self.i2c.DCWrite(1, self.L_dir, self.LeftmotorSpeed)
-        self.i2c.DCWrite(2, self.R_dir, self.RightmotorSpeed) #Right
+        if self.velocity_control:
+            sign = -1 if direction == 1 else 1
+            self.drive_velocity(*DynamicWindowPlanner.from_duty(sign * L_speed, sign * R_speed))
+            return
+        self.write_motors()
+
+
+
+    def drive_to_goal(self, obstaclesRB, offset=0, shelvesRB=None, range_profile=None):
+        """
+        Drive towards self.goal_position. Uses the local planner if one is set, otherwise the
+        potential field from path_planning with the duty cycle offset used by the calling state.
 
+        shelvesRB (Vision shelves) are kept clear of by the local planner only. Both they and the
+        free space profile (range_profile, which includes the shelves) should only be passed when
+        the goal is not on a shelf itself (MOVE_TO_ROW, not MOVE_TO_SHELF).
+        """
+        if self.local_planner is not None:
+            if self.velocity_control:
+                self.drive_velocity(*self.local_planner.plan_velocity(self.goal_position, obstaclesRB, range_profile, shelvesRB))
+                return
+            L_speed, R_speed = self.local_planner.plan_speeds(self.goal_position, obstaclesRB, range_profile, shelvesRB)
+            self.drive_wheels(L_speed, R_speed)
+            return
 
+        self.LeftmotorSpeed, self.RightmotorSpeed = navigation.calculate_goal_velocities(self.goal_position, obstaclesRB, range_profile=range_profile)
+        self.move(0, self.LeftmotorSpeed + offset, self.RightmotorSpeed + offset)
+
+    def drive_wheels(self, L_speed, R_speed):
+        # Signed duty cycles, negative drives that wheel backwards
+        self.L_dir = '0' if L_speed >= 0 else '1'
+        self.R_dir = '0' if R_speed >= 0 else '1'
+        self.LeftmotorSpeed = int(round(abs(L_speed)))
+        self.RightmotorSpeed = int(round(abs(R_speed)))
+        logger.debug("Moving: %s %d %s %d", self.L_dir, self.LeftmotorSpeed, self.R_dir, self.RightmotorSpeed)
+        if self.velocity_control:
+            self.drive_velocity(*DynamicWindowPlanner.from_duty(L_speed, R_speed))
+            return
+        self.write_motors()
 
     def rotate(self, direction, speed):
+        if self.velocity_control:
+            # The speed loop evens out the motors, so both wheels get the mean of the
+            # open loop duty cycles below and the turn is a pure rotation
+            duty = speed - ROTATE_MEAN_OFFSET
+            turn = duty if direction == LEFT else -duty
+            self.drive_velocity(*DynamicWindowPlanner.from_duty(-turn, turn))
+            return
         # Validate inputs
         if direction == LEFT:
             self.L_dir = '1'
             self.R_dir = '0'
-            self.LeftmotorSpeed = speed - 10
-            self.RightmotorSpeed = speed - 25
+            self.LeftmotorSpeed = speed - ROTATE_REVERSE_OFFSET
+            self.RightmotorSpeed = speed - ROTATE_FORWARD_OFFSET
         elif direction == RIGHT:
             self.L_dir = '0'
             self.R_dir = '1'
-            self.LeftmotorSpeed = speed - 25
-            self.RightmotorSpeed = speed - 10
+            self.LeftmotorSpeed = speed - ROTATE_FORWARD_OFFSET
+            self.RightmotorSpeed = speed - ROTATE_REVERSE_OFFSET
         
         print("Moving: ", self.L_dir, self.LeftmotorSpeed, self.R_dir, self.RightmotorSpeed)
-        self.i2c.DCWrite(1, self.L_dir, self.LeftmotorSpeed) #Left
-        self.i2c.DCWrite(2, self.R_dir, self.RightmotorSpeed) #Right
+        self.write_motors()
         return
     
     def stop(self):
@@ -1008,20 +1062,72 @@ class StateMachine():
         self.LeftmotorSpeed = 0
         self.RightmotorSpeed = 0
         print("MOTORS STOP")
-        self.i2c.DCWrite(1, self.L_dir, self.LeftmotorSpeed) #Left
-        self.i2c.DCWrite(2, self.R_dir, self.RightmotorSpeed) #Right
+        if self.velocity_control:
+            self.drive_velocity(0.0, 0.0)
+            return
+        self.write_motors()
         # print("RESET GRIPPER")
         # self.i2c.grip(0)
 
         return
 
+    def write_motors(self):
+        # Both wheels in one W command (signed duty), so they change speed together
+        left = 0 if self.L_dir == 'S' else (-self.LeftmotorSpeed if self.L_dir == '1' else self.LeftmotorSpeed)
+        right = 0 if self.R_dir == 'S' else (-self.RightmotorSpeed if self.R_dir == '1' else self.RightmotorSpeed)
+        self.i2c.DC_motors(left, right)
+        self.last_command_time = self.clock()
+
+    def drive_velocity(self, v, w):
+        # Velocity mode: v in m/s, w in rad/s (positive left), held by the Pico's speed loop
+        self.velocity_setpoint = (v, w)
+        logger.debug("Velocity: %.3f m/s %.2f rad/s", v, w)
+        self.i2c.drive(v, w)
+        self.setpoint_time = self.last_command_time = self.clock()
+
+    def drive_segments(self, segments):
+        """
+        Hand a manoeuvre to the Pico as motion segments (velocity mode only). The Pico runs
+        them back to back, stops after the last one and acknowledges it in the telemetry
+        (SEGMENT_DONE).
+
+        Args:
+        - segments: List of (v, w, duration, distance), see I2C.segment.
+        """
+        self.velocity_setpoint = (0.0, 0.0)  # A repeated D command would cancel the segments
+        for v, w, duration, distance in segments:
+            self.segment_id = self.segment_id % 255 + 1
+            self.i2c.segment(self.segment_id, v, w, duration, distance)
+        self.last_command_time = self.clock()
+
+    def move_steps(self, direction, speed, duration):
+        """
+        Sequencer steps that drive straight at a duty cycle for duration seconds and stop.
+        In velocity mode the Pico drives the same distance on its encoders instead.
+        """
+        if not self.velocity_control:
+            return [Step(lambda: self.move(direction, speed, speed), duration), Step(self.stop)]
+        v, _ = DynamicWindowPlanner.from_duty(speed, speed)
+        v = -v if direction == 1 else v
+        limit = duration * SEGMENT_TIME_FACTOR
+        return [Step(lambda: self.drive_segments([(v, 0.0, limit, abs(v) * duration)]),
+                     limit + SEGMENT_MARGIN, event=SEGMENT_DONE, name='segment')]
+
+    def repeat_setpoint(self):
+        # The Pico stops the wheels when the setpoints stop, so a moving setpoint is
+        # repeated while states (or sequences) are not sending new ones
+        if not self.velocity_control or self.setpoint_time is None or self.velocity_setpoint == (0.0, 0.0):
+            return
+        if self.clock() - self.setpoint_time > SETPOINT_REPEAT:
+            self.drive_velocity(*self.velocity_setpoint)
+
     def __del__(self):
         self.stop()
         print("RESET GRIPPER")
         self.i2c.grip(0)
-        time.sleep(0.01)
+        self.sleep(0.01)
         self.i2c.led(1,0)
-        time.sleep(0.01)
+        self.sleep(0.01)
         self.i2c.led(2,0)
-        time.sleep(0.01)
+        self.sleep(0.01)
         self.i2c.led(3,0),
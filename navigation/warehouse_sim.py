@@ -0,0 +1,632 @@
+import argparse
+import gc
+import logging
+import math
+import os
+import contextlib
+import time
+import numpy as np
+
+from i2c.main_i2c import I2C
+from i2c.emulator import PicoEmulator
+from i2c.wheel_model import COUNTS_PER_METER, WHEEL_BASE
+from navigation.order import load_order
+from navigation.dynamic_window import ROBOT_RADIUS
+from navigation.state_machine import StateMachine, PACKING_BAY, ROW_MARKERS, SHELVES, ITEMS, OBSTACLES, WALLPOINTS, FREE_SPACE
+
+"""
+Headless 2D warehouse simulator for evaluating the state machine without CoppeliaSim.
+
+The arena (shelves, bays, packing station, row markers, obstacles and the items in
+the bays) is a handful of numpy arrays. Every frame the simulator answers the
+state machine's vision request with the same structure as Vision.objectRB, by ray
+casting from the camera, and the motor commands go through the Pico emulator
+(i2c/emulator.py), whose encoder counts drive the differential drive pose. All of
+it runs on a virtual clock, so the state machine's sleeps, the action sequencer and
+the Pico's timings take no wall time and a run of several minutes of robot time
+finishes in about a second.
+
+    sim = WarehouseSim(bay_contents, obstacles=[(1.0, 0.7)], seed=0)
+    state_machine = StateMachine(i2c=sim.i2c, order_path="navigation/Order_1.csv")
+    sim.run(state_machine, duration=300)
+    print(sim.result(state_machine))
+
+Arena frame (m): origin in the packing station corner, x along the packing station
+wall, y towards the row marker wall, headings counter-clockwise from +x. Looking
+at the row markers, shelf 0 is on the left wall and shelf 5 on the right wall, and
+row r runs between shelves 2r-2 and 2r-1. Bay 0 is the bay furthest from the row
+marker, as in StateMachine.goal_bay_position.
+
+objectRB entries, as the detectors produce them (bearings in degrees, positive to
+the right, ranges from the camera):
+- 0 packing bay: [[range, bearing]] of the ramp's front edge, or [].
+- 1 marker: [type, range, bearing] of the nearest marker (0 packing station, 1-3
+  rows), or None.
+- 2 shelves: per shelf from left to right, [[1, range, bearing, (x, y)], [2, ...]]
+  for its leftmost and rightmost visible point (the bottom corners in the image);
+  shelves that touch in the image are one shelf, as in the shelf mask.
+- 3 items: [range, bearing, level] with level 1 (bottom) to 3 (top).
+- 4 obstacles: [bearing, range] to the near surface.
+- 5 walls: [[0, 0]] when a wall is in view (the detector does not range walls).
+- 6 free space: ranges to the nearest shelf or obstacle, one per degree of the FOV.
+Only the requested entries are updated, the others keep their last value like
+Vision.objectRB.
+
+Not modelled: camera resolution and detector errors beyond the optional range and
+bearing noise and dropouts, wheel slip, and item heights other than through the
+level. Items are picked up when the gripper closes with one of the lift level's
+items in reach, and count as delivered when the gripper opens over the ramp.
+
+Usage (from the repository root):
+    python -m navigation.warehouse_sim [--order navigation/Order_1.csv] [--scenarios 20]
+                                       [--duration 600] [--obstacles 2] [--fill 0.3]
+                                       [--frame-time 0.05] [--range-noise 0] [--bearing-noise 0] [--dropout 0]
+                                       [--seed 0] [--print]
+"""
+
+logger = logging.getLogger(__name__)
+
+# Arena layout (m)
+ARENA_SIZE = 2.0
+SHELF_DEPTH = 0.1
+SHELF_START = 1.1  # y of the shelf end facing the packing station
+BAY_LENGTH = 0.2
+BAYS = 4
+HEIGHTS = 3
+AISLE_WIDTH = (ARENA_SIZE - 6 * SHELF_DEPTH) / 3
+PACKING_BAY_AREA = (0.0, 0.0, 0.45, 0.25)  # Ramp footprint (x0, y0, x1, y1)
+PACKING_BAY_POINT = (0.225, 0.25)  # Front edge of the ramp, what the ramp detector ranges
+PS_MARKER = (0.225, 0.0)
+OBSTACLE_RADIUS = 0.05
+
+# Items in the bay contents, in warehouseObjects order (COPPELIA_PythonCode/warehousebot_lib.py)
+ITEM_NAMES = ('Bowl', 'Mug', 'Bottle', 'Ball', 'Cube', 'Weetbots')
+
+# Camera and detection (RobotParameters in warehousebot_lib.py)
+CAMERA_OFFSET = 0.1  # m in front of the wheel axle
+CAMERA_FOV = 70  # deg
+CAMERA_HEIGHT = 0.1  # m, only for the nominal image coordinates
+IMAGE_SIZE = (410, 308)  # Nominal image size for the shelf corner positions
+PACKING_BAY_RANGE = 2.5
+MARKER_RANGE = 2.5
+SHELF_RANGE = 2.5
+ITEM_RANGE = 1.0
+OBSTACLE_RANGE = 1.5
+OCCLUSION_TOLERANCE = 0.01  # m, a target this close behind the first hit still counts as seen
+EDGE_EPSILON = 1e-3  # rad, rays either side of a silhouette edge
+SHELF_MERGE_GAP = 1.0  # deg, shelves closer than this in the image are one contour
+
+# Gripper
+PICKUP_REACH = 0.25  # m from the camera
+PICKUP_BEARING = 15  # deg
+DROP_MARGIN = 0.1  # m around the ramp footprint
+
+# Simulation
+FRAME_TIME = 0.05  # s between vision frames (state machine ticks)
+MAX_STEP = 0.02  # s, longest pose integration step
+START_POSE = (0.4, 0.55, math.pi / 2)  # Next to the packing station, facing the row markers
+START_AREA = ((0.2, 0.6), (0.4, 0.7))  # x and y ranges of the random start positions
+OBSTACLE_AREA = ((0.3, ARENA_SIZE - 0.3), (0.45, SHELF_START - 0.2))
+
+
+def _shelf_rects():
+    # Shelf 0 and 5 against the side walls, 1/2 and 3/4 back to back between the rows
+    lefts = [0.0]
+    for _ in range(2):
+        lefts += [lefts[-1] + SHELF_DEPTH + AISLE_WIDTH, lefts[-1] + 2 * SHELF_DEPTH + AISLE_WIDTH]
+    lefts.append(ARENA_SIZE - SHELF_DEPTH)
+    return np.array([[x, SHELF_START, x + SHELF_DEPTH, SHELF_START + BAYS * BAY_LENGTH] for x in lefts])
+
+
+SHELF_RECTS = _shelf_rects()  # (6, 4) x0, y0, x1, y1
+SHELF_CORNERS = np.stack([SHELF_RECTS[:, [0, 1]], SHELF_RECTS[:, [2, 1]],
+                          SHELF_RECTS[:, [2, 3]], SHELF_RECTS[:, [0, 3]]], axis=1)  # (6, 4, 2)
+# Even shelves face the row on their right (+x), odd shelves the row on their left
+SHELF_FACES = np.where(np.arange(6) % 2 == 0, SHELF_RECTS[:, 2], SHELF_RECTS[:, 0])
+ROW_X = (SHELF_FACES[0::2] + SHELF_FACES[1::2]) / 2
+ROW_MARKERS_XY = np.array([[x, ARENA_SIZE] for x in ROW_X])
+# Items sit on the shelf face, bay 0 furthest from the row marker
+BAY_Y = SHELF_START + (np.arange(BAYS) + 0.5) * BAY_LENGTH
+ITEM_POINTS = np.stack(np.broadcast_arrays(SHELF_FACES[:, None], BAY_Y[None, :]), axis=-1)  # (6, 4, 2)
+MARKER_POINTS = np.vstack([PS_MARKER, ROW_MARKERS_XY])  # Indexed by marker type
+FOCAL_LENGTH = IMAGE_SIZE[0] / 2 / math.tan(math.radians(CAMERA_FOV / 2))
+
+
+def _wrap(angles):
+    return (angles + np.pi) % (2 * np.pi) - np.pi
+
+
+def bay_contents_for_order(items, fill=0.0, rng=None):
+    """
+    Bay contents (SceneParameters.bayContents layout: [shelf, bay, height], item index
+    in ITEM_NAMES or -1 for empty) with the ordered items in their bays.
+
+    Args:
+    - items: OrderItem list (navigation/order.py).
+    - fill: Probability that any other bay position holds a random item.
+    - rng: numpy Generator for the fill.
+    """
+    contents = -np.ones((6, BAYS, HEIGHTS), dtype=np.int16)
+    if fill > 0:
+        rng = rng if rng is not None else np.random.default_rng()
+        filled = rng.random(contents.shape) < fill
+        contents[filled] = rng.integers(0, len(ITEM_NAMES), size=int(filled.sum()))
+    for item in items:
+        contents[item.shelf, item.bay, item.height] = ITEM_NAMES.index(item.name)
+    return contents
+
+
+class WarehouseSim:
+    def __init__(self, bay_contents=None, obstacles=(), pose=START_POSE, frame_time=FRAME_TIME,
+                 range_noise=0.0, bearing_noise=0.0, dropout=0.0, seed=None):
+        """
+        Args:
+        - bay_contents: (6, 4, 3) item indices as SceneParameters.bayContents (-1 for empty).
+        - obstacles: (x, y) centres of the obstacles.
+        - pose: Start pose (x, y, heading in rad).
+        - frame_time: Seconds between vision frames in run().
+        - range_noise: Standard deviation of the range error, as a fraction of the range.
+        - bearing_noise: Standard deviation of the bearing error in degrees.
+        - dropout: Probability that a detection is missing from a frame.
+        - seed: Seed for the noise and the Pico emulator.
+        """
+        self.bay_contents = (-np.ones((6, BAYS, HEIGHTS), dtype=np.int16) if bay_contents is None
+                             else np.array(bay_contents, dtype=np.int16))
+        self.obstacles = np.array(obstacles, dtype=float).reshape(-1, 2)
+        self.pose = np.array(pose, dtype=float)
+        self.frame_time = frame_time
+        self.range_noise = range_noise
+        self.bearing_noise = bearing_noise
+        self.dropout = dropout
+        self.random = np.random.default_rng(seed)
+        self.time = 0.0
+
+        # The Pico: commands are executed on the virtual clock and the bus takes no time
+        self.emulator = PicoEmulator(baudrate=0, clock=self.clock, sleep=lambda duration: None, seed=seed)
+        # Flow control waits on the virtual clock too
+        self.i2c = I2C(bus=self.emulator, clock=self.clock, sleep=self.advance)
+        self.encoders = list(self.emulator.encoders)
+        self.gripper_closed = 0
+
+        self.objectRB = [[], [], [], [], [], [], []]
+        self.frames = 0
+        self.held_item = None  # (shelf, bay, height, item index) in the gripper
+        self.picked = []
+        self.delivered = []
+        self.dropped = []  # Released away from the packing station
+        self.collisions = 0
+        self.in_contact = False
+
+    def clock(self):
+        return self.time
+
+    #===========================================================================
+    # Driving
+    #===========================================================================
+    def attach(self, state_machine):
+        """
+        Run a StateMachine (built with i2c=self.i2c) on the virtual clock: its sleeps advance
+        the simulation instead of blocking.
+        """
+        state_machine.clock = self.clock
+        state_machine.sleep = self.advance
+        state_machine.sequencer.clock = self.clock
+
+    def advance(self, duration):
+        """
+        Advance the virtual time, running the Pico and integrating the pose from its encoders.
+        """
+        end = self.time + duration
+        while self.time < end:
+            self.time = min(end, self.time + MAX_STEP)
+            self.emulator.read_byte(self.i2c.addr)  # Runs the Pico up to now
+            self._move()
+            self._update_gripper()
+
+    def _move(self):
+        left, right = (self.emulator.encoders[i] - self.encoders[i] for i in range(2))
+        self.encoders = list(self.emulator.encoders)
+        if left == 0 and right == 0:
+            return  # Standing, most of the time spent in sequences
+        left /= COUNTS_PER_METER
+        right /= COUNTS_PER_METER
+        distance = (left + right) / 2
+        turn = (right - left) / WHEEL_BASE
+        x, y, heading = self.pose
+        x += distance * math.cos(heading + turn / 2)
+        y += distance * math.sin(heading + turn / 2)
+        heading = math.atan2(math.sin(heading + turn), math.cos(heading + turn))
+        if self._collides(x, y):
+            # Blocked: the wheels turn on the spot, the heading still follows them
+            if not self.in_contact:
+                self.collisions += 1
+            self.in_contact = True
+            x, y = self.pose[:2]
+        else:
+            self.in_contact = False
+        self.pose = np.array([x, y, heading])
+
+    def _collides(self, x, y):
+        if not (ROBOT_RADIUS <= x <= ARENA_SIZE - ROBOT_RADIUS and ROBOT_RADIUS <= y <= ARENA_SIZE - ROBOT_RADIUS):
+            return True
+        # Nearest point of each shelf to the robot centre
+        nearest_x = np.clip(x, SHELF_RECTS[:, 0], SHELF_RECTS[:, 2])
+        nearest_y = np.clip(y, SHELF_RECTS[:, 1], SHELF_RECTS[:, 3])
+        if np.any((nearest_x - x) ** 2 + (nearest_y - y) ** 2 < ROBOT_RADIUS ** 2):
+            return True
+        return bool(len(self.obstacles) and np.any(
+            np.hypot(self.obstacles[:, 0] - x, self.obstacles[:, 1] - y) < ROBOT_RADIUS + OBSTACLE_RADIUS))
+
+    def _update_gripper(self):
+        closed = self.emulator.gripper_closed
+        if closed and not self.gripper_closed:
+            self._grab()
+        elif not closed and self.gripper_closed:
+            self._release()
+        self.gripper_closed = closed
+
+    def _grab(self):
+        if self.held_item is not None:
+            return
+        # Items of the level the lift is at, in reach in front of the camera
+        height = max(self.emulator.lift_level, 1) - 1
+        shelves, bays = np.nonzero(self.bay_contents[:, :, height] >= 0)
+        if len(shelves) == 0:
+            return
+        ranges, bearings = self._range_bearing(ITEM_POINTS[shelves, bays])
+        reachable = (ranges < PICKUP_REACH) & (np.abs(bearings) < PICKUP_BEARING)
+        if not reachable.any():
+            return
+        index = np.flatnonzero(reachable)[np.argmin(ranges[reachable])]
+        shelf, bay = int(shelves[index]), int(bays[index])
+        self.held_item = (shelf, bay, height, int(self.bay_contents[shelf, bay, height]))
+        self.bay_contents[shelf, bay, height] = -1
+        self.picked.append(self.held_item)
+
+    def _release(self):
+        if self.held_item is None:
+            return
+        x, y = self._camera()
+        x0, y0, x1, y1 = PACKING_BAY_AREA
+        if x0 - DROP_MARGIN <= x <= x1 + DROP_MARGIN and y0 - DROP_MARGIN <= y <= y1 + DROP_MARGIN:
+            self.delivered.append(self.held_item)
+        else:
+            self.dropped.append(self.held_item)
+        self.held_item = None
+
+    #===========================================================================
+    # Vision
+    #===========================================================================
+    def _camera(self):
+        x, y, heading = self.pose
+        return np.array([x + CAMERA_OFFSET * math.cos(heading), y + CAMERA_OFFSET * math.sin(heading)])
+
+    def _range_bearing(self, points):
+        """
+        Range (m) and bearing (deg, positive to the right) of (N, 2) points from the camera.
+        """
+        offsets = np.asarray(points, dtype=float) - self._camera()
+        angles = _wrap(np.arctan2(offsets[:, 1], offsets[:, 0]) - self.pose[2])
+        return np.hypot(offsets[:, 0], offsets[:, 1]), -np.degrees(angles)
+
+    def _cast(self, angles):
+        """
+        Cast rays from the camera at world angles (rad) against the shelves, obstacles and walls.
+
+        Returns:
+        - Range to the first hit and what was hit: shelf 0-5, 6 + obstacle index or -1 for a wall.
+        """
+        ox, oy = self._camera()
+        dx = np.cos(angles)[:, None]
+        dy = np.sin(angles)[:, None]
+
+        # Shelves: slab test against each rectangle
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tx0 = (SHELF_RECTS[:, 0] - ox) / dx
+            tx1 = (SHELF_RECTS[:, 2] - ox) / dx
+            ty0 = (SHELF_RECTS[:, 1] - oy) / dy
+            ty1 = (SHELF_RECTS[:, 3] - oy) / dy
+            near = np.maximum(np.minimum(tx0, tx1), np.minimum(ty0, ty1))
+            far = np.minimum(np.maximum(tx0, tx1), np.maximum(ty0, ty1))
+            hits = np.where(far >= np.maximum(near, 0), np.maximum(near, 0), np.inf)
+
+            if len(self.obstacles):
+                # Obstacles: first intersection with each circle
+                rel_x = ox - self.obstacles[:, 0]
+                rel_y = oy - self.obstacles[:, 1]
+                b = dx * rel_x + dy * rel_y
+                c = rel_x ** 2 + rel_y ** 2 - OBSTACLE_RADIUS ** 2
+                disc = b ** 2 - c
+                t = -b - np.sqrt(np.maximum(disc, 0))
+                circles = np.where((disc >= 0) & (-b + np.sqrt(np.maximum(disc, 0)) >= 0), np.maximum(t, 0), np.inf)
+                hits = np.hstack([hits, circles])
+
+            # Walls: the arena boundary from the inside
+            wall_x = np.where(dx > 0, (ARENA_SIZE - ox) / dx, np.where(dx < 0, -ox / dx, np.inf))
+            wall_y = np.where(dy > 0, (ARENA_SIZE - oy) / dy, np.where(dy < 0, -oy / dy, np.inf))
+            walls = np.minimum(wall_x, wall_y)[:, 0]
+
+        first = np.argmin(hits, axis=1)
+        ranges = hits[np.arange(len(angles)), first]
+        ids = np.where(ranges <= walls, first, -1)
+        return np.minimum(ranges, walls), ids
+
+    def _visible(self, ranges, bearings, max_range, surface=0.0):
+        """
+        Mask of the points (from _range_bearing) in the field of view, in range and not hidden
+        behind a shelf or obstacle.
+
+        Args:
+        - surface: Distance from the point to the surface that is seen (obstacle radius).
+        """
+        visible = (np.abs(bearings) <= CAMERA_FOV / 2) & (ranges - surface <= max_range)
+        if visible.any():
+            angles = self.pose[2] - np.radians(bearings[visible])
+            hit_ranges, _ = self._cast(angles)
+            visible[visible] = hit_ranges >= ranges[visible] - surface - OCCLUSION_TOLERANCE
+        return visible
+
+    def _noisy(self, ranges, bearings):
+        if self.range_noise:
+            ranges = ranges * (1 + self.random.normal(0, self.range_noise, len(ranges)))
+        if self.bearing_noise:
+            bearings = bearings + self.random.normal(0, self.bearing_noise, len(bearings))
+        return ranges, bearings
+
+    def _detected(self, mask):
+        # Drop detections at the dropout rate
+        if self.dropout:
+            mask = mask & (self.random.random(len(mask)) >= self.dropout)
+        return mask
+
+    def _image_point(self, distance, bearing):
+        # Nominal pinhole position of a floor point, for the shelf corner positions
+        x = IMAGE_SIZE[0] / 2 + FOCAL_LENGTH * math.tan(math.radians(bearing))
+        y = IMAGE_SIZE[1] / 2 + FOCAL_LENGTH * CAMERA_HEIGHT / max(distance, 1e-3)
+        return (int(round(x)), int(min(IMAGE_SIZE[1] - 1, round(y))))
+
+    def packing_bay(self):
+        ranges, bearings = self._range_bearing([PACKING_BAY_POINT])
+        visible = self._detected(self._visible(ranges, bearings, PACKING_BAY_RANGE))
+        ranges, bearings = self._noisy(ranges[visible], bearings[visible])
+        return [[float(r), float(b)] for r, b in zip(ranges, bearings)]
+
+    def marker(self):
+        ranges, bearings = self._range_bearing(MARKER_POINTS)
+        visible = self._detected(self._visible(ranges, bearings, MARKER_RANGE))
+        if not visible.any():
+            return None
+        index = np.flatnonzero(visible)[np.argmin(ranges[visible])]
+        ranges, bearings = self._noisy(ranges[[index]], bearings[[index]])
+        return [int(index), float(ranges[0]), float(bearings[0])]
+
+    def shelves(self):
+        """
+        Leftmost and rightmost visible point of each shelf in view. They are found by casting
+        rays along every silhouette edge (shelf corners, obstacle outlines, FOV edges), where
+        the visible part of a shelf has to start and end. Shelves that touch or overlap in the
+        image are one contour in the shelf mask, so they are merged like the detector sees them.
+        """
+        camera = self._camera()
+        heading = self.pose[2]
+        offsets = SHELF_CORNERS.reshape(-1, 2) - camera
+        edges = [np.arctan2(offsets[:, 1], offsets[:, 0])]
+        if len(self.obstacles):
+            centres = self.obstacles - camera
+            distances = np.maximum(np.hypot(centres[:, 0], centres[:, 1]), OBSTACLE_RADIUS)
+            spread = np.arcsin(OBSTACLE_RADIUS / distances)
+            angles = np.arctan2(centres[:, 1], centres[:, 0])
+            edges += [angles - spread, angles + spread]
+        edges = np.concatenate(edges)
+        half_fov = math.radians(CAMERA_FOV / 2)
+        angles = np.concatenate([edges - EDGE_EPSILON, edges, edges + EDGE_EPSILON, [heading - half_fov, heading + half_fov]])
+        bearings = -np.degrees(_wrap(angles - heading))
+        in_view = np.abs(bearings) <= CAMERA_FOV / 2 + 1e-9
+        bearings = bearings[in_view]
+        ranges, ids = self._cast(angles[in_view])
+        seen = (ids >= 0) & (ids < 6) & (ranges <= SHELF_RANGE)
+
+        # Visible extent of each shelf: (left bearing, left range, right bearing, right range)
+        extents = []
+        for shelf in np.unique(ids[seen]):
+            rays = np.flatnonzero(seen & (ids == shelf))
+            left, right = rays[np.argmin(bearings[rays])], rays[np.argmax(bearings[rays])]
+            extents.append([bearings[left], ranges[left], bearings[right], ranges[right]])
+        merged = []
+        for extent in sorted(extents):
+            if merged and extent[0] <= merged[-1][2] + SHELF_MERGE_GAP:
+                if extent[2] > merged[-1][2]:
+                    merged[-1][2:] = extent[2:]
+            else:
+                merged.append(extent)
+
+        detected = []
+        for extent in np.array(merged)[self._detected(np.ones(len(merged), dtype=bool))]:
+            corner_ranges, corner_bearings = self._noisy(extent[[1, 3]], extent[[0, 2]])
+            detected.append([[corner_type, float(r), float(b), self._image_point(r, b)]
+                             for corner_type, r, b in zip((1, 2), corner_ranges, corner_bearings)])
+        # Left to right by the left corner's image position, as Vision sorts them
+        return sorted(detected, key=lambda shelf: shelf[0][3][0])
+
+    def items(self):
+        shelves, bays, heights = np.nonzero(self.bay_contents >= 0)
+        if len(shelves) == 0:
+            return []
+        points = ITEM_POINTS[shelves, bays]
+        ranges, bearings = self._range_bearing(points)
+        visible = self._detected(self._visible(ranges, bearings, ITEM_RANGE))
+        ranges, bearings = self._noisy(ranges[visible], bearings[visible])
+        detected = [[float(r), float(b), int(h) + 1] for r, b, h in zip(ranges, bearings, heights[visible])]
+        # By level, nearest (largest in the image) first
+        return sorted(detected, key=lambda item: (item[2], item[0]))
+
+    def obstacles_rb(self):
+        if len(self.obstacles) == 0:
+            return []
+        ranges, bearings = self._range_bearing(self.obstacles)
+        visible = self._detected(self._visible(ranges, bearings, OBSTACLE_RANGE, surface=OBSTACLE_RADIUS))
+        ranges, bearings = self._noisy(ranges[visible] - OBSTACLE_RADIUS, bearings[visible])
+        return [[float(b), float(r)] for r, b in zip(ranges, bearings)]
+
+    def _fan(self):
+        # One ray per degree of the field of view, -fov/2 (left) to fov/2
+        bearings = np.arange(-(CAMERA_FOV // 2), CAMERA_FOV // 2 + 1, dtype=float)
+        return self._cast(self.pose[2] - np.radians(bearings))
+
+    def walls(self):
+        _, ids = self._fan()
+        return [[0, 0]] if np.any(ids == -1) else []
+
+    def free_space(self):
+        ranges, ids = self._fan()
+        profile = np.where(ids >= 0, ranges, np.inf)
+        if self.range_noise:
+            profile = profile * (1 + self.random.normal(0, self.range_noise, len(profile)))
+        return profile
+
+    def observe(self, requested_objects):
+        """
+        One vision frame: update the requested entries of objectRB.
+
+        Args:
+        - requested_objects: Bitmask as returned by StateMachine.run_state_machine.
+
+        Returns:
+        - objectRB, in the layout of Vision.objectRB.
+        """
+        products = ((PACKING_BAY, 0, self.packing_bay), (ROW_MARKERS, 1, self.marker), (SHELVES, 2, self.shelves),
+                    (ITEMS, 3, self.items), (OBSTACLES, 4, self.obstacles_rb), (WALLPOINTS, 5, self.walls),
+                    (FREE_SPACE, 6, self.free_space))
+        for bit, index, detect in products:
+            if requested_objects & bit:
+                self.objectRB[index] = detect()
+        return self.objectRB
+
+    #===========================================================================
+    # Running
+    #===========================================================================
+    def run(self, state_machine, duration):
+        """
+        Run the state machine for up to duration seconds of virtual time, one tick per vision
+        frame, or until it has delivered its whole order.
+        """
+        self.attach(state_machine)
+        request = 0b111111
+        end = self.time + duration
+        while self.time < end and state_machine.current_item < len(state_machine.final_df):
+            state_machine.telemetry.poll()  # The TelemetryPoller thread on the robot
+            request = state_machine.run_state_machine(self.observe(request))
+            self.advance(self.frame_time)
+            self.frames += 1
+
+    def result(self, state_machine):
+        """
+        Summary of a run.
+        """
+        ordered = {(item.shelf, item.bay, item.height) for item in state_machine.final_df}
+        return {
+            'time': self.time,
+            'frames': self.frames,
+            'state': state_machine.robot_state,
+            'ordered': len(ordered),
+            'delivered': sum((shelf, bay, height) in ordered for shelf, bay, height, _ in self.delivered),
+            'wrong_items': sum((shelf, bay, height) not in ordered for shelf, bay, height, _ in self.picked),
+            'dropped': len(self.dropped),
+            'collisions': self.collisions,
+        }
+
+
+def random_scenario(items, rng, obstacles=0, fill=0.0):
+    """
+    Random bay fill, start pose next to the packing station (where the robot starts in the
+    competition) and obstacle positions in the open area in front of the rows.
+
+    Returns:
+    - Keyword arguments for WarehouseSim.
+    """
+    contents = bay_contents_for_order(items, fill, rng)
+    start = np.array([rng.uniform(*START_AREA[0]), rng.uniform(*START_AREA[1])])
+    positions = []
+    while len(positions) < obstacles:
+        point = np.array([rng.uniform(*OBSTACLE_AREA[0]), rng.uniform(*OBSTACLE_AREA[1])])
+        # Clear of the robot, the ramp and each other
+        if all(np.hypot(*(point - other)) > 2 * ROBOT_RADIUS + OBSTACLE_RADIUS
+               for other in [start, np.array(PACKING_BAY_POINT)] + positions):
+            positions.append(point)
+    return {'bay_contents': contents, 'obstacles': positions,
+            'pose': (start[0], start[1], rng.uniform(-math.pi, math.pi))}
+
+
+def run_scenario(order_path, duration, seed, obstacles=0, fill=0.0, **options):
+    """
+    Build a random scenario for the order and run a fresh StateMachine in it.
+
+    Args:
+    - options: Further WarehouseSim arguments (frame_time, noise and dropout).
+
+    Returns:
+    - WarehouseSim.result(), with the exception text in 'error' if the state machine raised.
+    """
+    rng = np.random.default_rng(seed)
+    sim = WarehouseSim(seed=seed, **random_scenario(load_order(order_path), rng, obstacles, fill), **options)
+    state_machine = StateMachine(i2c=sim.i2c, order_path=order_path)
+    error = None
+    try:
+        sim.run(state_machine, duration)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    result = sim.result(state_machine)
+    result['error'] = error
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the state machine in the headless warehouse simulator")
+    parser.add_argument("--order", default="navigation/Order_1.csv", help="Order file to collect")
+    parser.add_argument("--scenarios", type=int, default=20, help="Number of random scenarios")
+    parser.add_argument("--duration", type=float, default=600, help="Seconds of robot time per scenario")
+    parser.add_argument("--obstacles", type=int, default=0, help="Obstacles in the open area")
+    parser.add_argument("--fill", type=float, default=0.0, help="Probability of a random item in the other bay positions")
+    parser.add_argument("--frame-time", type=float, default=FRAME_TIME, help="Seconds between vision frames")
+    parser.add_argument("--range-noise", type=float, default=0.0, help="Range error (fraction of the range)")
+    parser.add_argument("--bearing-noise", type=float, default=0.0, help="Bearing error (deg)")
+    parser.add_argument("--dropout", type=float, default=0.0, help="Probability of a missed detection")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first scenario")
+    parser.add_argument("--print", action="store_true", help="Keep the state machine's prints and log output")
+    args = parser.parse_args(argv)
+
+    options = {'frame_time': args.frame_time, 'range_noise': args.range_noise,
+               'bearing_noise': args.bearing_noise, 'dropout': args.dropout}
+    if not args.print:
+        logging.disable(logging.CRITICAL)
+    frames = 0
+    start = time.perf_counter()
+    results = []
+    with open(os.devnull, 'w') as devnull:
+        # The state machine prints every tick, which would measure the terminal
+        output = contextlib.nullcontext() if args.print else contextlib.redirect_stdout(devnull)
+        for seed in range(args.seed, args.seed + args.scenarios):
+            scenario_start = time.perf_counter()
+            with output:
+                result = run_scenario(args.order, args.duration, seed, args.obstacles, args.fill, **options)
+                # The state machine is in reference cycles (sequencer steps); collect it here, where
+                # the prints of its __del__ are redirected too
+                gc.collect()
+            results.append(result)
+            frames += result['frames']
+            print(f"seed {seed:4d}: {result['delivered']}/{result['ordered']} delivered in {result['time']:6.1f} s, "
+                  f"ends in {result['state']:17s} wrong {result['wrong_items']} dropped {result['dropped']} "
+                  f"collisions {result['collisions']:3d} ({time.perf_counter() - scenario_start:.2f} s)"
+                  + (f"  {result['error']}" if result['error'] else ""))
+    elapsed = time.perf_counter() - start
+
+    complete = sum(result['delivered'] == result['ordered'] for result in results)
+    print(f"{complete}/{len(results)} orders complete, "
+          f"{sum(result['delivered'] for result in results)}/{sum(result['ordered'] for result in results)} items delivered, "
+          f"{sum(result['error'] is not None for result in results)} errors")
+    print(f"{frames} frames in {elapsed:.1f} s: {frames / elapsed:.0f} frames/s, "
+          f"{sum(result['time'] for result in results) / elapsed:.0f}x real time")
+
+
+if __name__ == "__main__":
+    main()
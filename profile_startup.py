@@ -0,0 +1,94 @@
+"""
+Startup time profiler for main.py.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and prints the
+top-level imports by cumulative time and the single heaviest modules by self time.
+With --run, main.py is also started for a few seconds and the "Startup:" milestones
+it logs (see startup.py) are printed.
+
+Usage:
+    python profile_startup.py [--module main] [--top 15] [--run SECONDS]
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """
+    Parse -X importtime output.
+
+    Returns:
+    - List of (module, self_us, cumulative_us, depth) in import order.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return imports
+
+
+def profile_imports(module, python=sys.executable):
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    imports = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        # Keep going, a missing dependency still shows where the time went up to that point
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        print(f"warning: 'import {module}' failed: {error}")
+    return imports
+
+
+def report(imports, top):
+    if not imports:
+        print("No imports recorded")
+        return
+    total = sum(cumulative for _, _, cumulative, depth in imports if depth == 0)
+    print(f"Total import time: {total / 1000:.1f} ms")
+
+    print(f"\nTop-level imports by cumulative time:")
+    top_level = sorted((entry for entry in imports if entry[3] == 0), key=lambda entry: entry[2], reverse=True)
+    for module, _, cumulative, _ in top_level[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {module}")
+
+    print(f"\nHeaviest modules by self time:")
+    for module, self_us, _, depth in sorted(imports, key=lambda entry: entry[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {module} (depth {depth})")
+
+
+def run_milestones(seconds, python=sys.executable):
+    """
+    Start main.py, stop it after some seconds and print its startup milestones.
+    """
+    process = subprocess.Popen([python, "main.py"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        output, _ = process.communicate(timeout=seconds)
+    except subprocess.TimeoutExpired:
+        process.terminate()
+        output, _ = process.communicate()
+    milestones = [line for line in output.splitlines() if "Startup:" in line]
+    print("\nMilestones:")
+    for line in milestones or ["  (none logged)"]:
+        print(f"  {line}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--top", type=int, default=15, help="Rows per table")
+    parser.add_argument("--run", type=float, metavar="SECONDS", help="Also run main.py for SECONDS and print the milestones")
+    args = parser.parse_args(argv)
+
+    report(profile_imports(args.module), args.top)
+    if args.run:
+        run_milestones(args.run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import logging
+import time
+
+"""
+Startup helpers shared by the entry points (main.py, main_obs.py).
+
+Import this module before anything heavy: START_TIME is taken when it is first
+imported, and every milestone() is logged relative to it. Library modules only
+create loggers; the handlers are set up once here by configure_logging().
+
+Profile the imports with:
+    python profile_startup.py
+"""
+
+START_TIME = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(log_file="vision_log.log", state_machine_log="state_machine.log", level=logging.DEBUG):
+    """
+    Configure the console and file handlers for the whole program.
+
+    Args:
+    - log_file: Log file for every module.
+    - state_machine_log: Extra log file (rewritten every run) for navigation.state_machine, None to disable.
+    - level: Root logging level.
+    """
+    logging.basicConfig(
+        level=level,
+        format=LOG_FORMAT,
+        handlers=[
+            logging.StreamHandler(),  # Outputs to the console
+            logging.FileHandler(log_file, mode='a')  # Outputs to a log file
+        ]
+    )
+    if state_machine_log is not None:
+        handler = logging.FileHandler(state_machine_log, mode='w')
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logging.getLogger('navigation.state_machine').addHandler(handler)
+
+    # Only show warnings and errors from the libraries
+    logging.getLogger('picamera2').setLevel(logging.WARNING)
+    logging.getLogger('matplotlib').setLevel(logging.WARNING)
+
+
+def milestone(name, at=None):
+    """
+    Log the time since START_TIME, e.g. milestone("imports done").
+
+    Args:
+    - name: Milestone name.
+    - at: time.perf_counter() timestamp of the event, defaults to now.
+
+    Returns:
+    - Seconds since START_TIME.
+    """
+    elapsed = (time.perf_counter() if at is None else at) - START_TIME
+    logger.info(f"Startup: {name} at {elapsed:.3f} s")
+    return elapsed
@@ -33,8 +33,7 @@ def main():
 
     # Initial state setup
     current_state = 'SEARCH_FOR_ITEM'
-    item_width = Vision.item_to_size('Cube')
-    Vision.update_item(item_width)
+    Vision.update_item('Cube')
     Vision.update_requested_objects(current_state)  # Set the initial state
     logger.info(f"Set requested objects state to: {current_state}")
 
@@ -0,0 +1,11 @@
+import os
+import sys
+
+"""
+Tests run from the repository root (python -m pytest) and import the packages the
+way the entry points do, e.g. `from i2c.emulator import PicoEmulator`.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,149 @@
+import os
+
+import pytest
+
+from i2c.emulator import PicoEmulator
+from i2c.main_i2c import I2C
+from navigation.action_sequencer import ActionSequencer, Step, LIFT_DONE, GRIP_DONE, SEGMENT_DONE
+from navigation.state_machine import StateMachine, SEGMENT_TIME_FACTOR
+
+"""
+Timeout and feedback paths of the ActionSequencer, and the SEGMENT_DONE feedback
+from the Pico's motion segments through the state machine.
+"""
+
+ORDER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "navigation", "Order_4.csv")
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+def run(sequencer, clock, dt=0.125, limit=10.0, each_tick=None):
+    """
+    Tick until the sequence finishes and return the time it took.
+    """
+    start = clock.time
+    while clock.time - start < limit:
+        if each_tick is not None:
+            each_tick()
+        if not sequencer.tick():
+            return clock.time - start
+        clock.time += dt
+    raise AssertionError("Sequence did not finish")
+
+
+def test_steps_run_in_order_and_time_out():
+    clock = FakeClock()
+    sequencer = ActionSequencer(clock=clock)
+    actions = []
+    sequencer.start([Step(lambda: actions.append('a'), 0.5), Step(lambda: actions.append('b')),
+                     Step(lambda: actions.append('c'), 0.25)])
+    assert sequencer.busy
+    assert sequencer.tick()
+    assert actions == ['a']
+    assert run(sequencer, clock) == 0.75
+    assert actions == ['a', 'b', 'c']
+    assert not sequencer.busy
+
+
+def test_event_finishes_step_early():
+    clock = FakeClock()
+    sequencer = ActionSequencer(clock=clock)
+    sequencer.start([Step(duration=2.0, event=LIFT_DONE)])
+    sequencer.tick()
+    clock.time = 0.4
+    sequencer.notify(LIFT_DONE)
+    assert not sequencer.tick()
+
+
+def test_other_event_does_not_finish_step():
+    clock = FakeClock()
+    sequencer = ActionSequencer(clock=clock)
+    sequencer.start([Step(duration=2.0, event=LIFT_DONE)])
+    sequencer.tick()
+    sequencer.notify(GRIP_DONE)
+    clock.time = 0.4
+    assert sequencer.tick()
+
+
+def test_event_before_step_start_is_ignored():
+    clock = FakeClock()
+    sequencer = ActionSequencer(clock=clock)
+    sequencer.start([Step(duration=0.5), Step(duration=2.0, event=LIFT_DONE)])
+    sequencer.tick()
+    sequencer.notify(LIFT_DONE)  # Belongs to the first step
+    clock.time = 0.5
+    assert sequencer.tick()
+    clock.time = 1.0
+    assert sequencer.tick()
+    assert run(sequencer, clock) == 1.5
+
+
+def test_min_duration_holds_step():
+    clock = FakeClock()
+    sequencer = ActionSequencer(clock=clock)
+    sequencer.start([Step(duration=2.0, event=LIFT_DONE, min_duration=0.5)])
+    sequencer.tick()
+    sequencer.notify(LIFT_DONE)
+    clock.time = 0.3
+    assert sequencer.tick()
+    clock.time = 0.5
+    assert not sequencer.tick()
+
+
+def test_until_finishes_step():
+    clock = FakeClock()
+    sequencer = ActionSequencer(clock=clock)
+    sequencer.start([Step(duration=2.0, until=lambda: clock.time >= 0.6)])
+    assert run(sequencer, clock) == 0.625
+
+
+def test_cancel():
+    clock = FakeClock()
+    sequencer = ActionSequencer(clock=clock)
+    sequencer.start([Step(duration=2.0)])
+    sequencer.tick()
+    sequencer.cancel()
+    assert not sequencer.busy
+    assert not sequencer.tick()
+
+
+@pytest.fixture
+def state_machine():
+    clock = FakeClock()
+    emulator = PicoEmulator(baudrate=0, clock=clock, sleep=lambda duration: None)
+    state_machine = StateMachine(i2c=I2C(bus=emulator), order_path=ORDER_PATH)
+    state_machine.clock = clock
+    state_machine.sleep = lambda duration: None
+    state_machine.sequencer.clock = clock
+    state_machine.velocity_control = True
+    return state_machine, emulator, clock
+
+
+def feedback(state_machine):
+    state_machine.telemetry.poll()
+    state_machine.update_feedback()
+
+
+def test_segment_done_ends_move(state_machine):
+    state_machine, emulator, clock = state_machine
+    # 87 duty is ~0.10 m/s, so 1 s of driving is ~0.10 m
+    state_machine.sequencer.start(state_machine.move_steps(0, 87, 1.0), label='move')
+    elapsed = run(state_machine.sequencer, clock, each_tick=lambda: feedback(state_machine))
+    assert emulator.commands() == ["Q1 10 0 1500 102"]
+    assert emulator.segment_done_id == state_machine.segment_id == 1
+    assert 1.0 <= elapsed < SEGMENT_TIME_FACTOR
+
+
+def test_move_times_out_without_acknowledgement(state_machine):
+    state_machine, emulator, clock = state_machine
+    steps = state_machine.move_steps(0, 87, 1.0)
+    state_machine.sequencer.start(steps, label='move')
+    # No telemetry is read, so the step waits out its limit (checked on the next tick)
+    elapsed = run(state_machine.sequencer, clock)
+    assert steps[0].duration <= elapsed < steps[0].duration + 0.125
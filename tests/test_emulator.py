@@ -0,0 +1,135 @@
+import pytest
+
+from i2c.emulator import PicoEmulator, SEGMENT_MAX
+from i2c.main_i2c import I2C
+from i2c.wheel_model import COUNTS_PER_METER, MAX_WHEEL_SPEED, WHEEL_BASE
+
+"""
+Command parsing of the Pico emulator (rules of PICO/egb320/egb320.c) and the
+motion segment acknowledgement it reports in the telemetry.
+"""
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def emulator(clock):
+    return PicoEmulator(baudrate=0, clock=clock, sleep=lambda duration: None)
+
+
+def send(emulator, text):
+    # The first byte of a block write is the register, which the firmware drops
+    emulator.write_i2c_block_data(0x08, 0, list(text.encode('ascii')))
+    return emulator.log[-1].accepted
+
+
+@pytest.mark.parametrize("text", [
+    "M1 0 100", "M2 1 255", "M1 S",
+    "W100 -100", "W0 0",
+    "D20 -50",
+    "Q1 10 0 1000 0", "Q255 -10 50 0 200",
+    "X",
+    "G0", "G1",
+    "H1", "H3",
+    "L11", "L30",
+])
+def test_accepts(emulator, text):
+    assert send(emulator, text)
+    assert emulator.commands_rejected == 0
+
+
+@pytest.mark.parametrize("text", [
+    "M3 0 100", "M1 2 100", "M", "M1",
+    "W100", "Wa b",
+    "D20", "D x 1",
+    "Q1 10 0 1000", "Q0 10 0 1000 0", "Q256 10 0 1000 0", "Q1 10 0 -1 0", "Q1 10 0 0 -1", "Q1 10 0 0 0",
+    "G2", "H0", "H4",
+    "L41", "L12", "L1",
+    "Z", "?",
+])
+def test_rejects(emulator, text):
+    assert not send(emulator, text)
+    assert emulator.commands_rejected == 1
+
+
+def test_duty_drives_open_loop(emulator):
+    send(emulator, "M1 0 255")
+    send(emulator, "M2 1 255")
+    assert emulator.wheel_speeds() == (MAX_WHEEL_SPEED, -MAX_WHEEL_SPEED)
+    send(emulator, "M1 S")
+    assert emulator.wheel_speeds()[0] == 0.0
+
+
+def test_wheel_command_is_clamped(emulator):
+    send(emulator, "W300 -400")
+    assert emulator.wheel_speeds() == (MAX_WHEEL_SPEED, -MAX_WHEEL_SPEED)
+
+
+def test_velocity_command(emulator):
+    send(emulator, "D20 100")
+    assert emulator.velocity_mode
+    left, right = emulator.wheel_speeds()
+    assert left == pytest.approx(0.2 - WHEEL_BASE / 2)
+    assert right == pytest.approx(0.2 + WHEEL_BASE / 2)
+
+
+def test_leds(emulator):
+    send(emulator, "L21")
+    assert emulator.leds == [0, 1, 0]
+
+
+def test_segment_finishes_on_distance(emulator, clock):
+    # 0.2 m at 0.1 m/s, with 5 s as the time limit
+    send(emulator, "Q7 10 0 5000 200")
+    assert emulator.segments[0].distance == pytest.approx(0.2 * COUNTS_PER_METER)
+    clock.time = 1.0
+    emulator.read_byte(0x08)
+    assert emulator.segment_done_id == 0
+    clock.time = 2.1
+    emulator.read_byte(0x08)
+    assert emulator.segment_done_id == 7
+    assert emulator.segments == []
+    assert emulator.wheel_speeds() == (0.0, 0.0)
+    assert sum(emulator.encoders) / 2 == pytest.approx(0.2 * COUNTS_PER_METER, rel=0.03)
+
+
+def test_segment_finishes_on_time(emulator, clock):
+    send(emulator, "Q3 10 0 0 5000")
+    assert emulator.segments[0].duration == SEGMENT_MAX
+    clock.time = SEGMENT_MAX + 0.01
+    emulator.read_byte(0x08)
+    assert emulator.segment_done_id == 3
+
+
+def test_segments_run_back_to_back(emulator, clock):
+    i2c = I2C(bus=emulator)
+    i2c.segment(1, 0.1, 0.0, duration=0.5)
+    i2c.segment(2, 0.0, 1.0, duration=0.5)
+    clock.time = 0.6
+    emulator.read_byte(0x08)
+    assert emulator.segment_done_id == 1
+    assert emulator.wheel_speeds() == pytest.approx((-WHEEL_BASE / 2, WHEEL_BASE / 2))
+    clock.time = 1.1
+    emulator.read_byte(0x08)
+    assert emulator.segment_done_id == 2
+
+
+def test_stop_clears_segments(emulator, clock):
+    send(emulator, "Q1 10 0 1000 0")
+    send(emulator, "X")
+    assert emulator.segments == []
+    assert emulator.wheel_speeds() == (0.0, 0.0)
+    clock.time = 2.0
+    emulator.read_byte(0x08)
+    assert emulator.segment_done_id == 0
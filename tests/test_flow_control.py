@@ -0,0 +1,51 @@
+from i2c.emulator import PicoEmulator
+from i2c.main_i2c import I2C, COMMAND_QUEUE_CAPACITY
+
+"""
+Flow control of i2c/main_i2c.py against a Pico that needs time per command.
+"""
+
+COMMAND_TIME = 0.002  # s per command on the emulated Pico
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, duration):
+        self.time += duration
+
+
+def burst(flow_control, count=50):
+    # Commands are sent back to back; only the sender's waits let the Pico catch up
+    clock = FakeClock()
+    emulator = PicoEmulator(baudrate=0, command_time=COMMAND_TIME, clock=clock, sleep=lambda duration: None)
+    i2c = I2C(bus=emulator, flow_control=flow_control, clock=clock, sleep=clock.sleep)
+    for i in range(count):
+        i2c.led(1 + i % 3, i % 2)
+    return i2c, emulator
+
+
+def test_burst_without_flow_control_overflows():
+    _, emulator = burst(flow_control=False)
+    assert emulator.commands_dropped == 50 - COMMAND_QUEUE_CAPACITY
+
+
+def test_burst_with_flow_control_is_not_dropped():
+    i2c, emulator = burst(flow_control=True)
+    assert emulator.commands_dropped == 0
+    assert emulator.commands_received == 50
+    assert i2c.status_reads > 0
+
+
+def test_wheel_command_is_not_dropped():
+    # W replaces two M commands, and waits for room like every other command
+    i2c, emulator = burst(flow_control=True, count=COMMAND_QUEUE_CAPACITY)
+    i2c.DC_motors(120, -120)
+    i2c.clock.time += 1.0
+    emulator.read_byte(i2c.addr)  # Let the Pico work through its queue
+    assert emulator.commands_dropped == 0
+    assert emulator.commands(accepted=True)[-1] == "W120 -120"
@@ -0,0 +1,90 @@
+import glob
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+from navigation.order import OrderItem, item_row, load_order
+from navigation.order_optimiser import OrderOptimiser
+
+"""
+The pick sequence optimiser against brute force, and its totals over the order files.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORDER_PATHS = sorted(glob.glob(os.path.join(ROOT, "navigation", "Order_*.csv")))
+
+
+def random_items(rng, count):
+    items = []
+    for number in range(count):
+        shelf = int(rng.integers(0, 6))
+        items.append(OrderItem(number, shelf, int(rng.integers(0, 4)), int(rng.integers(0, 3)), "Bowl", item_row(shelf)))
+    return items
+
+
+def partitions(indices):
+    # Every way to split indices into non-empty groups
+    if not indices:
+        yield []
+        return
+    first, rest = indices[0], indices[1:]
+    for partition in partitions(rest):
+        yield [[first]] + partition
+        for index in range(len(partition)):
+            yield partition[:index] + [[first] + partition[index]] + partition[index + 1:]
+
+
+def brute_force(optimiser, items):
+    best = None
+    for partition in partitions(list(range(len(items)))):
+        if any(len(trip) > optimiser.items_per_trip for trip in partition):
+            continue
+        cost = sum(min(optimiser.trip_cost(items, sequence) for sequence in itertools.permutations(trip))
+                   for trip in partition)
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+@pytest.mark.parametrize("items_per_trip", [1, 2, 3])
+def test_exact_matches_brute_force(items_per_trip):
+    rng = np.random.default_rng(items_per_trip)
+    optimiser = OrderOptimiser(items_per_trip=items_per_trip)
+    for count in range(1, 7):
+        for _ in range(10):
+            items = random_items(rng, count)
+            plan = optimiser.optimise(items)
+            assert plan['cost'] == pytest.approx(brute_force(optimiser, items))
+            assert sorted(plan['sequence']) == list(range(count))
+
+
+def test_heuristic_covers_every_item():
+    items = random_items(np.random.default_rng(0), 12)
+    plan = OrderOptimiser(items_per_trip=2, exact_limit=8).optimise(items)
+    assert sorted(plan['sequence']) == list(range(12))
+    assert all(len(trip) <= 2 for trip in plan['trips'])
+
+
+def test_shortest_trips_first():
+    items = random_items(np.random.default_rng(1), 6)
+    optimiser = OrderOptimiser()
+    costs = [optimiser.trip_cost(items, trip) for trip in optimiser.optimise(items)['trips']]
+    assert costs == sorted(costs)
+
+
+def test_one_item_per_trip_keeps_file_order_cost():
+    optimiser = OrderOptimiser(items_per_trip=1)
+    for path in ORDER_PATHS:
+        plan = optimiser.optimise(load_order(path))
+        assert plan['cost'] == pytest.approx(plan['file_order_cost'])
+
+
+def test_order_file_totals():
+    totals = {}
+    for items_per_trip in (1, 2):
+        optimiser = OrderOptimiser(items_per_trip=items_per_trip)
+        plans = [optimiser.optimise(load_order(path)) for path in ORDER_PATHS]
+        totals[items_per_trip] = (sum(plan['file_order_cost'] for plan in plans), sum(plan['cost'] for plan in plans))
+    assert totals[1] == pytest.approx((305.1, 305.1), abs=0.05)
+    assert totals[2] == pytest.approx((173.2, 157.8), abs=0.05)
@@ -0,0 +1,112 @@
+import math
+
+import numpy as np
+import pytest
+
+import navigation.path_planning as path_planning
+from navigation.planner import PotentialFieldPlanner, CAMERA_FOV, MIN_ROBOT_VEL, MAX_ROBOT_VEL, WORKER_WIDTH_SCALE
+
+"""
+The vectorized PotentialFieldPlanner against the loop implementation it replaced in
+navigation/path_planning.py (copied below without the plotting and the print).
+"""
+
+
+def clip_deg_fov(deg, fov):
+    deg = np.asarray(deg)
+    return np.clip(deg, 0, fov - 1)
+
+
+def compute_attractive_field(goal_deg):
+    angles = np.arange(-CAMERA_FOV//2, CAMERA_FOV//2 + 1)
+    field_indices = clip_deg_fov(goal_deg + CAMERA_FOV//2 + angles, CAMERA_FOV)
+    gradient = 1 / 30
+    attractive_field = np.maximum(1 - gradient * np.abs(angles), 0)
+    field = np.zeros(CAMERA_FOV + 1)
+    field[field_indices.astype(int)] = attractive_field
+    return field
+
+
+def compute_repulsive_field(obstacles):
+    repulsive_field = np.zeros(CAMERA_FOV + 1)
+
+    if obstacles:
+        for obs in obstacles:
+            obs_range, obs_bearing = obs
+            if obs_range < 0.8 and obs_range > 0:
+                obs_width = WORKER_WIDTH_SCALE
+                obs_deg = int(np.clip(np.rad2deg(obs_bearing) + CAMERA_FOV / 2, 0, CAMERA_FOV))
+                obs_width_rad = 2 * math.atan(obs_width / obs_range)
+                obs_width_deg = int(np.rad2deg(obs_width_rad))
+                obs_effect = max(0, 1 - min(1, obs_range - WORKER_WIDTH_SCALE * 2))
+                repulsive_field[obs_deg] = obs_effect
+                angles = np.arange(-obs_width_deg, obs_width_deg + 1)
+                indices = clip_deg_fov(obs_deg + angles, CAMERA_FOV).astype(int)
+                effects = obs_effect * (1 - np.abs(angles) / obs_width_deg)
+                np.maximum.at(repulsive_field, indices, effects)
+
+    return repulsive_field
+
+
+def calculate_goal_velocities(goal_position, obstacles):
+    goal_deg = goal_position['bearing']
+    attractive_field = compute_attractive_field(goal_deg)
+    repulsive_field = compute_repulsive_field(obstacles)
+    residual_field = np.maximum(attractive_field - repulsive_field, 0)
+    heading_angle = np.argmax(residual_field) - CAMERA_FOV//2
+
+    control_signal = heading_angle * 0.75
+    left_motor_speed = MIN_ROBOT_VEL + control_signal
+    right_motor_speed = MIN_ROBOT_VEL - control_signal
+    left_motor_speed = min(MAX_ROBOT_VEL, max(0, left_motor_speed))
+    right_motor_speed = min(MAX_ROBOT_VEL, max(0, right_motor_speed))
+    return left_motor_speed, right_motor_speed
+
+
+def random_case(rng):
+    goal = float(rng.uniform(-90, 90))
+    obstacles = [(float(rng.uniform(0, 1.0)), float(rng.uniform(-0.8, 0.8)))] if rng.random() < 0.7 else []
+    return goal, obstacles
+
+
+@pytest.fixture
+def planner():
+    return PotentialFieldPlanner()
+
+
+def test_attractive_field_is_identical(planner):
+    goals = np.concatenate([np.arange(-120, 121), np.random.default_rng(0).uniform(-120, 120, 1000)])
+    for goal in goals:
+        assert np.array_equal(planner.attractive_field(goal), compute_attractive_field(goal))
+    assert np.array_equal(planner.attractive_field(goals), np.stack([compute_attractive_field(goal) for goal in goals]))
+
+
+def test_repulsive_field_one_obstacle(planner):
+    rng = np.random.default_rng(1)
+    for _ in range(1000):
+        obstacle = (float(rng.uniform(0, 1.0)), float(rng.uniform(-0.8, 0.8)))
+        assert np.array_equal(planner.repulsive_field([obstacle]), compute_repulsive_field([obstacle]))
+
+
+def test_repulsive_field_keeps_strongest_obstacle(planner):
+    near, far = (0.35, 0.0), (0.7, 0.0)
+    field = planner.repulsive_field([near, far])
+    assert np.array_equal(field, planner.repulsive_field([far, near]))
+    assert np.array_equal(field, np.maximum(compute_repulsive_field([near]), compute_repulsive_field([far])))
+
+
+def test_duty_cycles_are_identical():
+    rng = np.random.default_rng(2)
+    for _ in range(3000):
+        goal, obstacles = random_case(rng)
+        assert path_planning.calculate_goal_velocities({'bearing': goal}, obstacles) == \
+            calculate_goal_velocities({'bearing': goal}, obstacles)
+
+
+def test_evaluate_matches_plan(planner):
+    rng = np.random.default_rng(3)
+    goals = rng.uniform(-60, 60, 200)
+    obstacles = [(0.4, 0.1), (0.6, -0.3)]
+    _, left_speeds, right_speeds = planner.evaluate(goals, obstacles)
+    for goal, left, right in zip(goals, left_speeds, right_speeds):
+        assert planner.plan(goal, obstacles)[:2] == (left, right)
@@ -0,0 +1,78 @@
+import pytest
+
+from i2c.emulator import PicoEmulator
+from i2c.main_i2c import I2C
+from i2c.telemetry import Telemetry, TelemetryPoller, TELEMETRY_FORMAT, TELEMETRY_SIZE, TELEMETRY_VERSION, TELEMETRY_QUEUED
+
+"""
+Decoding of the Pico telemetry frame (i2c/telemetry.py) and its rejection rules.
+"""
+
+
+def frame(version=TELEMETRY_VERSION, sequence=5, encoder_left=-1200, segment_done_id=9, queued=2):
+    data = bytearray(TELEMETRY_FORMAT.pack(version, sequence, 123456, encoder_left, 3400, 2, 1, 1, 0,
+                                           40, 1, 0, segment_done_id, 0, queued, 0))
+    data[-1] = sum(data[:-1]) & 0xFF
+    return data
+
+
+def test_decode():
+    telemetry = Telemetry.from_bytes(frame(), received_at=1.5)
+    assert telemetry.sequence == 5
+    assert telemetry.pico_time_ms == 123456
+    assert (telemetry.encoder_left, telemetry.encoder_right) == (-1200, 3400)
+    assert telemetry.lift_level == 2 and telemetry.lift_reached
+    assert telemetry.gripper_closed and not telemetry.gripper_done
+    assert (telemetry.commands_received, telemetry.commands_rejected, telemetry.commands_dropped) == (40, 1, 0)
+    assert (telemetry.segment_done_id, telemetry.segments_pending, telemetry.commands_queued) == (9, 0, 2)
+    assert telemetry.received_at == 1.5
+
+
+def test_queued_offset():
+    assert frame(queued=6)[TELEMETRY_QUEUED] == 6
+
+
+@pytest.mark.parametrize("length", [0, TELEMETRY_SIZE - 1, TELEMETRY_SIZE + 1])
+def test_rejects_length(length):
+    data = (frame() + bytes(4))[:length]
+    with pytest.raises(ValueError, match="bytes"):
+        Telemetry.from_bytes(data)
+
+
+def test_rejects_checksum():
+    data = frame()
+    data[6] ^= 0x01
+    with pytest.raises(ValueError, match="checksum"):
+        Telemetry.from_bytes(data)
+
+
+def test_rejects_version():
+    with pytest.raises(ValueError, match="version"):
+        Telemetry.from_bytes(frame(version=TELEMETRY_VERSION - 1))
+
+
+def test_emulator_frame():
+    clock = lambda: 0.0
+    emulator = PicoEmulator(baudrate=0, clock=clock, sleep=lambda duration: None)
+    i2c = I2C(bus=emulator)
+    i2c.send_command("H2")
+    i2c.send_command("Z")
+    telemetry = TelemetryPoller(i2c).poll()
+    assert telemetry.lift_level == 2
+    assert (telemetry.commands_received, telemetry.commands_rejected) == (2, 1)
+
+
+def test_poller_counts_bad_frames():
+    emulator = PicoEmulator(baudrate=0, corrupt_rate=1.0, sleep=lambda duration: None, seed=1)
+    poller = TelemetryPoller(I2C(bus=emulator))
+    for _ in range(5):
+        assert poller.poll() is None
+    assert poller.bad_frames == 5
+    assert poller.latest is None
+
+
+def test_poller_counts_read_errors():
+    emulator = PicoEmulator(baudrate=0, error_rate=1.0, sleep=lambda duration: None, seed=1)
+    poller = TelemetryPoller(I2C(bus=emulator))
+    assert poller.poll() is None
+    assert poller.read_errors == 1
@@ -0,0 +1,161 @@
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+"""
+navigation/COPPELIA_PythonCode/warehousebot_lib.py: the vectorized GetDetectedObjects
+against the per-object loop it replaced, and the batched scene state fetch
+(getSimState) against one call per object on the mock server.
+"""
+
+COPPELIA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "navigation", "COPPELIA_PythonCode")
+if COPPELIA_DIR not in sys.path:
+    sys.path.append(COPPELIA_DIR)
+
+try:
+    import warehousebot_lib
+    from warehousebot_lib import COPPELIA_WarehouseRobot, RobotParameters, SceneParameters, warehouseObjects
+except OSError as e:  # The remoteApi library is not built for this platform
+    pytest.skip(f"coppelia remote API not available: {e}", allow_module_level=True)
+from mock_coppelia import MockCoppelia, OBJECTS_IN_VIEW
+
+
+def reference_detected_objects(robot, objectsDetected):
+    """
+    GetDetectedObjects before it was vectorized, with all objects requested and the
+    objects in view passed in.
+    """
+    itemRangeBearing = [None]*6
+    packingBayRangeBearing = None
+    obstaclesRangeBearing = None
+    rowMarkerRangeBearing = [None, None, None]
+    shelfRangeBearing = [None]*6
+
+    shelfRB = robot.GetShelfRangeBearing()
+    for index, rb in enumerate(shelfRB):
+        if objectsDetected[warehouseObjects.shelf_0 + index] == True:
+            if rb[0] < robot.robotParameters.maxShelfDetectionDistance:
+                shelfRangeBearing[index] = rb
+
+    for shelf in range(6):
+        if shelfRangeBearing[shelf] is None:
+            continue
+        for x, y in [(x, y) for x in range(4) for y in range(3)]:
+            item_type = robot.sceneParameters.bayContents[shelf, x, y]
+            if item_type == -1:
+                continue
+            itemPosition = robot.itemPositions[shelf, x, y]
+            if objectsDetected[warehouseObjects.bowl + item_type] == True and robot.PointInsideArena(itemPosition):
+                _valid, _range, _bearing = robot.GetRBInCameraFOV(itemPosition)
+                if _range < robot.robotParameters.maxItemDetectionDistance \
+                        and abs(_bearing) < robot.robotParameters.cameraPerspectiveAngle/2:
+                    if itemRangeBearing[item_type] == None:
+                        itemRangeBearing[item_type] = []
+                    itemRangeBearing[item_type].append([_range, _bearing])
+
+    for index, obstaclePosition in enumerate(robot.obstaclePositions):
+        if obstaclePosition != None:
+            if objectsDetected[warehouseObjects.obstacle0 + index] == True and robot.PointInsideArena(obstaclePosition):
+                _valid, _range, _bearing = robot.GetRBInCameraFOV(obstaclePosition)
+                if _valid:
+                    if obstaclesRangeBearing == None:
+                        obstaclesRangeBearing = []
+                    if _range < robot.robotParameters.maxObstacleDetectionDistance:
+                        obstaclesRangeBearing.append([_range, _bearing])
+
+    if robot.packingBayPosition != None and objectsDetected[warehouseObjects.packingBay] == True:
+        _valid, _range, _bearing = robot.GetRBInCameraFOV(robot.packingBayPosition)
+        if _valid and _range < robot.robotParameters.maxPackingBayDetectionDistance:
+            packingBayRangeBearing = [_range, _bearing]
+
+    for index, rowMarkerPosition in enumerate(robot.rowMarkerPositions):
+        if rowMarkerPosition != None:
+            if objectsDetected[warehouseObjects.row_marker_1 + index] == True:
+                _valid, _range, _bearing = robot.GetRBInCameraFOV(rowMarkerPosition)
+                if _valid and _range < robot.robotParameters.maxRowMarkerDetectionDistance:
+                    rowMarkerRangeBearing[index] = [_range, _bearing]
+
+    return itemRangeBearing, packingBayRangeBearing, obstaclesRangeBearing, rowMarkerRangeBearing, shelfRangeBearing
+
+
+def assert_same(actual, expected, tolerance=1e-12):
+    # Nested lists of range/bearing pairs, None where nothing was detected
+    if expected is None or actual is None:
+        assert actual is expected
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected)
+        for a, b in zip(actual, expected):
+            assert_same(a, b, tolerance)
+    else:
+        assert actual == pytest.approx(expected, abs=tolerance)
+
+
+def make_robot(batchState=True, seed=0):
+    robotParameters = RobotParameters()
+    robotParameters.sync = True
+    robotParameters.batchState = batchState
+    sceneParameters = SceneParameters()
+    sceneParameters.bayContents = np.random.default_rng(seed).integers(-1, 6, (6, 4, 3), dtype=np.int16)
+    robot = COPPELIA_WarehouseRobot('127.0.0.1', robotParameters, sceneParameters, api=MockCoppelia(sleep=lambda duration: None))
+    robot.StartSimulator()
+    return robot
+
+
+def random_point(rng):
+    # Mostly in the 2x2 m arena, some just outside it
+    return [float(value) for value in rng.uniform(-1.2, 1.2, 2)] + [float(rng.uniform(0, 0.3))]
+
+
+def randomize_scene(robot, rng):
+    x, y = rng.uniform(-1, 1, 2)
+    robot.cameraPose = [float(x), float(y), 0.1, 0.0, 0.0, float(rng.uniform(-math.pi, math.pi))]
+    robot.sceneParameters.bayContents = rng.integers(-1, 6, (6, 4, 3), dtype=np.int16)
+    robot.itemPositions = rng.uniform(-1.2, 1.2, (6, 4, 3, 3))
+    robot.obstaclePositions = [random_point(rng) if rng.random() < 0.8 else None for _ in range(3)]
+    robot.rowMarkerPositions = [random_point(rng) if rng.random() < 0.8 else None for _ in range(3)]
+    robot.packingBayPosition = random_point(rng)
+    shelfRB = [(float(rng.uniform(0, 3)), float(rng.uniform(-1, 1))) for _ in range(6)]
+    robot.GetShelfRangeBearing = lambda: shelfRB
+    return [int(flag) for flag in rng.random(OBJECTS_IN_VIEW) < 0.7]
+
+
+def test_detected_objects_match_per_object_loop(monkeypatch):
+    # No simulator: the objects in view come from the patched script call
+    robot = COPPELIA_WarehouseRobot.__new__(COPPELIA_WarehouseRobot)
+    robot.clientID = 0
+    robot.coppelia = warehousebot_lib.coppelia
+    robot.objectsInView = None  # Not fetched with the state, so GetDetectedObjects asks for it
+    robot.robotParameters = RobotParameters()
+    robot.sceneParameters = SceneParameters()
+    objectsDetected = []
+    monkeypatch.setattr(warehousebot_lib.coppelia, 'simxCallScriptFunction',
+                        lambda *args: (0, objectsDetected, [], [], bytearray()))
+    rng = np.random.default_rng(1)
+    for _ in range(3000):
+        objectsDetected[:] = randomize_scene(robot, rng)
+        assert_same(robot.GetDetectedObjects(), reference_detected_objects(robot, objectsDetected))
+
+
+def test_batched_state_matches_per_object():
+    # Same drive on both paths: the fetched state and everything derived from it must agree.
+    # The state is fetched right after the step, since one call per object asks for the
+    # objects in view when GetDetectedObjects runs, not when the positions were read
+    runs = []
+    for batchState in (False, True):
+        robot = make_robot(batchState)
+        readings = []
+        for _ in range(600):
+            robot.stepSim()
+            robot.UpdateObjectPositions()
+            detections = robot.GetDetectedObjects()
+            proximity = robot.readProximity()
+            readings.append((detections, proximity, list(robot.robotPose)))
+            robot.SetTargetVelocities(0.1, 0.5)
+        assert robot.robotParameters.batchState == batchState  # No fallback to one call per object
+        runs.append(readings)
+    per_object, batched = runs
+    for a, b in zip(per_object, batched):
+        assert_same(b, a)